@@ -0,0 +1,103 @@
+'''
+Clients connected to the stand-ins in benchmarks.standins.
+'''
+
+from contextlib import contextmanager
+import sys
+from unittest import mock
+
+from benchmarks.standins import AZURE_SYNTHESIZE_PATH
+from benchmarks.standins import AZURE_TOKEN_PATH
+from cloudtts.aws import PollyCredential
+from cloudtts.google import AsyncGoogleClient
+from cloudtts.google import GoogleClient
+from cloudtts.ibm import WatsonCredential
+from cloudtts.microsoft import AzureClient
+from cloudtts.microsoft import AzureCredential
+from cloudtts.registry import client_class
+from cloudtts.session import SessionConfig
+
+
+PROVIDERS = ('azure', 'watson', 'polly', 'google')
+
+# modules loaded on first use of a provider
+SDK_MODULES = {
+    'azure': 'requests',
+    'watson': 'requests',
+    'polly': 'boto3',
+    'google': 'google.cloud.texttospeech',
+}
+
+
+class LocalGoogleClient(GoogleClient):
+    def _create_channel(self):
+        import grpc
+
+        return grpc.insecure_channel(
+            self.address, options=list(self.channel_options.items()))
+
+
+class LocalAsyncGoogleClient(AsyncGoogleClient):
+    def _create_channel(self):
+        import grpc
+
+        return grpc.aio.insecure_channel(
+            self.address, options=list(self.channel_options.items()))
+
+
+@contextmanager
+def azure_endpoints(url):
+    '''
+    Points AzureClient at url, since its endpoints are class attributes.
+    '''
+
+    with mock.patch.multiple(AzureClient,
+                             TokenEndpoint=url + AZURE_TOKEN_PATH,
+                             TTSEndpoint=url + AZURE_SYNTHESIZE_PATH):
+        yield
+
+
+def make_client(provider, http_url, grpc_address, asynchronous=False,
+                max_connections=64):
+    '''
+    Makes a client of provider connected to the stand-ins.
+
+    Azure clients work only within azure_endpoints(http_url).
+
+    Args:
+      provider: string / name of the provider
+      http_url: string / URL of HTTPStandIn
+      grpc_address: string / address of GRPCStandIn
+      asynchronous: bool / make an AsyncClient
+      max_connections: int / size of connection pools
+
+    Returns:
+      Client
+    '''
+
+    cls = client_class(provider)
+    if asynchronous:
+        # every provider module defines an asyncio variant of its client
+        module = sys.modules[cls.__module__]
+        cls = getattr(module, 'Async' + cls.__name__)
+
+    session_config = SessionConfig(pool_maxsize=max_connections)
+
+    if provider == 'azure':
+        return cls(AzureCredential('benchmark'),
+                   session_config=session_config)
+
+    if provider == 'watson':
+        return cls(WatsonCredential('benchmark', 'benchmark', http_url),
+                   session_config=session_config)
+
+    if provider == 'polly':
+        return cls(PollyCredential('us-east-1', 'benchmark', 'benchmark',
+                                   max_pool_connections=max_connections,
+                                   endpoint_url=http_url))
+
+    if provider == 'google':
+        cls = LocalAsyncGoogleClient if asynchronous else LocalGoogleClient
+        return cls('benchmark', address=grpc_address)
+
+    raise ValueError('Unknown provider: {}'.format(provider))
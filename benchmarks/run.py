@@ -0,0 +1,249 @@
+'''
+Benchmarks overhead of clients against local stand-ins of the services.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --providers polly,google --latency 0.05 \\
+        --payload 65536 --concurrency 1,8,64 --asyncio --json out.json
+
+For each client this reports
+
+* import: milliseconds to import the client, and then the SDK it loads on
+  first use, in a fresh interpreter
+* lib: CPU microseconds per tts() spent in cloudtts, with _request() replaced
+  by a function returning audio
+* cpu: CPU microseconds per tts() including the HTTP or gRPC library
+* throughput: requests per second of tts_many() at each concurrency
+* peak: peak KiB allocated by Python during tts_many() at the highest
+  concurrency
+'''
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.clients import PROVIDERS
+from benchmarks.clients import SDK_MODULES
+from benchmarks.clients import azure_endpoints
+from benchmarks.clients import make_client
+from benchmarks.standins import GRPCStandIn
+from benchmarks.standins import HTTPStandIn
+from cloudtts.registry import client_class
+
+
+def _texts(n, prefix):
+    # distinct texts, so that requests are not coalesced
+    return ['{} {}'.format(prefix, i) for i in range(n)]
+
+
+def measure_import(provider, repeat=5):
+    '''
+    Returns median milliseconds to import the client and its SDK.
+    '''
+
+    name = client_class(provider).__name__
+    code = ('import time; t = time.perf_counter(); '
+            'from cloudtts import {}; c = time.perf_counter() - t; '
+            't = time.perf_counter(); import {}; s = time.perf_counter() - t; '
+            'print(c, s)').format(name, SDK_MODULES[provider])
+
+    client, sdk = [], []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code])
+        c, s = out.split()
+        client.append(float(c) * 1000)
+        sdk.append(float(s) * 1000)
+
+    return statistics.median(client), statistics.median(sdk)
+
+
+def _check(results):
+    for result in results:
+        if not result.ok:
+            raise result.error
+
+
+def _cpu_per_call(func, texts):
+    started = time.process_time()
+    for text in texts:
+        func(text)
+
+    return (time.process_time() - started) / len(texts) * 1e6
+
+
+def bench_sync(client, payload, requests, concurrency):
+    audio = b'\0' * payload
+    result = {}
+
+    # opens connections and loads the SDK
+    client.tts('warm up')
+
+    request = client._request
+    client._request = lambda params, text, ssml: audio
+    try:
+        result['lib_us'] = _cpu_per_call(client.tts, _texts(requests, 'lib'))
+    finally:
+        client._request = request
+
+    result['cpu_us'] = _cpu_per_call(client.tts, _texts(requests, 'cpu'))
+
+    result['throughput'] = {}
+    for c in concurrency:
+        with ThreadPoolExecutor(max_workers=c) as executor:
+            started = time.perf_counter()
+            _check(client.tts_many(_texts(requests, 'c{}'.format(c)),
+                                   max_concurrency=c, executor=executor))
+            elapsed = time.perf_counter() - started
+        result['throughput'][c] = requests / elapsed
+
+    c = max(concurrency)
+    with ThreadPoolExecutor(max_workers=c) as executor:
+        tracemalloc.start()
+        try:
+            _check(client.tts_many(_texts(requests, 'peak'),
+                                   max_concurrency=c, executor=executor))
+            result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    client.close()
+
+    return result
+
+
+async def _cpu_per_call_async(func, texts):
+    started = time.process_time()
+    for text in texts:
+        await func(text)
+
+    return (time.process_time() - started) / len(texts) * 1e6
+
+
+async def bench_async(client, payload, requests, concurrency):
+    audio = b'\0' * payload
+    result = {}
+
+    await client.tts('warm up')
+
+    async def fake_request(params, text, ssml):
+        return audio
+
+    request = client._request
+    client._request = fake_request
+    try:
+        result['lib_us'] = await _cpu_per_call_async(
+            client.tts, _texts(requests, 'lib'))
+    finally:
+        client._request = request
+
+    result['cpu_us'] = await _cpu_per_call_async(
+        client.tts, _texts(requests, 'cpu'))
+
+    result['throughput'] = {}
+    for c in concurrency:
+        started = time.perf_counter()
+        _check(await client.tts_many(_texts(requests, 'c{}'.format(c)),
+                                     max_concurrency=c))
+        result['throughput'][c] = requests / (time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        _check(await client.tts_many(_texts(requests, 'peak'),
+                                     max_concurrency=max(concurrency)))
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+    await client.close()
+
+    return result
+
+
+def run(providers=PROVIDERS, latency=0.02, payload=32 * 1024, requests=200,
+        concurrency=(1, 4, 16, 64), asynchronous=False, import_repeat=5):
+    '''
+    Runs the benchmarks and returns results keyed by client name.
+    '''
+
+    results = {}
+    max_connections = max(concurrency)
+
+    with HTTPStandIn(latency, payload) as http, \
+            GRPCStandIn(latency, payload, max_workers=max_connections) as rpc,\
+            azure_endpoints(http.url):
+        for provider in providers:
+            client = make_client(provider, http.url, rpc.address,
+                                 max_connections=max_connections)
+            result = bench_sync(client, payload, requests, concurrency)
+            result['import_ms'], result['sdk_ms'] = \
+                measure_import(provider, import_repeat)
+            results[type(client).__name__] = result
+
+            if not asynchronous:
+                continue
+
+            client = make_client(provider, http.url, rpc.address,
+                                 asynchronous=True,
+                                 max_connections=max_connections)
+            result = asyncio.run(
+                bench_async(client, payload, requests, concurrency))
+            results[type(client).__name__] = result
+
+    return results
+
+
+def report(results, concurrency):
+    columns = ['import ms', 'sdk ms', 'lib us', 'cpu us'] + \
+        ['c={} req/s'.format(c) for c in concurrency] + ['peak KiB']
+    width = max(len(name) for name in results)
+
+    lines = [' '.join([' ' * width] + ['{:>11}'.format(c) for c in columns])]
+    for name, r in results.items():
+        values = [r.get('import_ms'), r.get('sdk_ms'), r['lib_us'],
+                  r['cpu_us']] + \
+            [r['throughput'][c] for c in concurrency] + [r['peak_kib']]
+        cells = ['{:>11}'.format('-' if v is None else '{:.1f}'.format(v))
+                 for v in values]
+        lines.append(' '.join([name.ljust(width)] + cells))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks cloudtts clients against local stand-ins.')
+    parser.add_argument('--providers', default=','.join(PROVIDERS),
+                        help='comma separated providers')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds before each response')
+    parser.add_argument('--payload', type=int, default=32 * 1024,
+                        help='bytes of audio in each response')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per measurement')
+    parser.add_argument('--concurrency', default='1,4,16,64',
+                        help='comma separated concurrency levels')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='also benchmark asyncio clients')
+    parser.add_argument('--json', help='path to write results as JSON')
+    args = parser.parse_args(argv)
+
+    concurrency = [int(c) for c in args.concurrency.split(',')]
+    results = run(providers=args.providers.split(','),
+                  latency=args.latency, payload=args.payload,
+                  requests=args.requests, concurrency=concurrency,
+                  asynchronous=args.asyncio)
+
+    print(report(results, concurrency))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+'''
+Local stand-ins for the services, used by the benchmarks.
+
+A stand-in runs in a child process, so that CPU time and memory measured in
+the benchmark process belong to clients only. It answers every request with
+payload bytes after latency seconds.
+
+>>> from benchmarks.standins import HTTPStandIn
+>>> with HTTPStandIn(latency=0.02, payload=32 * 1024) as server:
+...     print(server.url)
+'''
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import multiprocessing
+import time
+
+
+# paths of the HTTP services
+AZURE_TOKEN_PATH = '/sts/v1.0/issueToken'
+AZURE_SYNTHESIZE_PATH = '/synthesize'
+WATSON_SYNTHESIZE_PATH = '/v1/synthesize'
+POLLY_SPEECH_PATH = '/v1/speech'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, like the services
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, so Nagle's algorithm would
+    # delay the body until the client acknowledges the headers
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        path = self.path.split('?', 1)[0]
+
+        if path == AZURE_TOKEN_PATH:
+            self._respond(b'token', 'text/plain')
+            return
+
+        if path not in (AZURE_SYNTHESIZE_PATH, WATSON_SYNTHESIZE_PATH,
+                        POLLY_SPEECH_PATH):
+            self._respond(b'', 'text/plain', status=404)
+            return
+
+        time.sleep(self.server.latency)
+
+        headers = {}
+        if path == POLLY_SPEECH_PATH:
+            headers['x-amzn-RequestCharacters'] = str(len(body))
+        self._respond(self.server.payload, 'audio/mpeg', headers=headers)
+
+    def _respond(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_http(latency, payload, conn):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.latency = latency
+    server.payload = b'\0' * payload
+
+    conn.send(server.server_address[1])
+    server.serve_forever()
+
+
+def _serve_grpc(latency, payload, max_workers, conn):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import grpc
+    from google.cloud.texttospeech_v1.proto import cloud_tts_pb2
+    from google.cloud.texttospeech_v1.proto import cloud_tts_pb2_grpc
+
+    audio = b'\0' * payload
+
+    class Servicer(cloud_tts_pb2_grpc.TextToSpeechServicer):
+        def SynthesizeSpeech(self, request, context):
+            time.sleep(latency)
+            return cloud_tts_pb2.SynthesizeSpeechResponse(audio_content=audio)
+
+    server = grpc.server(ThreadPoolExecutor(max_workers=max_workers))
+    cloud_tts_pb2_grpc.add_TextToSpeechServicer_to_server(Servicer(), server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+
+    conn.send(port)
+    server.wait_for_termination()
+
+
+class _StandIn:
+    '''
+    This is a server running in a child process.
+    '''
+
+    def __init__(self, target, args):
+        self._target = target
+        self._args = args
+        self._process = None
+        self.port = None
+
+    def start(self):
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        self._process = ctx.Process(target=self._target,
+                                    args=self._args + (child,), daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class HTTPStandIn(_StandIn):
+    '''
+    This emulates the token and synthesize endpoints of Azure, synthesize of
+    Watson and SynthesizeSpeech of Polly.
+
+    Args:
+      latency: float / seconds before each response
+      payload: int / bytes of audio in each response
+    '''
+
+    def __init__(self, latency=0, payload=32 * 1024):
+        super().__init__(_serve_http, (latency, payload))
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+
+class GRPCStandIn(_StandIn):
+    '''
+    This emulates SynthesizeSpeech of Google Cloud Text-to-Speech.
+
+    Args:
+      latency: float / seconds before each response
+      payload: int / bytes of audio in each response
+      max_workers: int / number of requests served at once
+    '''
+
+    def __init__(self, latency=0, payload=32 * 1024, max_workers=128):
+        super().__init__(_serve_grpc, (latency, payload, max_workers))
+
+    @property
+    def address(self):
+        return '127.0.0.1:{}'.format(self.port)
@@ -7,7 +7,48 @@ from .client import Gender
 from .client import Language
 from .client import VoiceConfig
 
-from .aws import PollyClient, PollyCredential
-from .google import GoogleClient
-from .ibm import WatsonClient, WatsonCredential
-from .microsoft import AzureClient, AzureCredential
+from .metrics import prometheus_text
+from .metrics import snapshot
+
+# Provider clients are imported on first access, so that importing cloudtts
+# does not load SDKs of unused providers.
+_LAZY_ATTRIBUTES = {
+    'PollyClient': '.aws',
+    'PollyCredential': '.aws',
+    'AsyncPollyClient': '.aws',
+    'GoogleClient': '.google',
+    'AsyncGoogleClient': '.google',
+    'WatsonClient': '.ibm',
+    'WatsonCredential': '.ibm',
+    'AsyncWatsonClient': '.ibm',
+    'AzureClient': '.microsoft',
+    'AzureCredential': '.microsoft',
+    'AsyncAzureClient': '.microsoft',
+}
+
+__all__ = [
+    'CloudTTSError',
+    'AudioFormat',
+    'Gender',
+    'Language',
+    'VoiceConfig',
+    'prometheus_text',
+    'snapshot',
+] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+
+    import importlib
+    module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,526 @@
+import io
+from itertools import chain
+import struct
+
+from .client import AudioFormat
+from .client import CloudTTSError
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+class _Reader:
+    '''
+    This reads a piece of audio data, which is bytes-like or a binary file.
+
+    Bytes-like data is sliced with memoryview, so it is not copied.
+    '''
+
+    def __init__(self, piece):
+        if hasattr(piece, 'read'):
+            self._file = piece
+            self._data = b''
+        else:
+            self._file = None
+            self._data = memoryview(piece).cast('B')
+        self._pos = 0
+
+    def _fill(self, n):
+        available = len(self._data) - self._pos
+        if self._file is None or available >= n:
+            return
+
+        blocks = [bytes(self._data[self._pos:])]
+        while available < n:
+            block = self._file.read(max(n - available, BLOCK_SIZE))
+            if not block:
+                break
+            blocks.append(block)
+            available += len(block)
+
+        self._data = b''.join(blocks)
+        self._pos = 0
+
+    def peek(self, n):
+        self._fill(n)
+        return bytes(self._data[self._pos:self._pos + n])
+
+    def read(self, n):
+        self._fill(n)
+        data = self._data[self._pos:self._pos + n]
+        self._pos += len(data)
+
+        return data
+
+    def blocks(self):
+        while True:
+            block = self.read(BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+
+def _sniff(head):
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'RIFF':
+        return 'riff'
+    if head[:3] == b'ID3' or \
+            (len(head) > 1 and head[0] == 0xff and head[1] & 0xe0 == 0xe0):
+        return 'mp3'
+
+    return 'raw'
+
+
+# MP3
+
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    25: (11025, 12000, 8000),
+}
+MP3_VERSIONS = {0: 25, 2: 2, 3: 1}
+
+
+def _mp3_frame(header):
+    '''
+    Parses a header of an MPEG Layer III frame.
+
+    Returns:
+      tuple / (version, mono, frame length), or None for invalid header
+    '''
+
+    if len(header) < 4 or header[0] != 0xff or header[1] & 0xe0 != 0xe0:
+        return None
+
+    version = MP3_VERSIONS.get((header[1] >> 3) & 0x03)
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version is None or layer != 1 or \
+            bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    mono = header[3] >> 6 == 3
+
+    if version == 1:
+        length = 144 * bitrate // rate + padding
+    else:
+        length = 72 * bitrate // rate + padding
+
+    return version, mono, length
+
+
+def _is_vbr_header(frame, version, mono):
+    if version == 1:
+        offset = 21 if mono else 36
+    else:
+        offset = 13 if mono else 21
+
+    return frame[offset:offset + 4] in (b'Xing', b'Info') or \
+        frame[36:40] == b'VBRI'
+
+
+def _mp3(readers):
+    for i, r in enumerate(readers):
+        head = r.peek(10)
+        if head[:3] == b'ID3' and len(head) == 10:
+            size = 10 + ((head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 |
+                         (head[8] & 0x7f) << 7 | (head[9] & 0x7f))
+            if head[5] & 0x10:
+                size += 10
+
+            tag = r.read(size)
+            if i == 0:
+                yield tag
+
+        # Xing, Info and VBRI frames describe a whole file, so they are
+        # dropped because they are wrong for joined audio
+        frame = _mp3_frame(r.peek(4))
+        if frame:
+            version, mono, length = frame
+            if _is_vbr_header(r.peek(length), version, mono):
+                r.read(length)
+
+        # ID3v1 tag in the last 128 bytes is dropped
+        held = []
+        held_size = 0
+        for block in r.blocks():
+            held.append(block)
+            held_size += len(block)
+            while len(held) > 1 and held_size - len(held[0]) >= 128:
+                held_size -= len(held[0])
+                yield held.pop(0)
+
+        tail = b''.join(held)
+        if tail[-128:-125] == b'TAG':
+            tail = tail[:-128]
+        if tail:
+            yield tail
+
+
+# Ogg
+
+OGG_HEADER = struct.Struct('<4sBBqIIIB')
+OGG_CONTINUED, OGG_BOS, OGG_EOS = 0x01, 0x02, 0x04
+
+CRC_POLY = 0x104c11db7
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = (r << 1) ^ CRC_POLY if r & 0x80000000 else r << 1
+        table.append(r & 0xffffffff)
+
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def ogg_crc(data):
+    '''
+    Computes the CRC of an Ogg page whose checksum field is zero.
+    '''
+
+    crc = 0
+    for b in data:
+        crc = ((crc << 8) & 0xffffffff) ^ CRC_TABLE[(crc >> 24) ^ b]
+
+    return crc
+
+
+def _crc_mulmod(a, b):
+    r = 0
+    while b:
+        if b & 1:
+            r ^= a
+        b >>= 1
+        a <<= 1
+        if a & 0x100000000:
+            a ^= CRC_POLY
+
+    return r
+
+
+def _crc_shift(crc, n):
+    # CRC of data followed by n zero bytes
+    base = 0x100
+    while n:
+        if n & 1:
+            crc = _crc_mulmod(crc, base)
+        base = _crc_mulmod(base, base)
+        n >>= 1
+
+    return crc
+
+
+class _OggPage:
+    def __init__(self, header, table, body):
+        (_, _, self.flags, self.granule, self.serial, self.seq,
+         self.crc, _) = OGG_HEADER.unpack(header)
+        self.header = header
+        self.table = table
+        self.body = body
+
+    def rewrite(self, flags, granule, serial, seq):
+        '''
+        Returns the page with new header fields.
+
+        The checksum is updated only for the changed header instead of the
+        whole page, because the CRC of Ogg is linear.
+        '''
+
+        header = OGG_HEADER.pack(b'OggS', 0, flags, granule, serial, seq, 0,
+                                 len(self.table))
+        old = OGG_HEADER.pack(b'OggS', 0, self.flags, self.granule,
+                              self.serial, self.seq, 0, len(self.table))
+
+        delta = bytes(a ^ b for a, b in zip(header, old))
+        if any(delta):
+            size = len(self.table) + len(self.body)
+            crc = self.crc ^ _crc_shift(ogg_crc(delta), size)
+        else:
+            crc = self.crc
+
+        return [header[:22], struct.pack('<I', crc), header[26:],
+                self.table, self.body]
+
+
+def _ogg_pages(r):
+    while True:
+        header = bytes(r.read(OGG_HEADER.size))
+        if not header:
+            return
+
+        if len(header) < OGG_HEADER.size or header[:4] != b'OggS':
+            raise CloudTTSError('Invalid Ogg page')
+
+        table = bytes(r.read(header[26]))
+        body = r.read(sum(table))
+        if len(table) < header[26] or len(body) < sum(table):
+            raise CloudTTSError('Truncated Ogg page')
+
+        yield _OggPage(header, table, body)
+
+
+def _ogg_compatible(headers, other):
+    # pages of other can be put into the logical stream of headers
+    if not headers or not other:
+        return False
+
+    first, second = bytes(headers[0].body), bytes(other[0].body)
+    if first.startswith(b'OpusHead'):
+        return second.startswith(b'OpusHead') and \
+            first[9:10] == second[9:10] and first[18:19] == second[18:19]
+
+    return [bytes(p.body) for p in headers] == [bytes(p.body) for p in other]
+
+
+def _ogg(readers):
+    '''
+    Joins Ogg streams into a single logical stream.
+
+    Header pages of the second and later streams are dropped, and pages are
+    renumbered with the serial number of the first stream and continuous
+    granule positions. If streams have incompatible headers, they are
+    chained instead.
+    '''
+
+    held = None
+    headers = None
+    serial = 0
+    seq = 0
+    offset = 0
+
+    def release(eos):
+        page, flags, granule, page_seq = held
+        flags &= ~OGG_EOS
+        if eos:
+            flags |= OGG_EOS
+        return page.rewrite(flags, granule, serial, page_seq)
+
+    for r in readers:
+        pages = _ogg_pages(r)
+
+        piece_headers = []
+        first_data = None
+        for page in pages:
+            if page.granule != 0:
+                first_data = page
+                break
+            piece_headers.append(page)
+
+        if headers is not None and _ogg_compatible(headers, piece_headers):
+            skip_headers = True
+        else:
+            if held:
+                yield from release(True)
+                held = None
+
+            if headers is None:
+                first_page = (piece_headers or [first_data])[0]
+                serial = first_page.serial if first_page else 0
+            else:
+                serial += 1
+            headers = piece_headers
+            skip_headers = False
+            seq = 0
+            offset = 0
+
+        if not skip_headers:
+            for page in piece_headers:
+                yield from page.rewrite(page.flags, page.granule, serial, seq)
+                seq += 1
+
+        last_granule = 0
+        for page in chain([first_data] if first_data else [], pages):
+            if held:
+                yield from release(False)
+
+            granule = page.granule
+            if granule != -1:
+                last_granule = granule
+                granule += offset
+
+            held = (page, page.flags & ~OGG_BOS, granule, seq)
+            seq += 1
+
+        offset += last_granule
+
+    if held:
+        yield from release(True)
+
+
+# RIFF
+
+def _riff_chunks(r):
+    while True:
+        header = bytes(r.read(8))
+        if len(header) < 8:
+            return
+
+        chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+        yield chunk_id, size
+
+
+def _riff(readers):
+    fmt = None
+
+    for r in readers:
+        head = bytes(r.read(12))
+        if head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+            raise CloudTTSError('Invalid RIFF header')
+
+        for chunk_id, size in _riff_chunks(r):
+            if chunk_id == b'data':
+                if fmt is None:
+                    raise CloudTTSError('No fmt chunk before data chunk')
+
+                if size in (0, 0xffffffff):
+                    yield from r.blocks()
+                else:
+                    while size > 0:
+                        block = r.read(min(size, BLOCK_SIZE))
+                        if not block:
+                            break
+                        size -= len(block)
+                        yield block
+                break
+
+            body = bytes(r.read(size + (size & 1)))
+            if chunk_id != b'fmt ':
+                continue
+
+            if fmt is None:
+                fmt = body
+                # sizes are unknown while streaming
+                yield b''.join([b'RIFF', b'\xff\xff\xff\xff', b'WAVE',
+                                b'fmt ', struct.pack('<I', size), body,
+                                b'data', b'\xff\xff\xff\xff'])
+            elif fmt != body:
+                raise CloudTTSError('Different formats can not be joined')
+
+
+def _raw(readers):
+    for r in readers:
+        yield from r.blocks()
+
+
+CONCATENATORS = {
+    'mp3': _mp3,
+    'ogg': _ogg,
+    'riff': _riff,
+    'raw': _raw,
+}
+
+# kinds of data of AudioFormat, as pieces of raw PCM may look like MP3
+FORMAT_KINDS = {
+    AudioFormat.mp3: 'mp3',
+    AudioFormat.ogg_opus: 'ogg',
+    AudioFormat.ogg_vorbis: 'ogg',
+    AudioFormat.pcm: 'raw',
+}
+
+
+def concat(pieces, audio_format=None):
+    '''
+    Joins pieces of audio data without decoding them.
+
+    Pieces are read one by one and joined data is yielded as it is
+    processed, so that memory usage does not depend on the total length.
+
+    * MP3: ID3v2 tags except the first one, ID3v1 tags and Xing, Info or
+      VBRI frames are dropped.
+    * Ogg Opus / Vorbis: pages are put into one logical stream with
+      continuous page sequence numbers and granule positions.
+    * RIFF (WAV): fmt chunks must be the same, and data chunks are joined.
+      Sizes in headers are 0xFFFFFFFF since they are unknown while
+      streaming. Use write() to fix them in a seekable file.
+    * Raw PCM (AudioFormat.pcm, or data of no known format): pieces are
+      simply joined.
+
+    Args:
+      pieces: iterable / bytes-like objects or binary files of audio data
+      audio_format: AudioFormat / format of pieces, detected if omitted
+
+    Returns:
+      generator of bytes-like objects
+    '''
+
+    readers = (_Reader(piece) for piece in pieces)
+    first = next(readers, None)
+    if first is None:
+        return
+
+    if audio_format is None:
+        kind = _sniff(first.peek(12))
+    else:
+        kind = FORMAT_KINDS[audio_format]
+
+    yield from CONCATENATORS[kind](chain([first], readers))
+
+
+def write(pieces, f, audio_format=None):
+    '''
+    Joins pieces of audio data into a binary file.
+
+    Sizes in RIFF headers are fixed if the file is seekable.
+
+    Args:
+      pieces: iterable / bytes-like objects or binary files of audio data
+      f: file / binary file to write
+      audio_format: AudioFormat / format of pieces, detected if omitted
+
+    Returns:
+      int / number of bytes written
+    '''
+
+    start = f.tell() if f.seekable() else None
+    header = None
+    total = 0
+
+    for data in concat(pieces, audio_format):
+        if header is None:
+            header = bytes(data[:4])
+            header_size = len(data)
+        f.write(data)
+        total += len(data)
+
+    if header == b'RIFF' and start is not None:
+        end = f.tell()
+        f.seek(start + 4)
+        f.write(struct.pack('<I', min(total - 8, 0xffffffff)))
+        f.seek(start + header_size - 4)
+        f.write(struct.pack('<I', min(total - header_size, 0xffffffff)))
+        f.seek(end)
+
+    return total
+
+
+def join(pieces, audio_format=None):
+    '''
+    Joins pieces of audio data into bytes.
+
+    Args:
+      pieces: iterable / bytes-like objects or binary files of audio data
+      audio_format: AudioFormat / format of pieces, detected if omitted
+
+    Returns:
+      binary
+    '''
+
+    f = io.BytesIO()
+    write(pieces, f, audio_format)
+
+    return f.getvalue()
@@ -1,26 +1,159 @@
+import asyncio
+from contextlib import AsyncExitStack
 from contextlib import closing
 import re
+import threading
+import time
+from urllib.parse import unquote
+from urllib.parse import urlparse
 
-from boto3 import Session
-
+from .client import AsyncClient
 from .client import AudioFormat
 from .client import Client
 from .client import CloudTTSError
 from .client import Gender
 from .client import Language
 from .client import VoiceConfig
+from .client import _batch_kwargs
+from .client import shared_executor
+from .ratelimit import RateLimit
+from .registry import Capability
 
 
 class PollyCredential:
     def __init__(self, region_name,
-                 aws_access_key_id='', aws_secret_access_key=''):
+                 aws_access_key_id='', aws_secret_access_key='',
+                 max_pool_connections=10, connect_timeout=60, read_timeout=60,
+                 tcp_keepalive=False, retry_mode=None, endpoint_url=None,
+                 s3_endpoint_url=None):
         self.region_name = region_name
         self.aws_access_key_id = aws_access_key_id
         self.aws_secret_access_key = aws_secret_access_key
+        self.max_pool_connections = max_pool_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.tcp_keepalive = tcp_keepalive
+        self.retry_mode = retry_mode
+        self.endpoint_url = endpoint_url
+        self.s3_endpoint_url = s3_endpoint_url
 
     def has_access_key(self):
         return self.aws_access_key_id and self.aws_secret_access_key
 
+    def _key(self):
+        return (self.region_name,
+                self.aws_access_key_id, self.aws_secret_access_key,
+                self.max_pool_connections,
+                self.connect_timeout, self.read_timeout,
+                self.tcp_keepalive, self.retry_mode, self.endpoint_url,
+                self.s3_endpoint_url)
+
+    def endpoint_url_of(self, service):
+        '''
+        Returns the endpoint URL of service, 'polly' or 's3', or None for
+        the default one.
+        '''
+
+        if service == 's3':
+            return self.s3_endpoint_url
+
+        return self.endpoint_url
+
+    def config(self):
+        '''
+        Returns botocore configuration for this credential.
+
+        Returns:
+          botocore.config.Config
+        '''
+
+        from botocore.config import Config
+
+        kwargs = {
+            'max_pool_connections': self.max_pool_connections,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'tcp_keepalive': self.tcp_keepalive,
+        }
+        if self.retry_mode:
+            kwargs['retries'] = {'mode': self.retry_mode}
+
+        return Config(**kwargs)
+
+
+class SynthesisTask:
+    '''
+    This is a speech synthesis task of Polly, which writes audio data to S3.
+    It is made by PollyClient.submit_task() and updated by poll_task().
+
+    Attributes:
+      task_id: string / TaskId
+      bucket: string / S3 bucket which audio data is written to
+      status: string / 'scheduled', 'inProgress', 'completed' or 'failed'
+      output_uri: string / URI of audio data in S3
+      reason: string / reason of a failure, or None
+      characters: int / number of characters billed
+    '''
+
+    DONE_STATUSES = ('completed', 'failed')
+
+    def __init__(self, bucket, response):
+        self.bucket = bucket
+        self._update(response)
+
+    def _update(self, response):
+        # response is SynthesisTask of a response of the API
+        self.task_id = response['TaskId']
+        self.status = response['TaskStatus']
+        self.output_uri = response.get('OutputUri')
+        self.reason = response.get('TaskStatusReason')
+        self.characters = response.get('RequestCharacters')
+
+    @property
+    def done(self):
+        return self.status in SynthesisTask.DONE_STATUSES
+
+    @property
+    def key(self):
+        '''
+        The S3 key of audio data, taken from output_uri.
+        '''
+
+        url = urlparse(self.output_uri)
+        path = url.path.lstrip('/')
+
+        # a path-style URI starts with the bucket, and a virtual-hosted one
+        # has the bucket in the host
+        if not url.netloc.startswith(self.bucket + '.') and \
+                path.startswith(self.bucket + '/'):
+            path = path[len(self.bucket) + 1:]
+
+        return unquote(path)
+
+    def __repr__(self):
+        return 'SynthesisTask({!r}, status={!r})'.format(self.task_id,
+                                                         self.status)
+
+
+class TaskResult:
+    '''
+    This is a result of an item passed to PollyClient.submit_tasks().
+
+    Args:
+      item: string or dict / the item
+      task: SynthesisTask / started task, or None if it failed to start
+      error: Exception / raised exception, or None if it started
+    '''
+
+    def __init__(self, item, task=None, error=None):
+        self.item = item
+        self.task = task
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
 
 class PollyClient(Client):
     '''
@@ -36,9 +169,35 @@ class PollyClient(Client):
     >>> audio = c.tts('Hello world!')
     >>> open('/path/to/save/audio', 'wb') as f:
     ...   f.write(audio)
+
+    Text up to MAX_TASK_TEXT_LENGTH characters is synthesized by a task,
+    which writes audio data to S3 instead of holding a connection.
+
+    >>> task = c.submit_task(book, bucket='audiobooks')
+    >>> c.wait_task(task)
+    >>> with open('/path/to/save/audio', 'wb') as f:
+    ...   c.fetch_task(task, f)
     '''
 
+    PROVIDER = 'polly'
+    CREDENTIAL_CLASS = PollyCredential
     MAX_TEXT_LENGTH = 3000
+
+    # billed characters of StartSpeechSynthesisTask
+    MAX_TASK_TEXT_LENGTH = 100000
+
+    # threads polling tasks in wait_tasks()
+    POLL_WORKERS = 4
+
+    # SynthesizeSpeech is limited to 80 requests per second per account and
+    # region
+    RATE_LIMIT = RateLimit(requests=80)
+
+    # botocore clients are thread safe, but sessions are not. Clients of
+    # Polly and S3 are created under the lock and shared by every
+    # PollyClient.
+    _polly_clients = {}
+    _polly_clients_lock = threading.Lock()
     AVAILABLE_SAMPLE_RATES = {
         'mp3': ('8000', '16000', '22050'),
         'ogg_vorbis': ('8000', '16000', '22050'),
@@ -114,6 +273,16 @@ class PollyClient(Client):
         (Language.tr_TR, Gender.female): 'Filiz',
     }
 
+    @classmethod
+    def capabilities(cls):
+        # every sample rate of a format is listed, though VoiceConfig selects
+        # the one in AUDIO_FORMAT_DICT and others need detail
+        for (language, gender), voice in cls.LANG_GENDER_DICT.items():
+            for audio_format, (fmt, _) in cls.AUDIO_FORMAT_DICT.items():
+                for rate in cls.AVAILABLE_SAMPLE_RATES[fmt]:
+                    yield Capability(cls.PROVIDER, language, gender,
+                                     audio_format, int(rate), voice)
+
     def _voice_config_to_dict(self, vc):
         d = {}
 
@@ -154,6 +323,64 @@ class PollyClient(Client):
             self._is_valid_sample_rate(params) and \
             self._is_valid_voice_id(params)
 
+    def _polly(self):
+        return self._boto_client('polly')
+
+    def _s3(self):
+        return self._boto_client('s3')
+
+    def _boto_client(self, service):
+        key = (service, self.credential._key())
+        client = PollyClient._polly_clients.get(key)
+        if client is not None:
+            return client
+
+        with self._span('client'):
+            return self._create_boto_client(service, key)
+
+    def _create_boto_client(self, service, key):
+        # boto3 is imported on first use, because it takes a while
+        from boto3 import Session
+
+        with PollyClient._polly_clients_lock:
+            if key in PollyClient._polly_clients:
+                return PollyClient._polly_clients[key]
+
+            if self.credential.has_access_key():
+                sess = Session(
+                    region_name=self.credential.region_name,
+                    aws_access_key_id=self.credential.aws_access_key_id,
+                    aws_secret_access_key=self.credential.aws_secret_access_key
+                )
+            else:
+                sess = Session(region_name=self.credential.region_name)
+
+            client = sess.client(
+                service, config=self.credential.config(),
+                endpoint_url=self.credential.endpoint_url_of(service))
+            PollyClient._polly_clients[key] = client
+
+            return client
+
+    def _rate_limit_key(self):
+        return ('polly', self.credential.region_name,
+                self.credential.aws_access_key_id)
+
+    def _retryable_errors(self):
+        from botocore.exceptions import ConnectionError, HTTPClientError
+
+        return (ConnectionError, HTTPClientError)
+
+    def _text_length(self, text, ssml):
+        # text is counted if both of text and ssml are passed
+        if text:
+            return len(text)
+
+        return len(re.compile('</?speak>').sub('', ssml))
+
+    def _fits(self, params, text='', ssml=''):
+        return self._text_length(text, ssml) <= PollyClient.MAX_TEXT_LENGTH
+
     def tts(self, text='', ssml='', voice_config=None, detail=None):
         '''
         Synthesizes audio data for text.
@@ -168,52 +395,501 @@ class PollyClient(Client):
           binary
         '''
 
-        if self.credential:
-            if isinstance(self.credential, PollyCredential):
-                pass
-            else:
-                raise TypeError('Invalid credential')
-        else:
-            raise CloudTTSError('No Authentication yet')
+        params = self._prepare(text, ssml, voice_config, detail)
 
-        if self.credential.has_access_key():
-            sess = Session(
-                region_name=self.credential.region_name,
-                aws_access_key_id=self.credential.aws_access_key_id,
-                aws_secret_access_key=self.credential.aws_secret_access_key
-            )
-        else:
-            sess = Session(region_name=self.credential.region_name)
+        return self._synthesize(params, text=text, ssml=ssml)
 
-        if text:
-            if len(text) > PollyClient.MAX_TEXT_LENGTH:
-                msg = Client.TOO_LONG_DATA_MSG.format(
-                    PollyClient.MAX_TEXT_LENGTH, len(text))
-                raise CloudTTSError(msg)
-        elif ssml:
-            _text = re.compile('</?speak>').sub('', ssml)
-            if len(_text) > PollyClient.MAX_TEXT_LENGTH:
-                msg = Client.TOO_LONG_DATA_MSG.format(
-                    PollyClient.MAX_TEXT_LENGTH, len(_text))
-                raise CloudTTSError(msg)
-        else:
+    def tts_stream(self, text='', ssml='', voice_config=None, detail=None):
+        '''
+        Synthesizes audio data for text and yields it as it arrives.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+
+        Returns:
+          generator of binary
+        '''
+
+        params = self._prepare(text, ssml, voice_config, detail)
+
+        return self._synthesize_stream(params, text=text, ssml=ssml)
+
+    def _prepare(self, text, ssml, voice_config, detail, max_length=None):
+        self._check_credential()
+
+        max_length = max_length or PollyClient.MAX_TEXT_LENGTH
+
+        if not text and not ssml:
             raise ValueError('No text or ssml is passed')
 
-        polly = sess.client('polly')
+        length = self._text_length(text, ssml)
+        if length > max_length:
+            msg = Client.TOO_LONG_DATA_MSG.format(max_length, length)
+            raise CloudTTSError(msg)
+
+        return self._make_params(voice_config, detail)
+
+    def _call(self, func, **kwargs):
+        # calls an API with the retry policy
+        policy = self._retry_policy()
+        if policy is None:
+            return func(**kwargs)
+
+        return policy.call(lambda: func(**kwargs), self._retryable_errors())
+
+    def _task_kwargs(self, params, text, ssml, bucket, key_prefix,
+                     sns_topic_arn):
+        kwargs = self._speech_kwargs(params, text, ssml)
+        kwargs['OutputS3BucketName'] = bucket
+        if key_prefix:
+            kwargs['OutputS3KeyPrefix'] = key_prefix
+        if sns_topic_arn:
+            kwargs['SnsTopicArn'] = sns_topic_arn
+
+        return kwargs
+
+    def submit_task(self, text='', ssml='', bucket=None, key_prefix='',
+                    voice_config=None, detail=None, sns_topic_arn=None):
+        '''
+        Starts a speech synthesis task, which writes audio data to S3.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          bucket: string / S3 bucket which audio data is written to
+          key_prefix: string / prefix of the S3 key of audio data
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+          sns_topic_arn: string / SNS topic notified when the task is done
+
+        Returns:
+          SynthesisTask
+        '''
+
+        if not bucket:
+            raise ValueError('No bucket is passed')
+
+        params = self._prepare(text, ssml, voice_config, detail,
+                               max_length=PollyClient.MAX_TASK_TEXT_LENGTH)
+        kwargs = self._task_kwargs(params, text, ssml, bucket, key_prefix,
+                                   sns_topic_arn)
+
+        with self._measure(params, text, ssml):
+            response = self._call(self._polly().start_speech_synthesis_task,
+                                  **kwargs)
+
+        return SynthesisTask(bucket, response['SynthesisTask'])
+
+    def submit_tasks(self, items, bucket=None, key_prefix='', executor=None):
+        '''
+        Starts speech synthesis tasks concurrently.
+
+        A failure of an item does not stop others, and tasks which started
+        are returned even if others failed, as they run and are billed
+        anyway.
+
+        Args:
+          items: iterable of string or dict / text, or keyword arguments of
+                 submit_task()
+          bucket: string / S3 bucket which audio data is written to
+          key_prefix: string / prefix of S3 keys of audio data
+          executor: concurrent.futures.Executor / shared_executor() if
+                    omitted
+
+        Returns:
+          list of TaskResult / results in the order of items
+        '''
+
+        def submit(item):
+            kwargs = dict(_batch_kwargs(item))
+            kwargs.setdefault('bucket', bucket)
+            kwargs.setdefault('key_prefix', key_prefix)
+
+            return self.submit_task(**kwargs)
+
+        executor = executor or shared_executor()
+        futures = [(item, executor.submit(submit, item)) for item in items]
+
+        results = []
+        for item, future in futures:
+            error = future.exception()
+            if error is not None:
+                results.append(TaskResult(item, error=error))
+            else:
+                results.append(TaskResult(item, task=future.result()))
+
+        return results
+
+    def poll_task(self, task):
+        '''
+        Updates status of task.
+
+        Args:
+          task: SynthesisTask
+
+        Returns:
+          SynthesisTask / task
+        '''
+
+        response = self._call(self._polly().get_speech_synthesis_task,
+                              TaskId=task.task_id)
+        task._update(response['SynthesisTask'])
+
+        return task
+
+    def wait_tasks(self, tasks, interval=1, max_interval=30, timeout=None):
+        '''
+        Polls tasks until all of them complete or fail.
+
+        The interval between polls doubles up to max_interval, and pending
+        tasks are polled concurrently by up to POLL_WORKERS threads. Tasks
+        are polled once more at the deadline before TimeoutError is raised.
+
+        Args:
+          tasks: list of SynthesisTask
+          interval: float / seconds before the first poll
+          max_interval: float / maximum seconds between polls
+          timeout: float / seconds to wait, or None to wait forever
+
+        Returns:
+          list of SynthesisTask / tasks
+        '''
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending = [task for task in tasks if not task.done]
+
+        # threads of its own, as callers may run in threads of
+        # shared_executor()
+        executor = ThreadPoolExecutor(max_workers=PollyClient.POLL_WORKERS,
+                                      thread_name_prefix='cloudtts-poll')
+        with executor:
+            while pending:
+                delay = interval
+                if deadline is not None:
+                    delay = min(delay, deadline - time.monotonic())
+                if delay > 0:
+                    time.sleep(delay)
+                interval = min(interval * 2, max_interval)
+
+                if len(pending) == 1:
+                    self.poll_task(pending[0])
+                else:
+                    list(executor.map(self.poll_task, pending))
+                pending = [task for task in pending if not task.done]
+
+                if pending and deadline is not None and \
+                        time.monotonic() >= deadline:
+                    raise TimeoutError('{} tasks are not done in {} seconds'
+                                       .format(len(pending), timeout))
+
+        return tasks
+
+    def wait_task(self, task, interval=1, max_interval=30, timeout=None):
+        '''
+        Polls task until it completes. See wait_tasks().
+
+        Raises:
+          CloudTTSError if the task fails
+        '''
+
+        self.wait_tasks([task], interval, max_interval, timeout)
+        if task.status != 'completed':
+            raise CloudTTSError('Task {} failed: {}'.format(task.task_id,
+                                                            task.reason))
+
+        return task
+
+    def _get_output(self, task):
+        if task.status != 'completed':
+            raise CloudTTSError('Task {} is {}'.format(task.task_id,
+                                                       task.status))
+
+        return self._call(self._s3().get_object, Bucket=task.bucket,
+                          Key=task.key)
+
+    def stream_task(self, task):
+        '''
+        Yields audio data of a completed task as it is downloaded from S3.
+
+        Args:
+          task: SynthesisTask
+
+        Returns:
+          generator of binary
+        '''
+
+        response = self._get_output(task)
+
+        with closing(response['Body']) as body:
+            yield from body.iter_chunks(PollyClient.STREAM_CHUNK_SIZE)
+
+    def fetch_task(self, task, sink=None):
+        '''
+        Downloads audio data of a completed task into sink. A sink is
+        written in the same way as Client.tts_into().
+
+        Args:
+          task: SynthesisTask
+          sink: writable binary file, bytearray, memoryview, socket or None
+
+        Returns:
+          int / number of bytes written, or the temporary file if sink is
+          None
+        '''
+
+        return self._write_into(sink, lambda: self.stream_task(task))
+
+    def _compile_plan(self, plan):
+        plan.speech_kwargs = {
+            'OutputFormat': plan['output_format'],
+            'VoiceId': plan['voice_id'],
+            'SampleRate': plan['sample_rate'],
+        }
+
+    def _speech_kwargs(self, params, text, ssml):
+        kwargs = dict(self._plan(params).speech_kwargs)
+        kwargs['Text'] = ssml if ssml else text
+        kwargs['TextType'] = 'ssml' if ssml else 'text'
 
-        params = self._make_params(voice_config, detail)
+        return kwargs
 
-        response = polly.synthesize_speech(
-            Text=ssml if ssml else text,
-            TextType='ssml' if ssml else 'text',
-            OutputFormat=params['output_format'],
-            VoiceId=params['voice_id'],
-            SampleRate=params['sample_rate'],
-        )
+    def _synthesize_speech(self, params, text, ssml):
+        polly = self._polly()
+
+        return polly.synthesize_speech(
+            **self._speech_kwargs(params, text, ssml))
+
+    def _request(self, params, text, ssml):
+        response = self._synthesize_speech(params, text, ssml)
 
         audio = None
         if 'AudioStream' in response:
-            with closing(response['AudioStream']) as stream:
+            with closing(response['AudioStream']) as stream, \
+                    self._span('read'):
                 audio = stream.read()
 
         return audio
+
+    def _request_stream(self, params, text, ssml):
+        response = self._synthesize_speech(params, text, ssml)
+
+        if 'AudioStream' in response:
+            with closing(response['AudioStream']) as stream:
+                yield from stream.iter_chunks(PollyClient.STREAM_CHUNK_SIZE)
+
+
+class AsyncPollyClient(AsyncClient, PollyClient):
+    '''
+    This is an asyncio client class for Amazon Polly API
+
+    Requests are sent by aiobotocore. Connections are limited by
+    max_pool_connections of PollyCredential, so raise it to keep many
+    requests in flight.
+
+    >>> from cloudtts import AsyncPollyClient, PollyCredential
+    >>> cred = PollyCredential(region_name=AWS_REGION_NAME,
+    ...                        max_pool_connections=1000)
+    >>> async with AsyncPollyClient(cred) as c:
+    ...     audio = await c.tts('Hello world!')
+    '''
+
+    def __init__(self, credential=None, **kwargs):
+        # aiobotocore clients are bound to an event loop, so they are kept
+        # by each client instead of being shared by the class
+        self._clients = {}
+        self._clients_lock = asyncio.Lock()
+        self._exit_stack = AsyncExitStack()
+        super().__init__(credential, **kwargs)
+
+    def _create_client(self, service='polly'):
+        # aiobotocore is imported on first use, like boto3
+        from aiobotocore.session import get_session
+
+        kwargs = {
+            'region_name': self.credential.region_name,
+            'config': self.credential.config(),
+            'endpoint_url': self.credential.endpoint_url_of(service),
+        }
+        if self.credential.has_access_key():
+            kwargs['aws_access_key_id'] = self.credential.aws_access_key_id
+            kwargs['aws_secret_access_key'] = \
+                self.credential.aws_secret_access_key
+
+        return get_session().create_client(service, **kwargs)
+
+    async def _polly(self):
+        return await self._boto_client('polly')
+
+    async def _s3(self):
+        return await self._boto_client('s3')
+
+    async def _boto_client(self, service):
+        key = (service, self.credential._key())
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        async with self._clients_lock:
+            if key not in self._clients:
+                with self._span('client'):
+                    self._clients[key] = await self._exit_stack.\
+                        enter_async_context(self._create_client(service))
+
+            return self._clients[key]
+
+    async def _synthesize_speech(self, params, text, ssml):
+        polly = await self._polly()
+
+        return await polly.synthesize_speech(
+            **self._speech_kwargs(params, text, ssml))
+
+    async def _request(self, params, text, ssml):
+        response = await self._synthesize_speech(params, text, ssml)
+
+        audio = None
+        if 'AudioStream' in response:
+            async with response['AudioStream'] as stream:
+                with self._span('read'):
+                    audio = await stream.read()
+
+        return audio
+
+    async def _request_stream(self, params, text, ssml):
+        response = await self._synthesize_speech(params, text, ssml)
+
+        if 'AudioStream' in response:
+            async with response['AudioStream'] as stream:
+                async for chunk in stream.iter_chunks(
+                        PollyClient.STREAM_CHUNK_SIZE):
+                    yield chunk
+
+    async def _call(self, func, **kwargs):
+        policy = self._retry_policy()
+        if policy is None:
+            return await func(**kwargs)
+
+        return await policy.call_async(lambda: func(**kwargs),
+                                       self._retryable_errors())
+
+    async def submit_task(self, text='', ssml='', bucket=None, key_prefix='',
+                          voice_config=None, detail=None,
+                          sns_topic_arn=None):
+        '''
+        Starts a speech synthesis task. See PollyClient.submit_task().
+        '''
+
+        if not bucket:
+            raise ValueError('No bucket is passed')
+
+        params = self._prepare(text, ssml, voice_config, detail,
+                               max_length=PollyClient.MAX_TASK_TEXT_LENGTH)
+        kwargs = self._task_kwargs(params, text, ssml, bucket, key_prefix,
+                                   sns_topic_arn)
+        polly = await self._polly()
+
+        with self._measure(params, text, ssml):
+            response = await self._call(polly.start_speech_synthesis_task,
+                                        **kwargs)
+
+        return SynthesisTask(bucket, response['SynthesisTask'])
+
+    async def submit_tasks(self, items, bucket=None, key_prefix='',
+                           max_concurrency=8):
+        '''
+        Starts speech synthesis tasks concurrently, with up to
+        max_concurrency requests in flight. See PollyClient.submit_tasks().
+        '''
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def submit(item):
+            kwargs = dict(_batch_kwargs(item))
+            kwargs.setdefault('bucket', bucket)
+            kwargs.setdefault('key_prefix', key_prefix)
+
+            async with semaphore:
+                return await self.submit_task(**kwargs)
+
+        items = list(items)
+        tasks = await asyncio.gather(*map(submit, items),
+                                     return_exceptions=True)
+
+        return [TaskResult(item, error=task) if isinstance(task, Exception)
+                else TaskResult(item, task=task)
+                for item, task in zip(items, tasks)]
+
+    async def poll_task(self, task):
+        polly = await self._polly()
+        response = await self._call(polly.get_speech_synthesis_task,
+                                    TaskId=task.task_id)
+        task._update(response['SynthesisTask'])
+
+        return task
+
+    async def wait_tasks(self, tasks, interval=1, max_interval=30,
+                         timeout=None):
+        '''
+        Polls tasks until all of them complete or fail. See
+        PollyClient.wait_tasks().
+        '''
+
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        pending = [task for task in tasks if not task.done]
+
+        while pending:
+            delay = interval
+            if deadline is not None:
+                delay = min(delay, deadline - loop.time())
+            if delay > 0:
+                await asyncio.sleep(delay)
+            interval = min(interval * 2, max_interval)
+
+            await asyncio.gather(*map(self.poll_task, pending))
+            pending = [task for task in pending if not task.done]
+
+            if pending and deadline is not None and loop.time() >= deadline:
+                raise TimeoutError('{} tasks are not done in {} seconds'
+                                   .format(len(pending), timeout))
+
+        return tasks
+
+    async def wait_task(self, task, interval=1, max_interval=30,
+                        timeout=None):
+        await self.wait_tasks([task], interval, max_interval, timeout)
+        if task.status != 'completed':
+            raise CloudTTSError('Task {} failed: {}'.format(task.task_id,
+                                                            task.reason))
+
+        return task
+
+    async def _get_output(self, task):
+        if task.status != 'completed':
+            raise CloudTTSError('Task {} is {}'.format(task.task_id,
+                                                       task.status))
+
+        s3 = await self._s3()
+
+        return await self._call(s3.get_object, Bucket=task.bucket,
+                                Key=task.key)
+
+    async def stream_task(self, task):
+        response = await self._get_output(task)
+
+        async with response['Body'] as body:
+            async for chunk in body.iter_chunks(
+                    PollyClient.STREAM_CHUNK_SIZE):
+                yield chunk
+
+    async def fetch_task(self, task, sink=None):
+        return await self._write_into(sink, lambda: self.stream_task(task))
+
+    async def close(self):
+        async with self._clients_lock:
+            self._clients = {}
+            await self._exit_stack.aclose()
@@ -0,0 +1,361 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+
+
+def normalize_text(text):
+    '''
+    Normalizes text so that trivially different inputs share a cache entry.
+
+    Args:
+      text: string / text or SSML
+
+    Returns:
+      string
+    '''
+
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(provider, params, text='', ssml=''):
+    '''
+    Makes a cache key for a synthesis request.
+
+    Args:
+      provider: string / name of the client class
+      params: dict / parameters made by Client._make_params()
+      text: string / target to be synthesized(plain text)
+      ssml: string / target to be synthesized(SSML)
+
+    Returns:
+      string / hex digest
+    '''
+
+    h = hashlib.sha256()
+    for part in (provider, repr(sorted(params.items())),
+                 normalize_text(text), normalize_text(ssml)):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+
+    return h.hexdigest()
+
+
+class MemoryCache:
+    '''
+    This is an in-memory LRU cache for synthesized audio.
+
+    The cache is bounded by the total size of audio data. Entries larger than
+    max_bytes are not stored.
+
+    >>> from cloudtts.cache import MemoryCache
+    >>> c = PollyClient(cred, cache=MemoryCache(max_bytes=64 * 1024 * 1024))
+    >>> audio = c.tts('Hello world!')  # calls API
+    >>> audio = c.tts('Hello world!')  # returns cached audio
+    >>> c.cache.stats()
+    {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 12345}
+    '''
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        Returns cached audio for key, or None.
+        '''
+
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+            return audio
+
+    def set(self, key, audio):
+        '''
+        Stores audio for key and evicts least recently used entries.
+        '''
+
+        size = len(audio)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+
+            self._entries[key] = audio
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        '''
+        Returns statistics of the cache.
+
+        Returns:
+          dict / hits, misses, evictions, entries and bytes
+        '''
+
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    '''
+    This is a persistent cache for synthesized audio shared by processes.
+
+    Audio is stored in files named by cache keys under path, and an index of
+    them is kept in a SQLite database. Files are written atomically, so
+    readers never see partial audio. Cached audio is returned as a read-only
+    memoryview of a memory-mapped file, so that it is not copied into memory.
+    tts() of clients copies it into bytes, while tts_stream() and tts_into()
+    yield and write the memoryview as it is.
+
+    When the total size exceeds max_bytes, least recently used audio is
+    removed. Audio older than ttl seconds is treated as missing.
+
+    >>> from cloudtts.cache import DiskCache
+    >>> cache = DiskCache('/var/cache/cloudtts', max_bytes=1024 ** 3,
+    ...                   ttl=7 * 24 * 60 * 60)
+    >>> c = PollyClient(cred, cache=cache)
+    '''
+
+    INDEX = 'index.sqlite3'
+    # entries removed at once when the total size exceeds max_bytes
+    EVICT_BATCH = 64
+
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._local = threading.local()
+
+        os.makedirs(path, exist_ok=True)
+        with self._db() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                       'key TEXT PRIMARY KEY, size INTEGER, '
+                       'created REAL, accessed REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_accessed '
+                       'ON entries (accessed)')
+            # the total size of entries, kept so that it is not summed up
+            # on every set()
+            db.execute('CREATE TABLE IF NOT EXISTS meta ('
+                       'name TEXT PRIMARY KEY, value INTEGER)')
+            db.execute("INSERT OR IGNORE INTO meta (name, value) "
+                       "SELECT 'bytes', TOTAL(size) FROM entries")
+
+    def _db(self):
+        import sqlite3
+
+        # SQLite connections can not be shared by threads or forked processes
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(os.path.join(self.path, DiskCache.INDEX),
+                                 timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+
+        return _Transaction(db)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def _total(self, db):
+        return db.execute("SELECT value FROM meta "
+                          "WHERE name = 'bytes'").fetchone()[0]
+
+    def _add_total(self, db, size):
+        db.execute("UPDATE meta SET value = value + ? WHERE name = 'bytes'",
+                   (size,))
+
+    def _remove(self, db, key):
+        row = db.execute('SELECT size FROM entries WHERE key = ?',
+                         (key,)).fetchone()
+        if row:
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._add_total(db, -row[0])
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def _read(self, key):
+        import mmap
+
+        with open(self._file(key), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return b''
+
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return memoryview(m)
+
+    def get(self, key):
+        '''
+        Returns cached audio for key as a memoryview, or None.
+        '''
+
+        now = time.time()
+
+        with self._db() as db:
+            row = db.execute('SELECT created FROM entries WHERE key = ?',
+                             (key,)).fetchone()
+
+            if row and self.ttl is not None and now - row[0] > self.ttl:
+                self._remove(db, key)
+                row = None
+
+            audio = None
+            if row:
+                try:
+                    audio = self._read(key)
+                except OSError:
+                    self._remove(db, key)
+                else:
+                    db.execute('UPDATE entries SET accessed = ? '
+                               'WHERE key = ?', (now, key))
+
+            # counters are updated while the index is locked
+            if audio is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+
+        return audio
+
+    def set(self, key, audio):
+        '''
+        Stores audio for key and evicts least recently used entries.
+        '''
+
+        import tempfile
+
+        size = len(audio)
+        if size > self.max_bytes:
+            return
+
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        now = time.time()
+        with self._db() as db:
+            row = db.execute('SELECT size FROM entries WHERE key = ?',
+                             (key,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO entries '
+                       '(key, size, created, accessed) VALUES (?, ?, ?, ?)',
+                       (key, size, now, now))
+            self._add_total(db, size - (row[0] if row else 0))
+            self._evict(db)
+
+    def _evict(self, db):
+        total = self._total(db)
+        while total > self.max_bytes:
+            rows = db.execute('SELECT key, size FROM entries '
+                              'ORDER BY accessed LIMIT ?',
+                              (DiskCache.EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+
+                self._remove(db, key)
+                total -= size
+                self._evictions += 1
+
+    def clear(self):
+        with self._db() as db:
+            for (key,) in db.execute('SELECT key FROM entries').fetchall():
+                self._remove(db, key)
+
+    def stats(self):
+        '''
+        Returns statistics of the cache.
+
+        Hits, misses and evictions are counted in this process, while entries
+        and bytes are shared by all processes.
+
+        Returns:
+          dict / hits, misses, evictions, entries and bytes
+        '''
+
+        with self._db() as db:
+            entries = db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            total = self._total(db)
+
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'entries': entries,
+            'bytes': int(total),
+        }
+
+    def __len__(self):
+        return self.stats()['entries']
+
+
+class _Transaction:
+    '''
+    This runs statements in an immediate transaction, which locks the index
+    against other processes until it is committed.
+    '''
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.db.execute('COMMIT')
+        else:
+            self.db.execute('ROLLBACK')
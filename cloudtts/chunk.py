@@ -0,0 +1,265 @@
+import re
+
+from .client import CloudTTSError
+
+
+SENTENCE_PAT = re.compile(r'(?<=[.!?。！？])\s+|(?<=[。！？])|\n+')
+CLAUSE_PAT = re.compile(r'(?<=[,;:、，；：])\s*')
+WORD_PAT = re.compile(r'(?<=\s)(?=\S)')
+
+TAG_PAT = re.compile(r'(<[^>]*>)')
+SPEAK_PAT = re.compile(r'^\s*(<speak\b[^>]*>)(.*)</speak>\s*$', re.DOTALL)
+TAG_NAME_PAT = re.compile(r'^</?\s*([^\s/>]+)')
+
+# Text in these elements is read as a unit, so it is never split
+ATOMIC_ELEMENTS = ('audio', 'phoneme', 'say-as', 'sub')
+
+
+def _sentences(text):
+    # sentences keep their trailing whitespace so that joined chunks are
+    # equal to the original text
+    pieces = []
+    start = 0
+    for m in SENTENCE_PAT.finditer(text):
+        if m.end() > start:
+            pieces.append(text[start:m.end()])
+            start = m.end()
+    if start < len(text):
+        pieces.append(text[start:])
+
+    return pieces
+
+
+def _finer_pieces(text):
+    for pat in (CLAUSE_PAT, WORD_PAT):
+        pieces = []
+        start = 0
+        for m in pat.finditer(text):
+            if 0 < m.end() < len(text) and m.end() > start:
+                pieces.append(text[start:m.end()])
+                start = m.end()
+        pieces.append(text[start:])
+
+        if len(pieces) > 1:
+            return pieces
+
+    return None
+
+
+def _tag_name(tag):
+    m = TAG_NAME_PAT.match(tag)
+    return m[1] if m else ''
+
+
+class _Chunker:
+    def __init__(self, fits, root=None):
+        self.fits = fits
+        self.root = root
+        self.chunks = []
+        self.stack = []
+        self.prefix = ''
+        self.body = ''
+        self.has_text = False
+        # opening tags at the end of body with no text after them, and
+        # where they start in body
+        self.opened = 0
+        self.opened_at = 0
+
+    def _wrap(self, body, stack):
+        closing = ''.join('</{}>'.format(_tag_name(tag))
+                          for tag in reversed(stack))
+        chunk = self.prefix + body + closing
+
+        if self.root is not None:
+            chunk = self.root + chunk + '</speak>'
+
+        return chunk
+
+    def _emit(self):
+        if not self.has_text:
+            return
+
+        # elements opened just before a boundary are left to the next chunk
+        # rather than emitted empty
+        body, stack = self.body, self.stack
+        if self.opened:
+            body = body[:self.opened_at]
+            stack = stack[:-self.opened]
+
+        self.chunks.append(self._wrap(body, stack))
+        self.prefix = ''.join(self.stack)
+        self.body = ''
+        self.has_text = False
+        self.opened = 0
+
+    def _fits_with(self, body, stack):
+        return self.fits(self._wrap(self.body + body, stack))
+
+    def add_tag(self, tag):
+        stack = list(self.stack)
+        if tag.startswith('</'):
+            if stack:
+                stack.pop()
+        elif not tag.endswith('/>') and not tag.startswith(('<?', '<!')):
+            stack.append(tag)
+
+        if not self._fits_with(tag, stack):
+            self._emit()
+
+        if len(stack) > len(self.stack):
+            if not self.opened:
+                self.opened_at = len(self.body)
+            self.opened += 1
+        else:
+            self.opened = 0
+
+        self.body += tag
+        self.stack = stack
+
+    def add_element(self, element):
+        # a whole element which must not be split
+        if not self._fits_with(element, self.stack):
+            self._emit()
+
+        self.body += element
+        self.has_text = True
+        self.opened = 0
+
+    def add_text(self, text, pieces=None):
+        if pieces is None:
+            pieces = _sentences(text)
+
+        for piece in pieces:
+            if self._fits_with(piece, self.stack):
+                self._add_piece(piece)
+                continue
+
+            self._emit()
+            if self._fits_with(piece, self.stack):
+                self._add_piece(piece)
+                continue
+
+            finer = _finer_pieces(piece)
+            if finer:
+                self.add_text(piece, finer)
+            else:
+                self._add_characters(piece)
+
+    def _add_piece(self, piece):
+        self.body += piece
+        if piece.strip():
+            self.has_text = True
+            self.opened = 0
+
+    def _add_characters(self, text):
+        while text:
+            # the longest prefix of text which fits
+            lo, hi = 0, len(text)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self._fits_with(text[:mid], self.stack):
+                    lo = mid
+                else:
+                    hi = mid - 1
+            n = lo
+
+            if n == 0:
+                raise CloudTTSError('Too long data can not be split')
+
+            self._add_piece(text[:n])
+            text = text[n:]
+            if text:
+                self._emit()
+
+    def finish(self):
+        self._emit()
+
+        # whitespace is not sent as a request of its own
+        if not self.chunks:
+            raise CloudTTSError('No text to be synthesized')
+
+        for chunk in self.chunks:
+            if not self.fits(chunk):
+                raise CloudTTSError('Too long data can not be split')
+
+        return self.chunks
+
+
+def split_text(text, fits):
+    '''
+    Splits plain text at sentence and clause boundaries.
+
+    Args:
+      text: string / plain text
+      fits: function / returns whether a chunk is acceptable to an API
+
+    Returns:
+      list of string
+
+    Raises:
+      CloudTTSError if text is only whitespace or can not be split
+    '''
+
+    chunker = _Chunker(fits)
+    chunker.add_text(text)
+
+    return chunker.finish()
+
+
+def split_ssml(ssml, fits):
+    '''
+    Splits SSML at sentence and clause boundaries.
+
+    Every chunk is wrapped with the root <speak> element, and elements which
+    are open at a boundary are closed at the end of a chunk and opened again
+    at the beginning of the next one. Text in ATOMIC_ELEMENTS is not split.
+
+    Args:
+      ssml: string / SSML
+      fits: function / returns whether a chunk is acceptable to an API
+
+    Returns:
+      list of string
+
+    Raises:
+      CloudTTSError if SSML has no text or can not be split
+    '''
+
+    m = SPEAK_PAT.match(ssml)
+    if m:
+        root, body = m[1], m[2]
+    else:
+        root, body = '<speak>', ssml
+
+    chunker = _Chunker(fits, root)
+    element = []
+    depth = 0
+    for token in TAG_PAT.split(body):
+        if not token:
+            continue
+
+        is_tag = TAG_PAT.match(token)
+        if is_tag and _tag_name(token) in ATOMIC_ELEMENTS and \
+                not token.endswith('/>'):
+            depth += -1 if token.startswith('</') else 1
+
+            if depth == 0:
+                chunker.add_element(''.join(element) + token)
+                element = []
+                continue
+
+        if depth:
+            element.append(token)
+        elif is_tag:
+            chunker.add_tag(token)
+        else:
+            chunker.add_text(token)
+
+    if element:
+        chunker.add_element(''.join(element))
+
+    return chunker.finish()
+
+
+def is_ssml(text):
+    return text.lstrip().startswith('<speak')
@@ -1,4 +1,15 @@
 from enum import Enum, auto
+from itertools import chain
+import threading
+
+from .cache import cache_key
+from .metrics import NULL_MEASUREMENT
+from .metrics import default_metrics
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .singleflight import AsyncSingleFlight
+from .singleflight import SingleFlight
+from .trace import NULL_SPAN
 
 
 class CloudTTSError(Exception):
@@ -44,23 +55,204 @@ class Language(Enum):
 
 
 class VoiceConfig:
+    '''
+    This is an immutable set of parameters for voice and audio.
+
+    VoiceConfig is hashable, so that clients memoize request parameters made
+    from it.
+    '''
+
+    __slots__ = ('audio_format', 'gender', 'language')
+
     def __init__(self, audio_format=AudioFormat.mp3, gender=Gender.female,
                  language=Language.en_US):
-        if isinstance(audio_format, AudioFormat):
-            self.audio_format = audio_format
-        else:
+        if not isinstance(audio_format, AudioFormat):
             raise TypeError
 
-        if isinstance(gender, Gender):
-            self.gender = gender
-        else:
+        if not isinstance(gender, Gender):
             raise TypeError
 
-        if isinstance(language, Language):
-            self.language = language
-        else:
+        if not isinstance(language, Language):
             raise TypeError
 
+        object.__setattr__(self, 'audio_format', audio_format)
+        object.__setattr__(self, 'gender', gender)
+        object.__setattr__(self, 'language', language)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('VoiceConfig is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('VoiceConfig is immutable')
+
+    def __reduce__(self):
+        # pickled and copied by the constructor, as attributes can not be set
+        return (VoiceConfig, (self.audio_format, self.gender, self.language))
+
+    def _key(self):
+        return (self.audio_format, self.gender, self.language)
+
+    def __eq__(self, other):
+        if not isinstance(other, VoiceConfig):
+            return NotImplemented
+
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return 'VoiceConfig(audio_format={}, gender={}, language={})'.format(
+            self.audio_format, self.gender, self.language)
+
+
+class RequestPlan(dict):
+    '''
+    This is validated parameters for the API, made by Client._make_params().
+
+    Plans are memoized by clients and shared by requests, so they must not be
+    modified. Clients keep parts of requests derived from the parameters,
+    such as headers, in attributes of a plan.
+    '''
+
+
+def _plan_key(vc, detail):
+    # returns None if the plan can not be memoized
+    if vc is not None and not isinstance(vc, VoiceConfig):
+        return None
+
+    if not detail:
+        return (vc, None)
+
+    try:
+        return (vc, frozenset((name, type(value), value)
+                              for name, value in detail.items()))
+    except (AttributeError, TypeError):
+        return None
+
+
+class BatchResult:
+    '''
+    This is a result of an item passed to Client.tts_many().
+
+    Args:
+      item: string or dict / the item
+      audio: binary / synthesized audio data, or None if it failed
+      error: Exception / raised exception, or None if it succeeded
+    '''
+
+    def __init__(self, item, audio=None, error=None):
+        self.item = item
+        self.audio = audio
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @classmethod
+    def _from_future(cls, item, future):
+        error = future.exception()
+        if error is not None:
+            return cls(item, error=error)
+
+        return cls(item, audio=future.result())
+
+
+# threads shared by tts_many() of every client
+SHARED_EXECUTOR_WORKERS = 32
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+def shared_executor():
+    '''
+    Returns the executor used by tts_many() if no executor is passed.
+
+    Returns:
+      concurrent.futures.ThreadPoolExecutor
+    '''
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    global _shared_executor
+
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(
+                max_workers=SHARED_EXECUTOR_WORKERS,
+                thread_name_prefix='cloudtts')
+
+        return _shared_executor
+
+
+def _batch_kwargs(item):
+    # an item is text or keyword arguments of tts()
+    if isinstance(item, str):
+        return {'text': item}
+
+    if isinstance(item, dict):
+        return item
+
+    raise TypeError('An item must be a string or a dict')
+
+
+def _batch_key(kwargs):
+    key = []
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, dict):
+            value = sorted(value.items())
+        key.append((name, repr(value)))
+
+    return tuple(key)
+
+
+def _sink_writer(sink):
+    # returns a function which writes a chunk of audio data into sink
+    if isinstance(sink, bytearray):
+        offset = 0
+
+        def write(chunk):
+            nonlocal offset
+            # a bytearray grows when audio data exceeds it
+            sink[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+
+        return write
+
+    if isinstance(sink, memoryview):
+        view = sink.cast('B')
+        offset = 0
+
+        def write(chunk):
+            nonlocal offset
+            end = offset + len(chunk)
+            if end > len(view):
+                raise ValueError('Audio data does not fit in the buffer')
+            view[offset:end] = chunk
+            offset = end
+
+        return write
+
+    if hasattr(sink, 'sendall'):
+        return sink.sendall
+
+    if hasattr(sink, 'write'):
+        return sink.write
+
+    raise TypeError('A sink must be a writable file, a bytearray, '
+                    'a memoryview or a socket')
+
+
+def _batch_size(kwargs):
+    size = 0
+    for name in ('text', 'ssml'):
+        if isinstance(kwargs.get(name), str):
+            size += len(kwargs[name].encode('utf-8'))
+
+    return size
+
 
 class Client:
     '''
@@ -70,7 +262,36 @@ class Client:
     TOO_LONG_DATA_MSG = ('Too long data is passed to tts(). '
                          'Available up to {} characters, but got {}.')
 
-    def __init__(self, credential=None):
+    # name of the service in cloudtts.registry
+    PROVIDER = None
+
+    # whether tts() takes SSML as text instead of ssml
+    SSML_IN_TEXT = False
+
+    CREDENTIAL_CLASS = None
+
+    STREAM_CHUNK_SIZE = 8192
+
+    # quota of the service used with rate_limit=True
+    RATE_LIMIT = None
+
+    SINGLE_FLIGHT_CLASS = SingleFlight
+
+    # number of request plans memoized by a client
+    MAX_PLANS = 256
+
+    # bytes of audio data tts_into() keeps in memory before spooling to disk
+    SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, credential=None, cache=None, rate_limit=None,
+                 retry=None, coalesce=True, tracer=None, metrics=True):
+        self.cache = cache
+        self.rate_limit = rate_limit
+        self.retry = retry
+        self.coalesce = coalesce
+        self.tracer = tracer
+        self.metrics = metrics
+        self._flights = self.SINGLE_FLIGHT_CLASS()
         self.auth(credential)
 
     def _voice_config_to_dict(self, vc):
@@ -80,6 +301,29 @@ class Client:
         pass
 
     def _make_params(self, vc, detail):
+        '''
+        Returns a RequestPlan for vc and detail.
+
+        A plan is validated and compiled once and reused by later calls with
+        the same vc and detail.
+        '''
+
+        key = _plan_key(vc, detail)
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        with self._span('plan'):
+            plan = self._plan(self._build_params(vc, detail))
+
+        if key is not None:
+            if len(self._plans) >= self.MAX_PLANS:
+                self._plans.clear()
+            self._plans[key] = plan
+
+        return plan
+
+    def _build_params(self, vc, detail):
         params = {}
 
         if vc and detail:
@@ -92,7 +336,7 @@ class Client:
                 raise TypeError
             params = self._voice_config_to_dict(vc)
         elif detail:
-            params = detail
+            params = dict(detail)
         else:
             vc = VoiceConfig()
             params = self._voice_config_to_dict(vc)
@@ -102,8 +346,826 @@ class Client:
 
         return params
 
+    def _plan(self, params):
+        '''
+        Returns params as a RequestPlan with parts of requests compiled.
+        '''
+
+        if isinstance(params, RequestPlan):
+            return params
+
+        plan = RequestPlan(params)
+        self._compile_plan(plan)
+
+        return plan
+
+    def _compile_plan(self, plan):
+        '''
+        Sets parts of requests which depend only on plan and the credential
+        to attributes of plan.
+        '''
+
+        pass
+
+    @classmethod
+    def capabilities(cls):
+        '''
+        Returns combinations of voice and audio which VoiceConfig can select
+        in this service.
+
+        Returns:
+          iterable of cloudtts.registry.Capability
+        '''
+
+        return ()
+
+    def supports(self, voice_config=None):
+        '''
+        Returns whether this client can synthesize audio for voice_config.
+
+        Args:
+          voice_config: VoiceConfig / parameters for voice and audio
+
+        Returns:
+          bool
+        '''
+
+        try:
+            self._make_params(voice_config, None)
+        except (TypeError, ValueError):
+            return False
+
+        return True
+
     def auth(self, credential):
         self.credential = credential
+        # plans may depend on the credential
+        self._plans = {}
+
+    def _check_credential(self):
+        if not self.credential:
+            raise CloudTTSError('No Authentication yet')
+
+        if self.CREDENTIAL_CLASS and \
+                not isinstance(self.credential, self.CREDENTIAL_CLASS):
+            raise TypeError('Invalid credential')
+
+    def close(self):
+        '''
+        Releases connections held by this client.
+        '''
+
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _fits(self, params, text='', ssml=''):
+        '''
+        Returns whether data is not too long for the API.
+        '''
+
+        return True
+
+    def _request(self, params, text, ssml):
+        '''
+        Calls the API and returns synthesized audio data.
+        '''
+
+        pass
+
+    def _request_stream(self, params, text, ssml):
+        '''
+        Calls the API and yields synthesized audio data as it arrives.
+
+        Clients which can not read a response incrementally yield whole
+        audio data at once.
+        '''
+
+        audio = self._request(params, text, ssml)
+        if audio is not None:
+            yield audio
+
+    def _rate_limit_key(self):
+        '''
+        Returns a key of the credential which shares a quota.
+        '''
+
+        return (type(self).__name__, id(self.credential))
+
+    def _rate_limiter(self):
+        rate_limit = self.rate_limit
+        if rate_limit is True:
+            rate_limit = self.RATE_LIMIT
+
+        if rate_limit is None or rate_limit is False:
+            return None
+
+        if isinstance(rate_limit, RateLimiter):
+            return rate_limit
+
+        return RateLimiter.shared(self._rate_limit_key(), rate_limit)
+
+    def _throttle(self, text, ssml):
+        limiter = self._rate_limiter()
+        if limiter is not None:
+            with self._span('throttle'):
+                limiter.acquire(len(text or ssml))
+
+    def _retry_policy(self):
+        if self.retry is True:
+            return RetryPolicy()
+
+        return self.retry or None
+
+    def _retryable_errors(self):
+        '''
+        Returns exception classes of transient failures, such as connection
+        errors, which are retried by RetryPolicy.
+        '''
+
+        return ()
+
+    def _cached(self, params, text, ssml):
+        # returns a cache key and cached audio
+        if self.cache is None:
+            return None, None
+
+        with self._span('cache') as span:
+            key = cache_key(type(self).__name__, params, text, ssml)
+            audio = self.cache.get(key)
+            span.set_attribute('cloudtts.hit', audio is not None)
+
+        if audio is not None:
+            self._cache_hit(params)
+
+        return key, audio
+
+    def _span(self, name):
+        '''
+        Returns a span of a phase of synthesis, which does nothing unless
+        the client has a tracer.
+        '''
+
+        if self.tracer is None:
+            return NULL_SPAN
+
+        return self.tracer.start_as_current_span('cloudtts.' + name)
+
+    def _provider(self):
+        return self.PROVIDER or type(self).__name__
+
+    def _voice(self, params):
+        return params.get('voice') or params.get('voice_id') or \
+            params.get('language')
+
+    def _metrics(self):
+        if self.metrics is True:
+            return default_metrics()
+
+        return self.metrics or None
+
+    def _measure(self, params, text, ssml):
+        '''
+        Counts a request to the API and returns a Measurement of it, which
+        does nothing if metrics are disabled.
+        '''
+
+        metrics = self._metrics()
+        if metrics is None:
+            return NULL_MEASUREMENT
+
+        return metrics.measure(self._provider(), self._voice(params),
+                               len(text or ssml))
+
+    def _cache_hit(self, params):
+        metrics = self._metrics()
+        if metrics is not None:
+            metrics.cache_hit(self._provider(), self._voice(params))
+
+    def _trace_attributes(self, span, params, text, ssml):
+        span.set_attribute('cloudtts.provider', self._provider())
+        voice = self._voice(params)
+        if voice is not None:
+            span.set_attribute('cloudtts.voice', voice)
+        span.set_attribute('cloudtts.characters', len(text or ssml))
+
+    def _synthesize(self, params, text='', ssml=''):
+        with self._span('tts') as span:
+            if span.is_recording():
+                self._trace_attributes(span, params, text, ssml)
+
+            audio = self._synthesize_audio(params, text, ssml)
+            if audio is not None:
+                span.set_attribute('cloudtts.bytes', len(audio))
+
+            return audio
+
+    def _synthesize_audio(self, params, text, ssml):
+        # a cache may return a memoryview, but tts() returns bytes
+        key, audio = self._cached(params, text, ssml)
+        if audio is not None:
+            return bytes(audio)
+
+        attempts = 0
+
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+
+            # a retry may find audio cached by another caller meanwhile, and
+            # it is not requested and charged again
+            if attempts > 1 and key is not None:
+                audio = self.cache.get(key)
+                if audio is not None:
+                    self._cache_hit(params)
+                    return bytes(audio)
+
+            self._throttle(text, ssml)
+            with self._span('request') as span, \
+                    self._measure(params, text, ssml) as measurement:
+                span.set_attribute('cloudtts.attempt', attempts)
+                audio = self._request(params, text, ssml)
+                if audio is not None:
+                    span.set_attribute('cloudtts.bytes', len(audio))
+                    measurement.size = len(audio)
+
+            if key is not None and audio is not None:
+                self.cache.set(key, audio)
+
+            return audio
+
+        def synthesize():
+            policy = self._retry_policy()
+            if policy is None:
+                return attempt()
+
+            return policy.call(attempt, self._retryable_errors())
+
+        if not self.coalesce:
+            return synthesize()
+
+        # concurrent callers of the same request share one synthesis
+        flight = key or cache_key(type(self).__name__, params, text, ssml)
+
+        return self._flights.do(flight, synthesize)
+
+    def _synthesize_stream(self, params, text='', ssml=''):
+        key, audio = self._cached(params, text, ssml)
+        if audio is not None:
+            yield audio
+            return
+
+        def start():
+            self._throttle(text, ssml)
+            measurement = self._measure(params, text, ssml)
+            stream = self._request_stream(params, text, ssml)
+
+            # a request is sent when the first chunk is read, so failures
+            # before audio arrives can be retried
+            try:
+                for chunk in stream:
+                    measurement.first_byte()
+                    return stream, [chunk], measurement
+            except Exception as e:
+                measurement.fail(e)
+                raise
+
+            return stream, [], measurement
+
+        policy = self._retry_policy()
+        if policy is None:
+            stream, head, measurement = start()
+        else:
+            stream, head, measurement = policy.call(
+                start, self._retryable_errors())
+
+        chunks = []
+        with measurement:
+            for chunk in chain(head, stream):
+                measurement.size += len(chunk)
+                if key is not None:
+                    chunks.append(chunk)
+                yield chunk
+
+        if key is not None and chunks:
+            self.cache.set(key, b''.join(chunks))
 
     def tts(self, text, voice_config=None, detail=None):
         pass
+
+    def tts_stream(self, text, voice_config=None, detail=None):
+        pass
+
+    def _stream_kwargs(self, text, ssml, voice_config, detail):
+        # keyword arguments of tts_stream(), which takes SSML as text in
+        # some services
+        kwargs = {'voice_config': voice_config, 'detail': detail}
+        if self.SSML_IN_TEXT:
+            kwargs['text'] = ssml or text
+        else:
+            kwargs['text'] = text
+            kwargs['ssml'] = ssml
+
+        return kwargs
+
+    def _spool(self):
+        import tempfile
+
+        return tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE)
+
+    def tts_into(self, sink, text='', ssml='', voice_config=None,
+                 detail=None):
+        '''
+        Synthesizes audio data for text and writes it into sink as it
+        arrives, without building the whole audio data in memory.
+
+        If sink is None, audio data is written into a temporary file, which
+        is kept in memory up to SPOOL_MAX_SIZE bytes and moved to disk above
+        it, and the file is returned at its start.
+
+        >>> with open('hello.mp3', 'wb') as f:
+        ...     c.tts_into(f, 'Hello world!')
+
+        Args:
+          sink: writable binary file, bytearray, memoryview, socket or None
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+
+        Returns:
+          int / number of bytes written, or the temporary file if sink is
+          None
+        '''
+
+        kwargs = self._stream_kwargs(text, ssml, voice_config, detail)
+
+        return self._write_into(sink, lambda: self.tts_stream(**kwargs))
+
+    def _write_into(self, sink, stream):
+        # writes chunks yielded by stream() into sink, or a spooled
+        # temporary file if sink is None
+        if sink is None:
+            spool = self._spool()
+            try:
+                self._write_into(spool, stream)
+            except BaseException:
+                spool.close()
+                raise
+            spool.seek(0)
+
+            return spool
+
+        write = _sink_writer(sink)
+        size = 0
+        for chunk in stream():
+            write(chunk)
+            size += len(chunk)
+
+        return size
+
+    def tts_chunked(self, text='', ssml='', voice_config=None, detail=None,
+                    max_workers=4):
+        '''
+        Synthesizes audio data for text of any length.
+
+        Text is split at sentence and clause boundaries into chunks which the
+        API accepts, chunks are synthesized concurrently, and audio data of
+        them is joined in order with cloudtts.audio.join().
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+          max_workers: int / number of chunks synthesized at once
+
+        Returns:
+          binary
+        '''
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        from .audio import join
+
+        params, chunks = self._split(text, ssml, voice_config, detail)
+
+        if len(chunks) == 1:
+            return self._synthesize(params, **chunks[0])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return join(executor.map(lambda c: self._synthesize(params, **c),
+                                     chunks),
+                        self._chunk_format(voice_config, detail))
+
+    def tts_many(self, items, max_concurrency=8,
+                 max_inflight_bytes=1024 * 1024, executor=None):
+        '''
+        Synthesizes audio data for many items concurrently.
+
+        Items are read one by one, so that a generator is not consumed ahead
+        of requests. At most max_concurrency requests, whose text and SSML
+        are up to max_inflight_bytes in total, are in flight at once.
+        Identical items are synthesized once.
+
+        Args:
+          items: iterable / text, or dict of keyword arguments of tts()
+          max_concurrency: int / number of requests in flight at once
+          max_inflight_bytes: int / bytes of text and SSML in flight at once
+          executor: concurrent.futures.Executor / runs requests,
+                    shared_executor() by default
+
+        Returns:
+          list of BatchResult / results in the order of items
+        '''
+
+        from concurrent.futures import FIRST_COMPLETED
+        from concurrent.futures import wait
+
+        executor = executor or shared_executor()
+
+        futures = {}
+        pending = {}
+        pending_bytes = 0
+        entries = []
+
+        def submit(kwargs):
+            nonlocal pending_bytes
+
+            size = _batch_size(kwargs)
+            while pending and (len(pending) >= max_concurrency or
+                               pending_bytes + size > max_inflight_bytes):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending_bytes -= pending.pop(future)
+
+            future = executor.submit(lambda: self.tts(**kwargs))
+            pending[future] = size
+            pending_bytes += size
+
+            return future
+
+        for item in items:
+            try:
+                kwargs = _batch_kwargs(item)
+            except TypeError as e:
+                entries.append((item, e))
+                continue
+
+            key = _batch_key(kwargs)
+            if key not in futures:
+                futures[key] = submit(kwargs)
+            entries.append((item, futures[key]))
+
+        wait(pending)
+
+        return [BatchResult(item, error=entry)
+                if isinstance(entry, Exception)
+                else BatchResult._from_future(item, entry)
+                for item, entry in entries]
+
+    def _chunk_format(self, voice_config, detail):
+        # the format of chunks for cloudtts.audio.join(), which is detected
+        # if detail may choose another one
+        if detail:
+            return None
+
+        return (voice_config or VoiceConfig()).audio_format
+
+    def _split(self, text, ssml, voice_config, detail):
+        # returns params and keyword arguments of _synthesize() for chunks
+        from .chunk import is_ssml, split_ssml, split_text
+
+        self._check_credential()
+
+        if self.SSML_IN_TEXT and not ssml and is_ssml(text):
+            text, ssml = '', text
+
+        if not text and not ssml:
+            raise ValueError('No text or ssml is passed')
+
+        params = self._make_params(voice_config, detail)
+
+        if ssml and not self.SSML_IN_TEXT:
+            chunks = split_ssml(ssml, lambda c: self._fits(params, ssml=c))
+            return params, [{'ssml': c} for c in chunks]
+
+        if ssml:
+            chunks = split_ssml(ssml, lambda c: self._fits(params, text=c))
+        else:
+            chunks = split_text(text, lambda c: self._fits(params, text=c))
+
+        return params, [{'text': c} for c in chunks]
+
+
+class AsyncClient(Client):
+    '''
+    This is a base client for asyncio.
+
+    Async clients are made by mixing this class into a client, so that they
+    validate input and make parameters in the same way. tts() returns an
+    awaitable and tts_stream() returns an async iterator.
+    '''
+
+    SINGLE_FLIGHT_CLASS = AsyncSingleFlight
+
+    async def _request(self, params, text, ssml):
+        '''
+        Calls the API and returns synthesized audio data.
+        '''
+
+        pass
+
+    async def _request_stream(self, params, text, ssml):
+        '''
+        Calls the API and yields synthesized audio data as it arrives.
+        '''
+
+        audio = await self._request(params, text, ssml)
+        if audio is not None:
+            yield audio
+
+    async def _throttle(self, text, ssml):
+        limiter = self._rate_limiter()
+        if limiter is not None:
+            with self._span('throttle'):
+                await limiter.acquire_async(len(text or ssml))
+
+    async def _synthesize(self, params, text='', ssml=''):
+        with self._span('tts') as span:
+            if span.is_recording():
+                self._trace_attributes(span, params, text, ssml)
+
+            audio = await self._synthesize_audio(params, text, ssml)
+            if audio is not None:
+                span.set_attribute('cloudtts.bytes', len(audio))
+
+            return audio
+
+    async def _synthesize_audio(self, params, text, ssml):
+        key, audio = self._cached(params, text, ssml)
+        if audio is not None:
+            return bytes(audio)
+
+        attempts = 0
+
+        async def attempt():
+            nonlocal attempts
+            attempts += 1
+
+            if attempts > 1 and key is not None:
+                audio = self.cache.get(key)
+                if audio is not None:
+                    self._cache_hit(params)
+                    return bytes(audio)
+
+            await self._throttle(text, ssml)
+            with self._span('request') as span, \
+                    self._measure(params, text, ssml) as measurement:
+                span.set_attribute('cloudtts.attempt', attempts)
+                audio = await self._request(params, text, ssml)
+                if audio is not None:
+                    span.set_attribute('cloudtts.bytes', len(audio))
+                    measurement.size = len(audio)
+
+            if key is not None and audio is not None:
+                self.cache.set(key, audio)
+
+            return audio
+
+        async def synthesize():
+            policy = self._retry_policy()
+            if policy is None:
+                return await attempt()
+
+            return await policy.call_async(attempt,
+                                           self._retryable_errors())
+
+        if not self.coalesce:
+            return await synthesize()
+
+        flight = key or cache_key(type(self).__name__, params, text, ssml)
+
+        return await self._flights.do(flight, synthesize)
+
+    async def _synthesize_stream(self, params, text='', ssml=''):
+        key, audio = self._cached(params, text, ssml)
+        if audio is not None:
+            yield audio
+            return
+
+        async def start():
+            await self._throttle(text, ssml)
+            measurement = self._measure(params, text, ssml)
+            stream = self._request_stream(params, text, ssml)
+
+            try:
+                async for chunk in stream:
+                    measurement.first_byte()
+                    return stream, [chunk], measurement
+            except Exception as e:
+                measurement.fail(e)
+                raise
+
+            return stream, [], measurement
+
+        policy = self._retry_policy()
+        if policy is None:
+            stream, head, measurement = await start()
+        else:
+            stream, head, measurement = await policy.call_async(
+                start, self._retryable_errors())
+
+        chunks = []
+        with measurement:
+            for chunk in head:
+                measurement.size += len(chunk)
+                if key is not None:
+                    chunks.append(chunk)
+                yield chunk
+
+            async for chunk in stream:
+                measurement.size += len(chunk)
+                if key is not None:
+                    chunks.append(chunk)
+                yield chunk
+
+        if key is not None and chunks:
+            self.cache.set(key, b''.join(chunks))
+
+    async def tts_chunked(self, text='', ssml='', voice_config=None,
+                          detail=None, max_workers=4):
+        '''
+        Synthesizes audio data for text of any length.
+
+        This works like Client.tts_chunked(), but chunks are synthesized as
+        tasks of the running event loop.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+          max_workers: int / number of chunks synthesized at once
+
+        Returns:
+          binary
+        '''
+
+        import asyncio
+
+        from .audio import join
+
+        params, chunks = self._split(text, ssml, voice_config, detail)
+
+        if len(chunks) == 1:
+            return await self._synthesize(params, **chunks[0])
+
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def synthesize(chunk):
+            async with semaphore:
+                return await self._synthesize(params, **chunk)
+
+        return join(await asyncio.gather(*map(synthesize, chunks)),
+                    self._chunk_format(voice_config, detail))
+
+    async def tts_into(self, sink, text='', ssml='', voice_config=None,
+                       detail=None):
+        '''
+        Synthesizes audio data for text and writes it into sink as it
+        arrives.
+
+        This works like Client.tts_into(). A socket must be non-blocking, as
+        it is written by the event loop, and a sink with drain(), such as
+        asyncio.StreamWriter, is drained after each write.
+
+        Args:
+          sink: writable binary file, bytearray, memoryview, socket,
+                asyncio.StreamWriter or None
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+
+        Returns:
+          int / number of bytes written, or the temporary file if sink is
+          None
+        '''
+
+        kwargs = self._stream_kwargs(text, ssml, voice_config, detail)
+
+        return await self._write_into(sink,
+                                      lambda: self.tts_stream(**kwargs))
+
+    async def _write_into(self, sink, stream):
+        import asyncio
+
+        if sink is None:
+            spool = self._spool()
+            try:
+                await self._write_into(spool, stream)
+            except BaseException:
+                spool.close()
+                raise
+            spool.seek(0)
+
+            return spool
+
+        loop = asyncio.get_running_loop()
+        write = _sink_writer(sink)
+        size = 0
+        async for chunk in stream():
+            if hasattr(sink, 'sendall'):
+                await loop.sock_sendall(sink, chunk)
+            else:
+                write(chunk)
+                if hasattr(sink, 'drain'):
+                    await sink.drain()
+            size += len(chunk)
+
+        return size
+
+    async def tts_many(self, items, max_concurrency=8,
+                       max_inflight_bytes=1024 * 1024):
+        '''
+        Synthesizes audio data for many items concurrently.
+
+        This works like Client.tts_many(), but requests are tasks of the
+        running event loop.
+
+        Args:
+          items: iterable / text, or dict of keyword arguments of tts()
+          max_concurrency: int / number of requests in flight at once
+          max_inflight_bytes: int / bytes of text and SSML in flight at once
+
+        Returns:
+          list of BatchResult / results in the order of items
+        '''
+
+        import asyncio
+
+        tasks = {}
+        pending = {}
+        pending_bytes = 0
+        entries = []
+
+        async def tts(kwargs):
+            return await self.tts(**kwargs)
+
+        async def submit(kwargs):
+            nonlocal pending_bytes
+
+            size = _batch_size(kwargs)
+            while pending and (len(pending) >= max_concurrency or
+                               pending_bytes + size > max_inflight_bytes):
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending_bytes -= pending.pop(task)
+
+            task = asyncio.ensure_future(tts(kwargs))
+            pending[task] = size
+            pending_bytes += size
+
+            return task
+
+        for item in items:
+            try:
+                kwargs = _batch_kwargs(item)
+            except TypeError as e:
+                entries.append((item, e))
+                continue
+
+            key = _batch_key(kwargs)
+            if key not in tasks:
+                tasks[key] = await submit(kwargs)
+            entries.append((item, tasks[key]))
+
+        if pending:
+            await asyncio.wait(pending)
+
+        return [BatchResult(item, error=entry)
+                if isinstance(entry, Exception)
+                else BatchResult._from_future(item, entry)
+                for item, entry in entries]
+
+    async def close(self):
+        '''
+        Releases connections held by this client.
+        '''
+
+        pass
+
+    def __enter__(self):
+        raise TypeError('Use "async with" for async clients')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
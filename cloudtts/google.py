@@ -1,14 +1,39 @@
-import os
 import re
+import threading
 
-from google.cloud import texttospeech
-
+from .client import AsyncClient
 from .client import AudioFormat
 from .client import Client
 from .client import CloudTTSError
 from .client import Gender
 from .client import Language
 from .client import VoiceConfig
+from .ratelimit import RateLimit
+from .registry import Capability
+
+
+def _texttospeech():
+    # google.cloud.texttospeech loads gRPC and protobuf, which takes a while.
+    # It is imported when GoogleClient is actually used.
+    from google.cloud import texttospeech
+
+    return texttospeech
+
+
+class _sdk_attribute:
+    '''
+    This is a class attribute which is computed from the SDK on first access.
+    '''
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+    def __get__(self, instance, owner):
+        value = self.func()
+        setattr(owner, self.name, value)
+
+        return value
 
 
 class GoogleClient(Client):
@@ -20,18 +45,47 @@ class GoogleClient(Client):
     >>> audio = c.tts('Hello world!')
     >>> open('/path/to/save/audio', 'wb') as f:
     ...   f.write(audio)
+
+    A gRPC channel is opened on the first call of tts() and reused until the
+    client is closed. Options for the channel can be passed as a dict.
+
+    >>> c = GoogleClient('/path/to/credential.json',
+    ...                  channel_options={'grpc.keepalive_time_ms': 10000})
     '''
 
-    MAX_TEXT_LENGTH = 5000
-    AUDIO_FORMAT_DICT = {
-        AudioFormat.mp3: texttospeech.enums.AudioEncoding.MP3,
-        AudioFormat.ogg_opus: texttospeech.enums.AudioEncoding.OGG_OPUS,
+    ADDRESS = 'texttospeech.googleapis.com:443'
+    CHANNEL_OPTIONS = {
+        'grpc.max_send_message_length': -1,
+        'grpc.max_receive_message_length': -1,
+        'grpc.keepalive_time_ms': 30000,
+        'grpc.keepalive_timeout_ms': 10000,
+        'grpc.keepalive_permit_without_calls': 1,
     }
 
-    GENDER_DICT = {
-        Gender.male: texttospeech.enums.SsmlVoiceGender.MALE,
-        Gender.female: texttospeech.enums.SsmlVoiceGender.FEMALE,
-    }
+    PROVIDER = 'google'
+    MAX_TEXT_LENGTH = 5000
+
+    # default quota of a project
+    RATE_LIMIT = RateLimit(requests=1000, characters=150000, period=60)
+
+    # keys of AUDIO_FORMAT_DICT, which are known without the SDK
+    AUDIO_FORMATS = (AudioFormat.mp3, AudioFormat.ogg_opus)
+
+    @_sdk_attribute
+    def AUDIO_FORMAT_DICT():
+        texttospeech = _texttospeech()
+        return {
+            AudioFormat.mp3: texttospeech.enums.AudioEncoding.MP3,
+            AudioFormat.ogg_opus: texttospeech.enums.AudioEncoding.OGG_OPUS,
+        }
+
+    @_sdk_attribute
+    def GENDER_DICT():
+        texttospeech = _texttospeech()
+        return {
+            Gender.male: texttospeech.enums.SsmlVoiceGender.MALE,
+            Gender.female: texttospeech.enums.SsmlVoiceGender.FEMALE,
+        }
 
     AVAILABLE_LANGUAGES = [
         Language.nl_NL,
@@ -50,6 +104,24 @@ class GoogleClient(Client):
         Language.tr_TR,
     ]
 
+    def __init__(self, credential=None, channel_options=None, address=None,
+                 **kwargs):
+        self.channel_options = dict(GoogleClient.CHANNEL_OPTIONS)
+        self.channel_options.update(channel_options or {})
+        self.address = address or GoogleClient.ADDRESS
+        self._client = None
+        self._client_lock = threading.Lock()
+        super().__init__(credential, **kwargs)
+
+    @classmethod
+    def capabilities(cls):
+        # a voice is chosen by the service from language and gender
+        for language in cls.AVAILABLE_LANGUAGES:
+            for gender in Gender:
+                for audio_format in cls.AUDIO_FORMATS:
+                    yield Capability(cls.PROVIDER, language, gender,
+                                     audio_format, None, None)
+
     def _voice_config_to_dict(self, vc):
         d = {}
 
@@ -70,13 +142,14 @@ class GoogleClient(Client):
             return False
 
         return isinstance(params['audio_encoding'],
-                          texttospeech.enums.AudioEncoding)
+                          _texttospeech().enums.AudioEncoding)
 
     def _is_valid_gender(self, params):
         if 'gender' not in params:
             return False
 
-        return isinstance(params['gender'], texttospeech.enums.SsmlVoiceGender)
+        return isinstance(params['gender'],
+                          _texttospeech().enums.SsmlVoiceGender)
 
     def _is_valid_language(self, params):
         if 'language' not in params:
@@ -99,13 +172,84 @@ class GoogleClient(Client):
 
         Args:
           credential: string / path to JSON file
+                      or google.auth.credentials.Credentials
         '''
 
-        if credential:
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credential
-
+        self.close()
         super().auth(credential)
 
+    def _credentials(self):
+        from google.oauth2 import service_account
+
+        if isinstance(self.credential, str):
+            return service_account.Credentials.from_service_account_file(
+                self.credential)
+
+        return self.credential
+
+    def _tts_client(self):
+        client = self._client
+        if client is not None:
+            return client
+
+        with self._client_lock:
+            if self._client is None:
+                with self._span('client'):
+                    self._client = self._create_client()
+
+            return self._client
+
+    def _create_client(self):
+        from google.cloud.texttospeech_v1.gapic.transports import \
+            text_to_speech_grpc_transport
+
+        texttospeech = _texttospeech()
+        transport_class = \
+            text_to_speech_grpc_transport.TextToSpeechGrpcTransport
+
+        return texttospeech.TextToSpeechClient(
+            transport=transport_class(channel=self._create_channel()))
+
+    def _create_channel(self):
+        '''
+        Opens a gRPC channel to address.
+        '''
+
+        from google.cloud.texttospeech_v1.gapic.transports import \
+            text_to_speech_grpc_transport
+
+        transport_class = \
+            text_to_speech_grpc_transport.TextToSpeechGrpcTransport
+
+        return transport_class.create_channel(
+            address=self.address,
+            credentials=self._credentials(),
+            options=list(self.channel_options.items()),
+        )
+
+    def close(self):
+        with self._client_lock:
+            if self._client is not None:
+                self._client.transport.channel.close()
+                self._client = None
+
+    def _rate_limit_key(self):
+        if isinstance(self.credential, str):
+            return ('google', self.credential)
+
+        email = getattr(self.credential, 'service_account_email', None)
+        return ('google', email or id(self.credential))
+
+    def _text_length(self, text, ssml):
+        # text is counted if both of text and ssml are passed
+        if text:
+            return len(text)
+
+        return len(re.compile('</?speak>').sub('', ssml))
+
+    def _fits(self, params, text='', ssml=''):
+        return self._text_length(text, ssml) <= GoogleClient.MAX_TEXT_LENGTH
+
     def tts(self, text='', ssml='', voice_config=None, detail=None):
         '''
         Synthesizes audio data for text.
@@ -120,35 +264,141 @@ class GoogleClient(Client):
           binary
         '''
 
-        if not self.credential:
-            raise CloudTTSError('No Authentication yet')
+        params = self._prepare(text, ssml, voice_config, detail)
 
-        if text:
-            if len(text) > GoogleClient.MAX_TEXT_LENGTH:
-                msg = Client.TOO_LONG_DATA_MSG.format(
-                    GoogleClient.MAX_TEXT_LENGTH, len(text))
-                raise CloudTTSError(msg)
-        elif ssml:
-            _text = re.compile('</?speak>').sub('', ssml)
-            if len(_text) > GoogleClient.MAX_TEXT_LENGTH:
-                msg = Client.TOO_LONG_DATA_MSG.format(
-                    GoogleClient.MAX_TEXT_LENGTH, len(_text))
-                raise CloudTTSError(msg)
-        else:
-            raise ValueError('No text or ssml is passed')
+        return self._synthesize(params, text=text, ssml=ssml)
 
-        params = self._make_params(voice_config, detail)
+    def tts_stream(self, text='', ssml='', voice_config=None, detail=None):
+        '''
+        Synthesizes audio data for text and yields it as it arrives.
+
+        Google Cloud Text-to-Speech returns whole audio data in a response, so
+        it is yielded at once.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+
+        Returns:
+          generator of binary
+        '''
+
+        params = self._prepare(text, ssml, voice_config, detail)
 
-        client = texttospeech.TextToSpeechClient()
+        return self._synthesize_stream(params, text=text, ssml=ssml)
+
+    def _prepare(self, text, ssml, voice_config, detail):
+        self._check_credential()
+
+        if not text and not ssml:
+            raise ValueError('No text or ssml is passed')
+
+        length = self._text_length(text, ssml)
+        if length > GoogleClient.MAX_TEXT_LENGTH:
+            msg = Client.TOO_LONG_DATA_MSG.format(
+                GoogleClient.MAX_TEXT_LENGTH, length)
+            raise CloudTTSError(msg)
+
+        return self._make_params(voice_config, detail)
+
+    def _compile_plan(self, plan):
+        texttospeech = _texttospeech()
+        plan.voice = texttospeech.types.VoiceSelectionParams(
+            language_code=plan['language'],
+            ssml_gender=plan['gender'])
+        plan.audio_config = texttospeech.types.AudioConfig(
+            audio_encoding=plan['audio_encoding'])
+
+    def _synthesis_args(self, params, text, ssml):
+        plan = self._plan(params)
+        texttospeech = _texttospeech()
         if ssml:
             input_text = texttospeech.types.SynthesisInput(ssml=ssml)
         else:
             input_text = texttospeech.types.SynthesisInput(text=text)
-        voice = texttospeech.types.VoiceSelectionParams(
-            language_code=params['language'],
-            ssml_gender=params['gender'])
-        audio_config = texttospeech.types.AudioConfig(
-            audio_encoding=params['audio_encoding'])
-        response = client.synthesize_speech(input_text, voice, audio_config)
+
+        return input_text, plan.voice, plan.audio_config
+
+    def _request(self, params, text, ssml):
+        client = self._tts_client()
+        response = client.synthesize_speech(
+            *self._synthesis_args(params, text, ssml))
 
         return response.audio_content
+
+
+class AsyncGoogleClient(AsyncClient, GoogleClient):
+    '''
+    This is an asyncio client class for Google Cloud Text-to-Speech API
+
+    Requests are sent on a grpc.aio channel, which is opened on the first
+    call of tts() and reused until the client is closed.
+
+    >>> from cloudtts import AsyncGoogleClient
+    >>> async with AsyncGoogleClient('/path/to/credential.json') as c:
+    ...     audio = await c.tts('Hello world!')
+    '''
+
+    SCOPES = ('https://www.googleapis.com/auth/cloud-platform',)
+
+    def __init__(self, credential=None, **kwargs):
+        self._channel = None
+        self._old_channels = []
+        super().__init__(credential, **kwargs)
+
+    def auth(self, credential):
+        '''
+        Authenticates
+
+        A channel opened with the previous credential is closed by close().
+
+        Args:
+          credential: string / path to JSON file
+                      or google.auth.credentials.Credentials
+        '''
+
+        if self._channel is not None:
+            self._old_channels.append(self._channel)
+            self._channel = None
+        Client.auth(self, credential)
+
+    def _create_channel(self):
+        from google.api_core import grpc_helpers_async
+
+        return grpc_helpers_async.create_channel(
+            self.address,
+            credentials=self._credentials(),
+            scopes=AsyncGoogleClient.SCOPES,
+            options=list(self.channel_options.items()),
+        )
+
+    def _stub(self):
+        from google.cloud.texttospeech_v1.proto import cloud_tts_pb2_grpc
+
+        if self._channel is None:
+            with self._span('client'):
+                self._channel = self._create_channel()
+
+        return cloud_tts_pb2_grpc.TextToSpeechStub(self._channel)
+
+    async def _request(self, params, text, ssml):
+        from google.cloud.texttospeech_v1.proto import cloud_tts_pb2
+
+        input_text, voice, audio_config = \
+            self._synthesis_args(params, text, ssml)
+        request = cloud_tts_pb2.SynthesizeSpeechRequest(
+            input=input_text, voice=voice, audio_config=audio_config)
+        response = await self._stub().SynthesizeSpeech(request)
+
+        return response.audio_content
+
+    async def close(self):
+        channels, self._old_channels = self._old_channels, []
+        if self._channel is not None:
+            channels.append(self._channel)
+            self._channel = None
+
+        for channel in channels:
+            await channel.close()
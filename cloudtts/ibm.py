@@ -1,14 +1,48 @@
+import asyncio
+import base64
+from collections import namedtuple
+from contextlib import closing
 import json
 import re
+from urllib.parse import urlencode
 
 import requests
 
+from .client import AsyncClient
 from .client import AudioFormat
 from .client import Client
 from .client import CloudTTSError
 from .client import Gender
 from .client import Language
 from .client import VoiceConfig
+from .registry import Capability
+from .session import AsyncPooledSession
+from .session import PooledSession
+
+_RATE_PATTERN = re.compile(r'rate=(\d+)')
+
+# a word and seconds from the beginning of audio where it starts and ends
+WordTiming = namedtuple('WordTiming', ('word', 'start', 'end'))
+
+# a <mark> of SSML and seconds from the beginning of audio where it is
+Mark = namedtuple('Mark', ('name', 'time'))
+
+
+def _websocket_events(message):
+    # returns events in a text message of the WebSocket interface, which
+    # also sends content types and warnings
+    message = json.loads(message)
+    if 'error' in message:
+        raise CloudTTSError(message['error'])
+
+    events = []
+    if 'words' in message:
+        events.append(('words', tuple(WordTiming(*w)
+                                      for w in message['words'])))
+    if 'marks' in message:
+        events.append(('marks', tuple(Mark(*m) for m in message['marks'])))
+
+    return events
 
 
 class WatsonCredential:
@@ -32,8 +66,20 @@ class WatsonClient(Client):
     >>> audio = c.tts('Hello world!')
     >>> open('/path/to/save/audio', 'wb') as f:
     ...   f.write(audio)
+
+    With websocket=True, audio is synthesized over the WebSocket interface,
+    which sends audio data as it is generated instead of after synthesis
+    finishes. It requires websocket-client.
+
+    >>> c = WatsonClient(cred, websocket=True)
+    >>> for chunk in c.tts_stream(long_text):
+    ...     play(chunk)
     '''
 
+    PROVIDER = 'watson'
+    CREDENTIAL_CLASS = WatsonCredential
+    SESSION_CLASS = PooledSession
+    SSML_IN_TEXT = True
     VERSION = 'v1'
     MAX_TEXT_BYTES = 5 * 1024 - len(json.dumps({'text': ''}))
 
@@ -100,6 +146,21 @@ class WatsonClient(Client):
         (Language.pt_BR, Gender.female): 'pt-BR_IsabelaVoice',
     }
 
+    def __init__(self, credential=None, session_config=None, websocket=False,
+                 **kwargs):
+        self.session = self.SESSION_CLASS(session_config)
+        self.websocket = websocket
+        super().__init__(credential, **kwargs)
+
+    @classmethod
+    def capabilities(cls):
+        # a sample rate can be passed in accept of detail, but VoiceConfig
+        # leaves it to the service
+        for (language, gender), voice in cls.LANG_GENDER_DICT.items():
+            for audio_format in cls.AUDIO_FORMAT_DICT:
+                yield Capability(cls.PROVIDER, language, gender, audio_format,
+                                 None, voice)
+
     def _voice_config_to_dict(self, vc):
         d = {}
 
@@ -116,8 +177,6 @@ class WatsonClient(Client):
         return WatsonClient.MIN_RATE <= r <= WatsonClient.MAX_RATE
 
     def _is_valid_accept(self, params):
-        rate_pat = re.compile('rate=(\d+)')
-
         if 'accept' not in params:
             return False
 
@@ -129,13 +188,13 @@ class WatsonClient(Client):
                 return True
 
             if params['accept'].startswith(codec):
-                with_rate = rate_pat.search(params['accept'])
+                with_rate = _RATE_PATTERN.search(params['accept'])
                 if with_rate and self._is_valid_sampling_rate(int(with_rate[1])):
                     return True
 
         for codec in WatsonClient.AVAILABLE_ACCEPTS['require_rate']:
             if params['accept'].startswith(codec):
-                with_rate = rate_pat.search(params['accept'])
+                with_rate = _RATE_PATTERN.search(params['accept'])
                 if with_rate and self._is_valid_sampling_rate(int(with_rate[1])):
                     return True
 
@@ -150,6 +209,26 @@ class WatsonClient(Client):
     def _is_valid_params(self, params):
         return self._is_valid_accept(params)and self._is_valid_voice(params)
 
+    def _rate_limit_key(self):
+        return ('watson', self.credential.url, self.credential.username)
+
+    def _retryable_errors(self):
+        errors = (requests.ConnectionError, requests.Timeout)
+        if self.websocket:
+            import websocket
+
+            errors += (ConnectionError,
+                       websocket.WebSocketConnectionClosedException,
+                       websocket.WebSocketTimeoutException)
+
+        return errors
+
+    def _text_bytes(self, text):
+        return len(json.dumps(text))
+
+    def _fits(self, params, text='', ssml=''):
+        return self._text_bytes(text) <= WatsonClient.MAX_TEXT_BYTES
+
     def tts(self, text, voice_config=None, detail=None):
         '''
         Synthesizes audio data for text.
@@ -163,43 +242,303 @@ class WatsonClient(Client):
           binary
         '''
 
-        if self.credential:
-            if isinstance(self.credential, WatsonCredential):
-                pass
-            else:
-                raise TypeError('Invalid credential')
-        else:
-            raise CloudTTSError('No Authentication yet')
+        params = self._prepare(text, voice_config, detail)
 
-        params = self._make_params(voice_config, detail)
+        return self._synthesize(params, text=text)
 
-        if not self._is_valid_accept(params):
-            raise ValueError
+    def tts_stream(self, text, voice_config=None, detail=None):
+        '''
+        Synthesizes audio data for text and yields it as it arrives.
 
-        if not self._is_valid_voice(params):
-            raise ValueError
+        Args:
+          text: string / target to be synthesized
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+
+        Returns:
+          generator of binary
+        '''
+
+        params = self._prepare(text, voice_config, detail)
+
+        return self._synthesize_stream(params, text=text)
+
+    def tts_events(self, text, voice_config=None, detail=None,
+                   timings=('words',)):
+        '''
+        Synthesizes audio data for text over the WebSocket interface, and
+        yields it and timings of words as they are generated.
+
+        Events are not cached.
+
+        Args:
+          text: string / target to be synthesized
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+          timings: tuple of string / ('words',) for timings of words, or ()
+                   for none. Marks in SSML are always sent.
+
+        Returns:
+          generator of ('audio', binary), ('words', tuple of WordTiming)
+          and ('marks', tuple of Mark)
+        '''
+
+        params = self._prepare(text, voice_config, detail)
+
+        return self._events(params, text, timings)
+
+    def _events(self, params, text, timings):
+        self._throttle(text, '')
+
+        with self._measure(params, text, '') as measurement:
+            for kind, data in self._websocket(params, text, timings):
+                if kind == 'audio':
+                    if not measurement.size:
+                        measurement.first_byte()
+                    measurement.size += len(data)
+                yield kind, data
+
+    def _prepare(self, text, voice_config, detail):
+        self._check_credential()
+
+        params = self._make_params(voice_config, detail)
 
         if not text:
             raise ValueError('No text is passed')
 
-        text_bytes = len(json.dumps(text))
+        text_bytes = self._text_bytes(text)
         if text_bytes > WatsonClient.MAX_TEXT_BYTES:
             msg = 'Available up to {} bytes, but got {}'.format(
                 WatsonClient.MAX_TEXT_BYTES, text_bytes)
             raise CloudTTSError(msg)
 
-        _url = '{}/{}/synthesize'.format(self.credential.url,
-                                         WatsonClient.VERSION)
+        return params
+
+    def auth(self, credential):
+        super().auth(credential)
+        self._endpoint = None
+        self._websocket_endpoint = None
+        self._authorization = None
+
+    def _url(self):
+        # the URL depends only on the credential
+        if self._endpoint is None:
+            self._endpoint = '{}/{}/synthesize'.format(self.credential.url,
+                                                       WatsonClient.VERSION)
+
+        return self._endpoint
+
+    def _websocket_url(self, plan):
+        if self._websocket_endpoint is None:
+            # http becomes ws and https becomes wss
+            url = self._url()
+            if url.startswith('http'):
+                url = 'ws' + url[len('http'):]
+            self._websocket_endpoint = url
+
+        return '{}?{}'.format(self._websocket_endpoint, plan.websocket_query)
+
+    def _basic_authorization(self):
+        if self._authorization is None:
+            _auth = '{}:{}'.format(self.credential.username,
+                                   self.credential.password)
+            self._authorization = 'Basic {}'.format(
+                base64.b64encode(_auth.encode('utf-8')).decode())
+
+        return self._authorization
+
+    def _query(self, params):
         _query = {'voice': params['voice']}
         if 'customization_id' in params:
             _query['customization_id'] = params['customization_id']
-        _headers = {'Accept': params['accept']}
+
+        return _query
+
+    def _compile_plan(self, plan):
+        plan.query = self._query(plan)
+        plan.headers = {'Accept': plan['accept']}
+        plan.websocket_query = urlencode(plan.query)
+
+    def _websocket_message(self, plan, text, timings):
+        # the first message of the WebSocket interface, which takes accept
+        # in it instead of a header
+        message = {'text': text, 'accept': plan['accept']}
+        if timings:
+            message['timings'] = list(timings)
+
+        return json.dumps(message)
+
+    def _websocket_timeout(self):
+        timeout = self.session.config.timeout
+        if isinstance(timeout, tuple):
+            return max(timeout)
+
+        return timeout
+
+    def _websocket(self, params, text, timings=()):
+        # websocket-client is imported on first use, like SDKs of providers
+        import websocket
+
+        plan = self._plan(params)
+        ws = websocket.create_connection(
+            self._websocket_url(plan), timeout=self._websocket_timeout(),
+            header={'Authorization': self._basic_authorization()})
+
+        with closing(ws):
+            ws.send(self._websocket_message(plan, text, timings))
+
+            # the service closes the connection after the last message
+            while True:
+                opcode, data = ws.recv_data()
+                if opcode == websocket.ABNF.OPCODE_BINARY:
+                    yield 'audio', data
+                elif opcode == websocket.ABNF.OPCODE_TEXT:
+                    yield from _websocket_events(data)
+                elif opcode == websocket.ABNF.OPCODE_CLOSE:
+                    return
+
+    def _post(self, params, text, stream=False):
+        plan = self._plan(params)
         _auth = (self.credential.username, self.credential.password)
 
-        r = requests.post(url=_url, params=_query, headers=_headers,
-                          auth=_auth, json={'text': text})
+        r = self.session.post(url=self._url(), params=plan.query,
+                              headers=plan.headers, auth=_auth,
+                              json={'text': text}, stream=stream)
+
+        if r.status_code != requests.codes.ok:
+            # a streamed response keeps its connection until it is closed
+            with closing(r):
+                r.raise_for_status()
+
+        return r
+
+    def _request(self, params, text, ssml):
+        if self.websocket:
+            return b''.join(self._request_stream(params, text, ssml))
+
+        r = self._post(params, text)
 
         if r.status_code == requests.codes.ok:
             return r.content
-        else:
+
+    def _request_stream(self, params, text, ssml):
+        if self.websocket:
+            for kind, data in self._websocket(params, text):
+                if kind == 'audio':
+                    yield data
+            return
+
+        with closing(self._post(params, text, stream=True)) as r:
+            if r.status_code == requests.codes.ok:
+                yield from r.iter_content(WatsonClient.STREAM_CHUNK_SIZE)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncWatsonClient(AsyncClient, WatsonClient):
+    '''
+    This is an asyncio client class for Watson Text to Speech API
+
+    >>> from cloudtts import AsyncWatsonClient, WatsonCredential
+    >>> cred = WatsonCredential(
+    ...         username=YOUR_USER_NAME,
+    ...         password=YOUR_PASSWORD,
+    ...         url=API_ENDPOINT
+    ... )
+    >>> async with AsyncWatsonClient(cred) as c:
+    ...     audio = await c.tts('Hello world!')
+    '''
+
+    SESSION_CLASS = AsyncPooledSession
+
+    def _retryable_errors(self):
+        import aiohttp
+
+        return (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+    def _headers(self, plan):
+        headers = dict(plan.headers)
+        headers['Authorization'] = self._basic_authorization()
+
+        return headers
+
+    async def _post(self, params, text):
+        plan = self._plan(params)
+
+        r = await self.session.post(url=self._url(), params=plan.query,
+                                    headers=self._headers(plan),
+                                    json={'text': text})
+
+        if r.status != requests.codes.ok:
             r.raise_for_status()
+
+        return r
+
+    async def _websocket(self, params, text, timings=()):
+        import aiohttp
+
+        plan = self._plan(params)
+
+        async with self.session.ws_connect(
+                self._websocket_url(plan),
+                headers={'Authorization': self._basic_authorization()}) as ws:
+            await ws.send_str(self._websocket_message(plan, text, timings))
+
+            async for message in ws:
+                if message.type == aiohttp.WSMsgType.BINARY:
+                    yield 'audio', message.data
+                elif message.type == aiohttp.WSMsgType.TEXT:
+                    for event in _websocket_events(message.data):
+                        yield event
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    raise ws.exception()
+
+    def tts_events(self, text, voice_config=None, detail=None,
+                   timings=('words',)):
+        '''
+        Synthesizes audio data for text over the WebSocket interface, and
+        yields it and timings of words as they are generated.
+
+        This works like WatsonClient.tts_events(), but returns an async
+        iterator.
+        '''
+
+        params = self._prepare(text, voice_config, detail)
+
+        return self._events(params, text, timings)
+
+    async def _events(self, params, text, timings):
+        await self._throttle(text, '')
+
+        with self._measure(params, text, '') as measurement:
+            async for kind, data in self._websocket(params, text, timings):
+                if kind == 'audio':
+                    if not measurement.size:
+                        measurement.first_byte()
+                    measurement.size += len(data)
+                yield kind, data
+
+    async def _request(self, params, text, ssml):
+        if self.websocket:
+            return b''.join([chunk async for chunk in
+                             self._request_stream(params, text, ssml)])
+
+        async with await self._post(params, text) as r:
+            with self._span('read'):
+                return await r.read()
+
+    async def _request_stream(self, params, text, ssml):
+        if self.websocket:
+            async for kind, data in self._websocket(params, text):
+                if kind == 'audio':
+                    yield data
+            return
+
+        async with await self._post(params, text) as r:
+            async for chunk in r.content.iter_chunked(
+                    WatsonClient.STREAM_CHUNK_SIZE):
+                yield chunk
+
+    async def close(self):
+        await self.session.close()
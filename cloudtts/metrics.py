@@ -0,0 +1,426 @@
+'''
+Always-on metrics of clients.
+
+Clients count requests, characters, bytes, errors and cache hits, and
+record latency of requests in fixed-bucket histograms, per provider and
+voice.
+
+>>> import cloudtts
+>>> c = PollyClient(cred)
+>>> audio = c.tts('Hello world!')
+>>> s = cloudtts.snapshot()[('polly', 'Joanna')]
+>>> s['requests'], s['latency']['p99']
+(1, 0.1)
+>>> print(cloudtts.prometheus_text())
+'''
+
+from bisect import bisect_left
+import threading
+import time
+
+
+# upper bounds of latency buckets in seconds, from 1ms to 60s
+DEFAULT_BUCKETS = tuple(
+    float(round(m * 10 ** e, 6))
+    for e in range(-3, 1) for m in (1, 1.5, 2, 3, 5, 7.5)) + \
+    (10.0, 15.0, 20.0, 30.0, 60.0)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    '''
+    This counts observed values in buckets with fixed upper bounds.
+
+    Args:
+      bounds: tuple of float / upper bounds of buckets in ascending order
+    '''
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        # the last count is of values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        '''
+        Returns an estimate of the q-quantile of observed values.
+
+        A value is interpolated linearly within its bucket, so the error is
+        within the width of the bucket.
+
+        Args:
+          q: float / between 0 and 1
+
+        Returns:
+          float, or None if no value is observed
+        '''
+
+        total = self.count
+        if not total:
+            return None
+
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * \
+                    (rank - seen) / count
+            seen += count
+
+        return self.bounds[-1]
+
+    def snapshot(self):
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            cumulative.append((bound, seen))
+
+        result = {'count': seen, 'sum': self.sum,
+                  'buckets': tuple(cumulative)}
+        for q in QUANTILES:
+            result['p{:g}'.format(q * 100)] = self.quantile(q)
+
+        return result
+
+
+class _Series:
+    # metrics of a provider and voice, written by one thread
+    __slots__ = ('requests', 'characters', 'bytes', 'cache_hits', 'errors',
+                 'latency', 'first_byte')
+
+    def __init__(self, bounds):
+        self.requests = 0
+        self.characters = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.errors = {}
+        self.latency = Histogram(bounds)
+        self.first_byte = Histogram(bounds)
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.characters += other.characters
+        self.bytes += other.bytes
+        self.cache_hits += other.cache_hits
+        for name, count in list(other.errors.items()):
+            self.errors[name] = self.errors.get(name, 0) + count
+        self.latency.merge(other.latency)
+        self.first_byte.merge(other.first_byte)
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'characters': self.characters,
+            'bytes': self.bytes,
+            'cache_hits': self.cache_hits,
+            'errors': dict(self.errors),
+            'latency': self.latency.snapshot(),
+            'first_byte': self.first_byte.snapshot(),
+        }
+
+
+class _NullMeasurement:
+    '''
+    This is the measurement used when metrics are disabled. It does nothing.
+    '''
+
+    @property
+    def size(self):
+        return 0
+
+    @size.setter
+    def size(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def first_byte(self):
+        pass
+
+    def finish(self, size):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+NULL_MEASUREMENT = _NullMeasurement()
+
+
+class Measurement:
+    '''
+    This measures a request, made by Metrics.measure().
+
+    The request is counted when this is made. Used as a context manager,
+    its latency and size is recorded on exit, or its error if one is raised.
+
+    Attributes:
+      size: int / bytes of audio data received
+    '''
+
+    __slots__ = ('_series', '_started', 'size')
+
+    def __init__(self, series, characters):
+        self._series = series
+        self._started = time.perf_counter()
+        self.size = 0
+
+        series.requests += 1
+        series.characters += characters
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_value is None:
+            self.finish(self.size)
+        elif isinstance(exc_value, Exception):
+            self.fail(exc_value)
+
+        return False
+
+    def first_byte(self):
+        self._series.first_byte.observe(time.perf_counter() - self._started)
+
+    def finish(self, size):
+        self._series.latency.observe(time.perf_counter() - self._started)
+        self._series.bytes += size
+
+    def fail(self, error):
+        name = type(error).__name__
+        self._series.errors[name] = self._series.errors.get(name, 0) + 1
+
+
+class Metrics:
+    '''
+    This collects metrics per provider and voice.
+
+    Each thread records into its own shard, so that recording takes no lock
+    and threads sharing a client do not contend. snapshot() merges the
+    shards.
+
+    Args:
+      buckets: tuple of float / upper bounds of latency buckets in seconds
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (thread, shard) of every thread which has recorded
+        self._shards = []
+        # shards of finished threads merged
+        self._retired = {}
+
+    def _merge(self, into, shard):
+        # another thread may add series meanwhile, and copying items of a
+        # dict is atomic
+        for key, series in list(shard.items()):
+            if key not in into:
+                into[key] = _Series(self.buckets)
+            into[key].merge(series)
+
+    def _retire(self):
+        # merges shards of finished threads, called with the lock held
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _series(self, provider, voice):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                # threads come and go without snapshot() being called
+                self._retire()
+                self._shards.append((threading.current_thread(), shard))
+
+        series = shard.get((provider, voice))
+        if series is None:
+            series = shard[(provider, voice)] = _Series(self.buckets)
+
+        return series
+
+    def measure(self, provider, voice, characters):
+        '''
+        Counts a request and returns a Measurement of it.
+
+        Args:
+          provider: string / name of the provider
+          voice: string / name of the voice, or None
+          characters: int / number of characters sent
+
+        Returns:
+          Measurement
+        '''
+
+        return Measurement(self._series(provider, voice), characters)
+
+    def cache_hit(self, provider, voice):
+        self._series(provider, voice).cache_hits += 1
+
+    def snapshot(self):
+        '''
+        Returns metrics recorded so far.
+
+        Returns:
+          dict / {(provider, voice): dict of requests, characters, bytes,
+                 cache_hits, errors (by type), latency and first_byte
+                 (histograms with count, sum, cumulative buckets and
+                 p50, p90 and p99)}
+        '''
+
+        total = {}
+
+        with self._lock:
+            self._retire()
+            for _, shard in self._shards:
+                self._merge(total, shard)
+            self._merge(total, self._retired)
+
+        return {key: series.snapshot() for key, series in total.items()}
+
+    def reset(self):
+        '''
+        Discards metrics recorded so far.
+        '''
+
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._retired = {}
+
+
+_default_metrics = Metrics()
+
+
+def default_metrics():
+    '''
+    Returns the metrics which clients record into by default.
+
+    Returns:
+      Metrics
+    '''
+
+    return _default_metrics
+
+
+def snapshot(metrics=None):
+    '''
+    Returns metrics recorded so far. See Metrics.snapshot().
+
+    Args:
+      metrics: Metrics / the default metrics if omitted
+
+    Returns:
+      dict
+    '''
+
+    return (metrics or _default_metrics).snapshot()
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+            .replace('\n', '\\n')
+
+    return '{' + ','.join('{}="{}"'.format(name, escape(value))
+                          for name, value in labels.items()
+                          if value is not None) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(metrics=None):
+    '''
+    Returns metrics in the text exposition format of Prometheus.
+
+    Args:
+      metrics: Metrics / the default metrics if omitted
+
+    Returns:
+      string
+    '''
+
+    data = sorted(snapshot(metrics).items(),
+                  key=lambda item: (str(item[0][0]), str(item[0][1])))
+    lines = []
+
+    counters = (
+        ('requests', 'Requests sent to the service.'),
+        ('characters', 'Characters sent to the service.'),
+        ('bytes', 'Bytes of audio data received.'),
+        ('cache_hits', 'Audio data found in the cache.'),
+    )
+    for name, description in counters:
+        metric = 'cloudtts_{}_total'.format(name)
+        lines.append('# HELP {} {}'.format(metric, description))
+        lines.append('# TYPE {} counter'.format(metric))
+        for (provider, voice), s in data:
+            lines.append('{}{} {}'.format(
+                metric, _labels(provider=provider, voice=voice), s[name]))
+
+    metric = 'cloudtts_errors_total'
+    lines.append('# HELP {} Failed requests by exception type.'.format(metric))
+    lines.append('# TYPE {} counter'.format(metric))
+    for (provider, voice), s in data:
+        for error, count in sorted(s['errors'].items()):
+            lines.append('{}{} {}'.format(
+                metric, _labels(provider=provider, voice=voice, type=error),
+                count))
+
+    histograms = (
+        ('latency', 'cloudtts_request_seconds',
+         'Seconds until a request completes.'),
+        ('first_byte', 'cloudtts_first_byte_seconds',
+         'Seconds until the first audio data of a stream arrives.'),
+    )
+    for name, metric, description in histograms:
+        lines.append('# HELP {} {}'.format(metric, description))
+        lines.append('# TYPE {} histogram'.format(metric))
+        for (provider, voice), s in data:
+            h = s[name]
+            for bound, count in h['buckets']:
+                lines.append('{}_bucket{} {}'.format(
+                    metric, _labels(provider=provider, voice=voice,
+                                    le=_number(bound)), count))
+            labels = _labels(provider=provider, voice=voice)
+            lines.append('{}_sum{} {}'.format(metric, labels,
+                                              _number(h['sum'])))
+            lines.append('{}_count{} {}'.format(metric, labels, h['count']))
+
+    return '\n'.join(lines) + '\n'
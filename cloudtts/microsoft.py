@@ -1,18 +1,230 @@
+import asyncio
+from contextlib import closing
+from contextlib import contextmanager
+import hashlib
+import json
+import os
 import re
+import tempfile
+import threading
+import time
 
 import requests
 
+from .client import AsyncClient
 from .client import AudioFormat
 from .client import CloudTTSError
 from .client import Client
 from .client import Gender
 from .client import Language
 from .client import VoiceConfig
+from .registry import Capability
+from .session import AsyncPooledSession
+from .session import PooledSession
+
+_SPEAK_TAG = re.compile('</?speak>')
 
 
 class AzureCredential:
-    def __init__(self, api_key):
+    def __init__(self, api_key, token_cache_path=None):
         self.api_key = api_key
+        self.token_cache_path = token_cache_path
+
+
+class AzureTokenManager:
+    '''
+    This caches a bearer token issued for an AzureCredential.
+
+    A token is reused until REFRESH_MARGIN seconds before it expires. Within
+    that margin the cached token is still returned and a new one is fetched
+    in a background thread, so callers never wait on TokenEndpoint unless
+    the token has already expired.
+
+    If the credential has token_cache_path, the token is also shared through
+    that file, so that prefork workers can reuse a token fetched by another
+    process. Processes take a lock on token_cache_path + '.lock' while they
+    read, fetch and write a token, so that only one of them fetches it.
+
+    A token is fetched through a pooled session made with session_config,
+    and the request times out after the timeout of session_config, or
+    TOKEN_TIMEOUT seconds if it is not set, so that a stalled TokenEndpoint
+    does not block callers waiting for the token forever.
+
+    >>> from cloudtts.microsoft import AzureTokenManager
+    >>> manager = AzureTokenManager.for_credential(cred)
+    >>> token = manager.token()
+    '''
+
+    TOKEN_LIFETIME = 10 * 60
+    REFRESH_MARGIN = 60
+    TOKEN_TIMEOUT = 10
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, credential, session_config=None):
+        self.credential = credential
+        self.session = PooledSession(session_config)
+        self._token = None
+        self._expires_at = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_credential(cls, credential, session_config=None):
+        '''
+        Returns the manager shared by every client using the same credential.
+
+        Args:
+          credential: AzureCredential / credential to issue tokens for
+          session_config: SessionConfig / used if the manager is made
+
+        Returns:
+          AzureTokenManager
+        '''
+
+        key = (credential.api_key, credential.token_cache_path)
+
+        with cls._managers_lock:
+            if key not in cls._managers:
+                cls._managers[key] = cls(credential, session_config)
+
+            return cls._managers[key]
+
+    def _key_hash(self):
+        return hashlib.sha256(self.credential.api_key.encode()).hexdigest()
+
+    def _needs_refresh(self, expires_at, now):
+        return now >= expires_at - AzureTokenManager.REFRESH_MARGIN
+
+    def _fetch(self):
+        headers = {'Ocp-Apim-Subscription-Key': self.credential.api_key}
+        timeout = self.session.config.timeout or \
+            AzureTokenManager.TOKEN_TIMEOUT
+        r = self.session.post(AzureClient.TokenEndpoint, headers=headers,
+                              timeout=timeout)
+
+        if r.status_code != requests.codes.ok:
+            r.raise_for_status()
+
+        return str(r.text), time.time() + AzureTokenManager.TOKEN_LIFETIME
+
+    def _read_file(self):
+        path = self.credential.token_cache_path
+        if not path:
+            return None, 0
+
+        try:
+            with open(path) as f:
+                d = json.load(f)
+        except (OSError, ValueError):
+            return None, 0
+
+        if not isinstance(d, dict) or d.get('key') != self._key_hash():
+            return None, 0
+
+        return d.get('token'), d.get('expires_at', 0)
+
+    def _write_file(self, token, expires_at):
+        path = self.credential.token_cache_path
+        if not path:
+            return
+
+        d = {'key': self._key_hash(), 'token': token, 'expires_at': expires_at}
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(d, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _file_lock(self):
+        path = self.credential.token_cache_path
+        try:
+            import fcntl
+            f = open(path + '.lock', 'a') if path else None
+        except (ImportError, OSError):
+            # tokens are fetched without the lock where it is not available
+            f = None
+
+        if f is None:
+            yield
+            return
+
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        with self._file_lock():
+            token, expires_at = self._read_file()
+            if token and not self._needs_refresh(expires_at, time.time()):
+                return token, expires_at
+
+            token, expires_at = self._fetch()
+            self._write_file(token, expires_at)
+
+        return token, expires_at
+
+    def _refresh(self):
+        try:
+            token, expires_at = self._load()
+            with self._lock:
+                self._token, self._expires_at = token, expires_at
+        except Exception:
+            # the current token is still valid, so the next call retries
+            pass
+        finally:
+            self._refreshing = False
+
+    def token(self):
+        '''
+        Returns a valid bearer token.
+
+        Returns:
+          string
+        '''
+
+        now = time.time()
+        token = self._token
+
+        if token and now < self._expires_at:
+            if self._needs_refresh(self._expires_at, now) and \
+                    not self._refreshing:
+                with self._lock:
+                    start = not self._refreshing
+                    self._refreshing = True
+                if start:
+                    t = threading.Thread(target=self._refresh, daemon=True)
+                    t.start()
+            return token
+
+        with self._lock:
+            if not self._token or time.time() >= self._expires_at:
+                self._token, self._expires_at = self._load()
+
+            return self._token
+
+    def has_token(self):
+        '''
+        Returns whether token() returns without fetching a token.
+        '''
+
+        return bool(self._token) and time.time() < self._expires_at
+
+    def invalidate(self):
+        '''
+        Drops the cached token so that the next call fetches a new one.
+        '''
+
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
 
 
 class AzureClient(Client):
@@ -29,7 +241,11 @@ class AzureClient(Client):
 
     TokenEndpoint = 'https://api.cognitive.microsoft.com/sts/v1.0/issueToken'
     TTSEndpoint = 'https://speech.platform.bing.com/synthesize'
+    PROVIDER = 'azure'
+    CREDENTIAL_CLASS = AzureCredential
+    SESSION_CLASS = PooledSession
     MAX_TEXT_LENGTH = 1024
+    SSML_IN_TEXT = True
 
     AVAILABLE_FORMATS = (
         'audio-16khz-128kbitrate-mono-mp3',
@@ -121,6 +337,18 @@ class AzureClient(Client):
            '  </voice>'
            '</speak>')
 
+    def __init__(self, credential=None, session_config=None, **kwargs):
+        self.session = self.SESSION_CLASS(session_config)
+        super().__init__(credential, **kwargs)
+
+    @classmethod
+    def capabilities(cls):
+        for (language, gender), voice in cls.LANG_GENDER_DICT.items():
+            for audio_format, fmt in cls.AUDIO_FORMAT_DICT.items():
+                khz = re.search(r'(\d+)khz', fmt)
+                yield Capability(cls.PROVIDER, language, gender, audio_format,
+                                 int(khz[1]) * 1000, voice)
+
     def _voice_config_to_dict(self, vc):
         d = {}
 
@@ -147,13 +375,25 @@ class AzureClient(Client):
         return params['voice'] in AzureClient.AVAILABLE_VOICES
 
     def _is_valid_params(self, params):
+        # language and gender are written into the XML
+        if 'language' not in params or 'gender' not in params:
+            return False
+
         return self._is_valid_format(params) and self._is_valid_voice(params)
 
-    def _token(self):
-        headers = {'Ocp-Apim-Subscription-Key': self.credential.api_key}
-        r = requests.post(AzureClient.TokenEndpoint, headers=headers)
+    def _rate_limit_key(self):
+        return ('azure', self.credential.api_key)
+
+    def _retryable_errors(self):
+        return (requests.ConnectionError, requests.Timeout)
 
-        return str(r.text)
+    def _token_manager(self):
+        return AzureTokenManager.for_credential(self.credential,
+                                                self.session.config)
+
+    def _token(self):
+        with self._span('token'):
+            return self._token_manager().token()
 
     def tts(self, text, voice_config=None, detail=None):
         '''
@@ -168,40 +408,167 @@ class AzureClient(Client):
           binary
         '''
 
-        if self.credential:
-            if isinstance(self.credential, AzureCredential):
-                pass
-            else:
-                raise TypeError('Invalid credential')
-        else:
-            raise CloudTTSError('No Authentication yet')
+        params = self._prepare(text, voice_config, detail)
+
+        return self._synthesize(params, text=text)
+
+    def tts_stream(self, text, voice_config=None, detail=None):
+        '''
+        Synthesizes audio data for text and yields it as it arrives.
+
+        Args:
+          text: string / target to be synthesized
+          voice_config: VoiceConfig / parameters for voice and audio
+          detail: dict / detail parameters for voice and audio
+
+        Returns:
+          generator of binary
+        '''
+
+        params = self._prepare(text, voice_config, detail)
+
+        return self._synthesize_stream(params, text=text)
+
+    def _prepare(self, text, voice_config, detail):
+        self._check_credential()
 
         if not text:
             raise ValueError('No text is passed')
 
         params = self._make_params(voice_config, detail)
 
-        _xml = AzureClient.XML.format(
-            lang=params['language'],
-            gender=params['gender'],
-            voice=params['voice'],
-            text=re.compile('</?speak>').sub('', text)
-        )
-
-        if len(_xml) > AzureClient.MAX_TEXT_LENGTH:
+        # the XML is built only when it is sent
+        length = self._xml_length(params, text)
+        if length > AzureClient.MAX_TEXT_LENGTH:
             msg = 'Available up to {} characters for XML, but got {}'.format(
-                AzureClient.MAX_TEXT_LENGTH, len(_xml))
+                AzureClient.MAX_TEXT_LENGTH, length)
 
             raise CloudTTSError(msg)
 
-        _headers = {'Content-type': 'application/ssml+xml',
-                    'X-Microsoft-OutputFormat': params['format'],
-                    'Authorization': 'Bearer: {}'.format(self._token())}
+        return params
+
+    def _compile_plan(self, plan):
+        prefix, suffix = AzureClient.XML.split('{text}')
+        fields = {'lang': plan['language'], 'gender': plan['gender'],
+                  'voice': plan['voice']}
+        plan.xml_prefix = prefix.format(**fields)
+        plan.xml_suffix = suffix.format(**fields)
+        plan.body_prefix = plan.xml_prefix.encode('utf-8')
+        plan.body_suffix = plan.xml_suffix.encode('utf-8')
+        plan.headers = {'Content-type': 'application/ssml+xml',
+                        'X-Microsoft-OutputFormat': plan['format']}
+
+    def _xml(self, params, text):
+        plan = self._plan(params)
+
+        return ''.join((plan.xml_prefix, _SPEAK_TAG.sub('', text),
+                        plan.xml_suffix))
+
+    def _xml_length(self, params, text):
+        plan = self._plan(params)
+
+        return len(plan.xml_prefix) + len(_SPEAK_TAG.sub('', text)) + \
+            len(plan.xml_suffix)
+
+    def _body(self, params, text):
+        # the XML encoded as the body of a request
+        plan = self._plan(params)
+
+        return b''.join((plan.body_prefix,
+                         _SPEAK_TAG.sub('', text).encode('utf-8'),
+                         plan.body_suffix))
+
+    def _fits(self, params, text='', ssml=''):
+        return self._xml_length(params, text) <= AzureClient.MAX_TEXT_LENGTH
 
-        r = requests.post(url=AzureClient.TTSEndpoint,
-                          headers=_headers, data=_xml.encode('utf-8'))
+    def _headers(self, params, token):
+        headers = dict(self._plan(params).headers)
+        headers['Authorization'] = 'Bearer: {}'.format(token)
+
+        return headers
+
+    def _post(self, params, text, stream=False):
+        r = self.session.post(url=AzureClient.TTSEndpoint,
+                              headers=self._headers(params, self._token()),
+                              data=self._body(params, text),
+                              stream=stream)
+
+        if r.status_code != requests.codes.ok:
+            if r.status_code == requests.codes.unauthorized:
+                self._token_manager().invalidate()
+            # a streamed response keeps its connection until it is closed
+            with closing(r):
+                r.raise_for_status()
+
+        return r
+
+    def _request(self, params, text, ssml):
+        r = self._post(params, text)
 
         if r.status_code == requests.codes.ok:
             return r.content
-        else:
+
+    def _request_stream(self, params, text, ssml):
+        with closing(self._post(params, text, stream=True)) as r:
+            if r.status_code == requests.codes.ok:
+                yield from r.iter_content(AzureClient.STREAM_CHUNK_SIZE)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncAzureClient(AsyncClient, AzureClient):
+    '''
+    This is an asyncio client class for Azure Text to Speech API
+
+    >>> from cloudtts import AsyncAzureClient, AzureCredential
+    >>> cred = AzureCredential(api_key=YOUR_API_KEY)
+    >>> async with AsyncAzureClient(cred) as c:
+    ...     audio = await c.tts('Hello world!')
+    ...     async for chunk in c.tts_stream('Hello world!'):
+    ...         pass
+    '''
+
+    SESSION_CLASS = AsyncPooledSession
+
+    def _retryable_errors(self):
+        import aiohttp
+
+        return (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+    async def _token(self):
+        manager = self._token_manager()
+        if manager.has_token():
+            return manager.token()
+
+        # a token is fetched once in a while, so a thread is used for it
+        with self._span('token'):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, manager.token)
+
+    async def _post(self, params, text):
+        r = await self.session.post(
+            url=AzureClient.TTSEndpoint,
+            headers=self._headers(params, await self._token()),
+            data=self._body(params, text))
+
+        if r.status != requests.codes.ok:
+            if r.status == requests.codes.unauthorized:
+                self._token_manager().invalidate()
             r.raise_for_status()
+
+        return r
+
+    async def _request(self, params, text, ssml):
+        async with await self._post(params, text) as r:
+            with self._span('read'):
+                return await r.read()
+
+    async def _request_stream(self, params, text, ssml):
+        async with await self._post(params, text) as r:
+            async for chunk in r.content.iter_chunked(
+                    AzureClient.STREAM_CHUNK_SIZE):
+                yield chunk
+
+    async def close(self):
+        await self.session.close()
@@ -0,0 +1,149 @@
+import threading
+import time
+
+
+class RateLimit:
+    '''
+    This is a quota of requests and characters per period.
+
+    Args:
+      requests: int / number of requests per period
+      characters: int / number of characters per period
+      period: float / seconds of the period
+    '''
+
+    def __init__(self, requests=None, characters=None, period=1):
+        self.requests = requests
+        self.characters = characters
+        self.period = period
+
+    def _key(self):
+        return (self.requests, self.characters, self.period)
+
+
+class TokenBucket:
+    '''
+    This is a token bucket which holds up to capacity tokens and is refilled
+    at rate tokens per second.
+
+    Tokens are reserved ahead, so the bucket can go below zero and callers
+    wait until their tokens are refilled without holding the lock.
+    '''
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, n=1):
+        '''
+        Takes n tokens.
+
+        Args:
+          n: float / number of tokens, which is capped by capacity
+
+        Returns:
+          float / seconds to wait until the tokens are available
+        '''
+
+        n = min(n, self.capacity)
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= n
+
+            if self._tokens >= 0:
+                return 0
+
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    '''
+    This limits requests and characters sent to an API by token buckets.
+
+    Limiters are shared by threads, and RateLimiter.shared() returns the same
+    limiter for clients using the same credential.
+
+    >>> from cloudtts.ratelimit import RateLimit, RateLimiter
+    >>> limiter = RateLimiter(RateLimit(requests=80))
+    >>> limiter.acquire(characters=len(text))  # blocks while throttled
+    '''
+
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(self, rate_limit):
+        self.rate_limit = rate_limit
+        self._requests = None
+        self._characters = None
+
+        if rate_limit.requests:
+            self._requests = TokenBucket(
+                rate_limit.requests / rate_limit.period, rate_limit.requests)
+
+        if rate_limit.characters:
+            self._characters = TokenBucket(
+                rate_limit.characters / rate_limit.period,
+                rate_limit.characters)
+
+    @classmethod
+    def shared(cls, key, rate_limit):
+        '''
+        Returns the limiter shared by every client with the same key.
+
+        Args:
+          key: tuple / provider and credential
+          rate_limit: RateLimit / quota
+
+        Returns:
+          RateLimiter
+        '''
+
+        key = (key, rate_limit._key())
+
+        with cls._limiters_lock:
+            if key not in cls._limiters:
+                cls._limiters[key] = cls(rate_limit)
+
+            return cls._limiters[key]
+
+    def _reserve(self, characters):
+        delay = 0
+        if self._requests is not None:
+            delay = max(delay, self._requests.reserve(1))
+        if self._characters is not None and characters:
+            delay = max(delay, self._characters.reserve(characters))
+
+        return delay
+
+    def acquire(self, characters=0):
+        '''
+        Blocks until a request with characters can be sent.
+
+        Args:
+          characters: int / number of characters of the request
+        '''
+
+        delay = self._reserve(characters)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, characters=0):
+        '''
+        Waits until a request with characters can be sent.
+
+        Args:
+          characters: int / number of characters of the request
+        '''
+
+        import asyncio
+
+        delay = self._reserve(characters)
+        if delay > 0:
+            await asyncio.sleep(delay)
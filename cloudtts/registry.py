@@ -0,0 +1,155 @@
+from collections import namedtuple
+from itertools import product
+import threading
+
+
+# A combination of voice and audio a provider can synthesize. sample_rate is
+# in Hz, or None if the service decides it. voice is None if the service
+# chooses a voice by language and gender.
+Capability = namedtuple('Capability', ('provider', 'language', 'gender',
+                                       'audio_format', 'sample_rate', 'voice'))
+
+# provider name: (module, client class)
+PROVIDERS = {
+    'azure': ('.microsoft', 'AzureClient'),
+    'google': ('.google', 'GoogleClient'),
+    'polly': ('.aws', 'PollyClient'),
+    'watson': ('.ibm', 'WatsonClient'),
+}
+
+
+def client_class(provider):
+    '''
+    Returns the client class of provider.
+
+    Provider modules do not load SDKs on import, so this is cheap.
+
+    Args:
+      provider: string / name of the provider, such as 'polly'
+
+    Returns:
+      subclass of Client
+    '''
+
+    import importlib
+
+    module, name = PROVIDERS[provider]
+    return getattr(importlib.import_module(module, __package__), name)
+
+
+class Registry:
+    '''
+    This is an index of capabilities of providers.
+
+    Capabilities are indexed by every combination of provider, language,
+    gender, audio format and sample rate, so that a query is a dict lookup.
+
+    >>> from cloudtts import Gender, Language, AudioFormat
+    >>> from cloudtts.registry import default_registry
+    >>> r = default_registry()
+    >>> r.providers(language=Language.ja_JP, gender=Gender.male,
+    ...             audio_format=AudioFormat.ogg_opus)
+    ('google',)
+    '''
+
+    def __init__(self, capabilities):
+        self.capabilities = tuple(capabilities)
+
+        index = {}
+        for c in self.capabilities:
+            values = (c.provider, c.language, c.gender, c.audio_format,
+                      c.sample_rate)
+            # None in a key matches any value
+            keys = {tuple(v if m else None for v, m in zip(values, mask))
+                    for mask in product((True, False), repeat=len(values))}
+            for key in keys:
+                index.setdefault(key, []).append(c)
+
+        self._index = {key: tuple(cs) for key, cs in index.items()}
+        self._providers = {key: tuple(dict.fromkeys(c.provider for c in cs))
+                           for key, cs in self._index.items()}
+
+    def find(self, provider=None, language=None, gender=None,
+             audio_format=None, sample_rate=None):
+        '''
+        Returns capabilities which match every passed value.
+
+        Args:
+          provider: string / name of the provider
+          language: Language
+          gender: Gender
+          audio_format: AudioFormat
+          sample_rate: int / sample rate in Hz
+
+        Returns:
+          tuple of Capability
+        '''
+
+        key = (provider, language, gender, audio_format, sample_rate)
+
+        return self._index.get(key, ())
+
+    def providers(self, language=None, gender=None, audio_format=None,
+                  sample_rate=None):
+        '''
+        Returns names of providers which can synthesize the voice and audio.
+
+        Returns:
+          tuple of string
+        '''
+
+        key = (None, language, gender, audio_format, sample_rate)
+
+        return self._providers.get(key, ())
+
+    def voices(self, provider, language=None, gender=None):
+        '''
+        Returns names of voices of provider.
+
+        Returns:
+          tuple of string
+        '''
+
+        return tuple(dict.fromkeys(
+            c.voice for c in self.find(provider, language, gender)
+            if c.voice is not None))
+
+    def supports(self, provider, voice_config):
+        '''
+        Returns whether provider can synthesize audio for voice_config.
+
+        Args:
+          provider: string / name of the provider
+          voice_config: VoiceConfig / parameters for voice and audio
+
+        Returns:
+          bool
+        '''
+
+        key = (provider, voice_config.language, voice_config.gender,
+               voice_config.audio_format, None)
+
+        return key in self._index
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry():
+    '''
+    Returns the registry of every provider, which is built on first call.
+
+    Returns:
+      Registry
+    '''
+
+    global _default_registry
+
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = Registry(
+                c for provider in PROVIDERS
+                for c in client_class(provider).capabilities())
+
+        return _default_registry
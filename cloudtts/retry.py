@@ -0,0 +1,236 @@
+import random
+import time
+
+
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# error codes of AWS which mean throttling, returned with 400
+THROTTLING_CODES = ('Throttling', 'ThrottlingException',
+                    'TooManyRequestsException', 'RequestLimitExceeded')
+
+# gRPC status codes with equivalent HTTP status codes
+GRPC_STATUS_CODES = {
+    'DEADLINE_EXCEEDED': 504,
+    'INTERNAL': 500,
+    'RESOURCE_EXHAUSTED': 429,
+    'UNAVAILABLE': 503,
+}
+
+
+def parse_retry_after(value):
+    '''
+    Parses a Retry-After header.
+
+    Args:
+      value: string / seconds or HTTP date
+
+    Returns:
+      float / seconds to wait, or None
+    '''
+
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    from email.utils import parsedate_to_datetime
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, date.timestamp() - time.time())
+
+
+def _header(headers, name):
+    if not headers:
+        return None
+
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+
+    return None
+
+
+def error_status(error):
+    '''
+    Returns the HTTP status code and Retry-After of an error raised by
+    requests, aiohttp, botocore, google-api-core or gRPC.
+
+    Args:
+      error: Exception / raised error
+
+    Returns:
+      tuple / status code or None, and seconds of Retry-After or None
+    '''
+
+    response = getattr(error, 'response', None)
+
+    # requests.HTTPError
+    if hasattr(response, 'status_code'):
+        return response.status_code, parse_retry_after(
+            _header(response.headers, 'retry-after'))
+
+    # botocore.exceptions.ClientError
+    if isinstance(response, dict):
+        meta = response.get('ResponseMetadata', {})
+        status = meta.get('HTTPStatusCode')
+        if response.get('Error', {}).get('Code') in THROTTLING_CODES:
+            status = 429
+        return status, parse_retry_after(
+            _header(meta.get('HTTPHeaders'), 'retry-after'))
+
+    # aiohttp.ClientResponseError
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status, parse_retry_after(
+            _header(getattr(error, 'headers', None), 'retry-after'))
+
+    code = getattr(error, 'code', None)
+
+    # google.api_core.exceptions.GoogleAPICallError
+    if isinstance(code, int):
+        return code, None
+
+    # grpc.RpcError
+    if callable(code):
+        try:
+            name = getattr(code(), 'name', None)
+        except Exception:
+            name = None
+        return GRPC_STATUS_CODES.get(name), None
+
+    return None, None
+
+
+class RetryPolicy:
+    '''
+    This is a policy to retry requests which failed transiently.
+
+    Requests are retried with exponential backoff and full jitter, so that
+    clients failing at the same time do not retry at the same time. If a
+    response has Retry-After, a retry waits at least that long. No retry is
+    made after budget seconds from the first attempt.
+
+    Args:
+      max_attempts: int / number of attempts including the first one
+      base_delay: float / seconds of the first backoff
+      max_delay: float / upper bound of backoff
+      budget: float / seconds for all attempts, or None
+      status_codes: tuple / HTTP status codes to retry
+      errors: tuple / exception classes to retry, in addition to ones of
+              each client such as connection errors
+    '''
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=20,
+                 budget=60, status_codes=RETRYABLE_STATUS_CODES, errors=()):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.status_codes = status_codes
+        self.errors = errors
+
+    def backoff(self, attempt):
+        '''
+        Returns seconds to wait after attempt failed.
+
+        Args:
+          attempt: int / number of failed attempts, from 1
+
+        Returns:
+          float
+        '''
+
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+        return random.uniform(0, ceiling)
+
+    def delay(self, error, attempt, started, errors=()):
+        '''
+        Returns seconds to wait before retrying, or None not to retry.
+
+        Args:
+          error: Exception / error of the failed attempt
+          attempt: int / number of failed attempts, from 1
+          started: float / time.monotonic() of the first attempt
+          errors: tuple / retryable exception classes of the client
+
+        Returns:
+          float or None
+        '''
+
+        if attempt >= self.max_attempts:
+            return None
+
+        status, retry_after = error_status(error)
+        if status not in self.status_codes and \
+                not isinstance(error, tuple(self.errors) + tuple(errors)):
+            return None
+
+        delay = self.backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        if self.budget is not None and \
+                time.monotonic() + delay - started > self.budget:
+            return None
+
+        return delay
+
+    def call(self, func, errors=()):
+        '''
+        Calls func and retries it until it succeeds.
+
+        Args:
+          func: function / takes no arguments
+          errors: tuple / retryable exception classes of the client
+
+        Returns:
+          the return value of func
+        '''
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                attempt += 1
+                delay = self.delay(e, attempt, started, errors)
+                if delay is None:
+                    raise
+
+            time.sleep(delay)
+
+    async def call_async(self, func, errors=()):
+        '''
+        Awaits func and retries it until it succeeds.
+
+        Args:
+          func: function / takes no arguments and returns an awaitable
+          errors: tuple / retryable exception classes of the client
+
+        Returns:
+          the result of func
+        '''
+
+        import asyncio
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await func()
+            except Exception as e:
+                attempt += 1
+                delay = self.delay(e, attempt, started, errors)
+                if delay is None:
+                    raise
+
+            await asyncio.sleep(delay)
@@ -0,0 +1,577 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+import threading
+import time
+
+from .client import AsyncClient
+from .client import Client
+from .client import CloudTTSError
+from .client import VoiceConfig
+
+
+class _Route:
+    '''
+    This is a client of a router and its health.
+
+    A client is unhealthy for cooldown seconds after it fails
+    failure_threshold times in a row, and it is tried again after that.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.failures = 0
+        self.unhealthy_until = 0
+
+    def is_healthy(self, now):
+        return now >= self.unhealthy_until
+
+    def succeeded(self):
+        self.failures = 0
+        self.unhealthy_until = 0
+
+    def failed(self, now, failure_threshold, cooldown):
+        self.failures += 1
+        if self.failures >= failure_threshold:
+            self.unhealthy_until = now + cooldown
+
+
+def _is_input_error(error):
+    # errors of input are not failures of services
+    return isinstance(error, (CloudTTSError, TypeError, ValueError))
+
+
+class RouterClient:
+    '''
+    This is a client which routes requests to one of several clients.
+
+    A request goes to the first client which supports the voice config and
+    is healthy. If the client fails or does not answer within timeout
+    seconds, the request fails over to the next one. A client which failed is
+    skipped for cooldown seconds, so an outage of a service costs only the
+    requests which found it.
+
+    >>> from cloudtts.router import RouterClient
+    >>> c = RouterClient([PollyClient(polly_cred), GoogleClient(google_cred)],
+    ...                  timeout=3)
+    >>> audio = c.tts('Hello world!', voice_config=vc)
+
+    With hedging, tts() sends the same request to the next client as well
+    if the first one has not answered within hedge_delay seconds, or the
+    hedge_percentile of observed latencies, and returns whichever answers
+    first. Hedges are limited to max_hedge_ratio of requests. Requests
+    which lost and are still running are reported by hedge_stats().
+
+    >>> c = RouterClient([PollyClient(cred1), PollyClient(cred2)],
+    ...                  hedge_percentile=95, max_hedge_ratio=0.05)
+
+    With timeout or hedging, requests run in threads of the router, at most
+    max_concurrency per client. Requests which timed out keep their threads
+    until they end, so they can not take threads of other work.
+
+    Args:
+      clients: list of Client / clients in the order of preference
+      timeout: float / seconds to wait for a client, or None
+      failure_threshold: int / failures in a row to make a client unhealthy
+      cooldown: float / seconds to skip an unhealthy client
+      hedge_delay: float / seconds before a hedged request, or None
+      hedge_percentile: float / percentile of latencies used as hedge_delay
+      max_hedge_ratio: float / upper bound of hedged requests per request
+      max_concurrency: int / requests in threads at once per client
+    '''
+
+    # latencies kept for hedge_percentile, and needed before hedging
+    LATENCY_SAMPLES = 1000
+    MIN_LATENCY_SAMPLES = 20
+
+    def __init__(self, clients, timeout=None, failure_threshold=1,
+                 cooldown=30, hedge_delay=None, hedge_percentile=None,
+                 max_hedge_ratio=0.1, max_concurrency=8):
+        if not clients:
+            raise ValueError('No client is passed')
+
+        self.routes = [_Route(client) for client in clients]
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.max_concurrency = max_concurrency
+        self._pool = None
+        self._latencies = deque(maxlen=RouterClient.LATENCY_SAMPLES)
+        self._requests = 0
+        self._hedges = 0
+        # requests which lost or timed out and are still running
+        self._losers = 0
+        self._lock = threading.Lock()
+
+    @property
+    def clients(self):
+        return [route.client for route in self.routes]
+
+    def _candidates(self, voice_config):
+        voice_config = voice_config or VoiceConfig()
+        routes = [route for route in self.routes
+                  if route.client.supports(voice_config)]
+        if not routes:
+            raise ValueError('No client supports the voice config')
+
+        # unhealthy clients are tried last rather than never
+        now = time.monotonic()
+        return [r for r in routes if r.is_healthy(now)] + \
+            [r for r in routes if not r.is_healthy(now)]
+
+    def _kwargs(self, client, text, ssml, voice_config):
+        if client.SSML_IN_TEXT:
+            return {'text': ssml or text, 'voice_config': voice_config}
+
+        return {'text': text, 'ssml': ssml, 'voice_config': voice_config}
+
+    def _succeeded(self, route, latency=None):
+        with self._lock:
+            route.succeeded()
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def _failed(self, route, error):
+        if _is_input_error(error):
+            return
+
+        with self._lock:
+            route.failed(time.monotonic(), self.failure_threshold,
+                         self.cooldown)
+
+    def _executor(self):
+        # threads of the router, so that calls in threads of tts_many() do
+        # not wait for threads of the same executor
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency * len(self.routes),
+                    thread_name_prefix='cloudtts-router')
+
+            return self._pool
+
+    def _call(self, func, **kwargs):
+        if self.timeout is None:
+            return func(**kwargs)
+
+        # a call which timed out is left running in the executor
+        future = self._executor().submit(func, **kwargs)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError('No response in {} seconds'.format(
+                self.timeout))
+
+    def _is_hedging(self):
+        return self.hedge_delay is not None or \
+            self.hedge_percentile is not None
+
+    def _hedge_delay(self):
+        if self.hedge_percentile is not None:
+            with self._lock:
+                latencies = sorted(self._latencies)
+
+            if len(latencies) >= RouterClient.MIN_LATENCY_SAMPLES:
+                i = int(len(latencies) * self.hedge_percentile / 100)
+                return latencies[min(i, len(latencies) - 1)]
+
+        return self.hedge_delay
+
+    def _count_request(self):
+        with self._lock:
+            self._requests += 1
+
+    def _allow_hedge(self):
+        with self._lock:
+            # both counts are cumulative, so that the budget is exact
+            if self._hedges + 1 > self.max_hedge_ratio * self._requests:
+                return False
+
+            self._hedges += 1
+            return True
+
+    def _abandon(self, future):
+        # a request which can not be cancelled still loads the service
+        # until it ends
+        if future.cancel():
+            return
+
+        def done(_):
+            with self._lock:
+                self._losers -= 1
+
+        with self._lock:
+            self._losers += 1
+        future.add_done_callback(done)
+
+    def hedge_stats(self):
+        '''
+        Returns statistics of hedging.
+
+        Returns:
+          dict / requests, hedges, losers still running and current hedge
+                 delay
+        '''
+
+        with self._lock:
+            requests, hedges = self._requests, self._hedges
+            losers = self._losers
+
+        return {'requests': requests, 'hedges': hedges, 'losers': losers,
+                'delay': self._hedge_delay()}
+
+    def _next_timeout(self, pending, hedge_at, now):
+        # seconds until a hedge or a timeout of pending calls
+        deadlines = []
+        if hedge_at is not None:
+            deadlines.append(hedge_at)
+        if self.timeout is not None:
+            deadlines += [started + self.timeout
+                          for _, started in pending.values()]
+
+        if not deadlines:
+            return None
+
+        return max(0, min(deadlines) - now)
+
+    def _all_failed(self, error):
+        return CloudTTSError('All clients failed: {!r}'.format(error))
+
+    def tts(self, text='', ssml='', voice_config=None):
+        '''
+        Synthesizes audio data for text with one of the clients.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+
+        Returns:
+          binary
+        '''
+
+        candidates = self._candidates(voice_config)
+        self._count_request()
+
+        if self._is_hedging():
+            return self._tts_hedged(candidates, text, ssml, voice_config)
+
+        error = None
+        for route in candidates:
+            kwargs = self._kwargs(route.client, text, ssml, voice_config)
+            started = time.monotonic()
+            try:
+                audio = self._call(route.client.tts, **kwargs)
+            except Exception as e:
+                self._failed(route, e)
+                error = e
+                continue
+
+            self._succeeded(route, time.monotonic() - started)
+            return audio
+
+        raise self._all_failed(error) from error
+
+    def _tts_hedged(self, candidates, text, ssml, voice_config):
+        executor = self._executor()
+        queue = list(candidates)
+        pending = {}
+        error = None
+
+        def launch():
+            route = queue.pop(0)
+            kwargs = self._kwargs(route.client, text, ssml, voice_config)
+            future = executor.submit(route.client.tts, **kwargs)
+            pending[future] = (route, time.monotonic())
+
+        launch()
+        delay = self._hedge_delay()
+        hedge_at = None if delay is None else time.monotonic() + delay
+
+        while pending:
+            timeout = self._next_timeout(pending, hedge_at if queue else None,
+                                         time.monotonic())
+            done, _ = wait(pending, timeout, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+
+            for future in done:
+                route, started = pending.pop(future)
+                try:
+                    audio = future.result()
+                except Exception as e:
+                    self._failed(route, e)
+                    error = e
+                    continue
+
+                self._succeeded(route, now - started)
+
+                # a request which has been sent can not be cancelled, but
+                # its result is discarded
+                for loser in pending:
+                    self._abandon(loser)
+
+                return audio
+
+            for future, (route, started) in list(pending.items()):
+                if self.timeout is not None and \
+                        now - started >= self.timeout:
+                    del pending[future]
+                    self._abandon(future)
+                    error = TimeoutError('No response in {} seconds'.format(
+                        self.timeout))
+                    self._failed(route, error)
+
+            if not pending and queue:
+                launch()
+            elif hedge_at is not None and now >= hedge_at and queue:
+                hedge_at = None
+                if self._allow_hedge():
+                    launch()
+
+        raise self._all_failed(error) from error
+
+    def tts_stream(self, text='', ssml='', voice_config=None):
+        '''
+        Synthesizes audio data for text with one of the clients and yields
+        it as it arrives.
+
+        A request fails over until the first chunk arrives.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+
+        Returns:
+          generator of binary
+        '''
+
+        candidates = self._candidates(voice_config)
+
+        def start(client, **kwargs):
+            stream = client.tts_stream(**kwargs)
+            for chunk in stream:
+                return stream, [chunk]
+            return stream, []
+
+        def stream():
+            error = None
+            for route in candidates:
+                kwargs = self._kwargs(route.client, text, ssml, voice_config)
+                try:
+                    chunks, head = self._call(start, client=route.client,
+                                              **kwargs)
+                except Exception as e:
+                    self._failed(route, e)
+                    error = e
+                    continue
+
+                self._succeeded(route)
+                yield from head
+                yield from chunks
+                return
+
+            raise self._all_failed(error) from error
+
+        return stream()
+
+    tts_many = Client.tts_many
+
+    def close(self):
+        with self._lock:
+            executor, self._pool = self._pool, None
+        if executor is not None:
+            # requests which timed out are not waited for
+            executor.shutdown(wait=False)
+
+        for client in self.clients:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncRouterClient(RouterClient):
+    '''
+    This is a router of async clients.
+
+    >>> from cloudtts.router import AsyncRouterClient
+    >>> async with AsyncRouterClient([AsyncPollyClient(polly_cred),
+    ...                               AsyncGoogleClient(google_cred)],
+    ...                              timeout=3) as c:
+    ...     audio = await c.tts('Hello world!')
+    '''
+
+    async def _call(self, func, **kwargs):
+        import asyncio
+
+        # a call which timed out is cancelled
+        return await asyncio.wait_for(func(**kwargs), self.timeout)
+
+    async def tts(self, text='', ssml='', voice_config=None):
+        '''
+        Synthesizes audio data for text with one of the clients.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+
+        Returns:
+          binary
+        '''
+
+        candidates = self._candidates(voice_config)
+        self._count_request()
+
+        if self._is_hedging():
+            return await self._tts_hedged(candidates, text, ssml,
+                                          voice_config)
+
+        error = None
+        for route in candidates:
+            kwargs = self._kwargs(route.client, text, ssml, voice_config)
+            started = time.monotonic()
+            try:
+                audio = await self._call(route.client.tts, **kwargs)
+            except Exception as e:
+                self._failed(route, e)
+                error = e
+                continue
+
+            self._succeeded(route, time.monotonic() - started)
+            return audio
+
+        raise self._all_failed(error) from error
+
+    async def _tts_hedged(self, candidates, text, ssml, voice_config):
+        import asyncio
+
+        queue = list(candidates)
+        pending = {}
+        error = None
+
+        async def tts(client, kwargs):
+            return await client.tts(**kwargs)
+
+        def launch():
+            route = queue.pop(0)
+            kwargs = self._kwargs(route.client, text, ssml, voice_config)
+            task = asyncio.ensure_future(tts(route.client, kwargs))
+            pending[task] = (route, time.monotonic())
+
+        launch()
+        delay = self._hedge_delay()
+        hedge_at = None if delay is None else time.monotonic() + delay
+
+        try:
+            while pending:
+                timeout = self._next_timeout(
+                    pending, hedge_at if queue else None, time.monotonic())
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED)
+                now = time.monotonic()
+
+                for task in done:
+                    route, started = pending.pop(task)
+                    if task.exception() is not None:
+                        self._failed(route, task.exception())
+                        error = task.exception()
+                        continue
+
+                    self._succeeded(route, now - started)
+                    return task.result()
+
+                for task, (route, started) in list(pending.items()):
+                    if self.timeout is not None and \
+                            now - started >= self.timeout:
+                        del pending[task]
+                        task.cancel()
+                        error = TimeoutError(
+                            'No response in {} seconds'.format(self.timeout))
+                        self._failed(route, error)
+
+                if not pending and queue:
+                    launch()
+                elif hedge_at is not None and now >= hedge_at and queue:
+                    hedge_at = None
+                    if self._allow_hedge():
+                        launch()
+        finally:
+            # losers are cancelled
+            for task in pending:
+                task.cancel()
+
+        raise self._all_failed(error) from error
+
+    def tts_stream(self, text='', ssml='', voice_config=None):
+        '''
+        Synthesizes audio data for text with one of the clients and yields
+        it as it arrives.
+
+        A request fails over until the first chunk arrives.
+
+        Args:
+          text: string / target to be synthesized(plain text)
+          ssml: string / target to be synthesized(SSML)
+          voice_config: VoiceConfig / parameters for voice and audio
+
+        Returns:
+          async iterator of binary
+        '''
+
+        candidates = self._candidates(voice_config)
+
+        async def start(client, **kwargs):
+            stream = client.tts_stream(**kwargs)
+            async for chunk in stream:
+                return stream, [chunk]
+            return stream, []
+
+        async def stream():
+            error = None
+            for route in candidates:
+                kwargs = self._kwargs(route.client, text, ssml, voice_config)
+                try:
+                    chunks, head = await self._call(
+                        start, client=route.client, **kwargs)
+                except Exception as e:
+                    self._failed(route, e)
+                    error = e
+                    continue
+
+                self._succeeded(route)
+                for chunk in head:
+                    yield chunk
+                async for chunk in chunks:
+                    yield chunk
+                return
+
+            raise self._all_failed(error) from error
+
+        return stream()
+
+    tts_many = AsyncClient.tts_many
+
+    async def close(self):
+        for client in self.clients:
+            await client.close()
+
+    def __enter__(self):
+        raise TypeError('Use "async with" for async clients')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
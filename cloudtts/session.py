@@ -0,0 +1,184 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionConfig:
+    '''
+    This is a configuration of HTTP connection pools used by clients.
+
+    If pool_connections or pool_maxsize is omitted, sync clients use the
+    defaults of requests, 10, and async clients do not limit connections.
+    Async clients open up to pool_maxsize connections per host, and up to
+    pool_connections * pool_maxsize in total if both are set.
+
+    Args:
+      pool_connections: int / number of hosts to keep pools for
+      pool_maxsize: int / number of connections kept per host
+      keep_alive: bool / reuse connections between requests
+      idle_timeout: float / seconds before idle connections are dropped
+      timeout: float or tuple / connect and read timeout for requests
+    '''
+
+    # pool sizes of sync clients which are not set
+    DEFAULT_POOL_CONNECTIONS = 10
+    DEFAULT_POOL_MAXSIZE = 10
+
+    def __init__(self, pool_connections=None, pool_maxsize=None,
+                 keep_alive=True, idle_timeout=60, timeout=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+
+class PooledSession:
+    '''
+    This is a keep-alive HTTP session shared by all requests of a client.
+
+    Connections are kept in a pool and reused, so that only the first request
+    to a host pays for TCP and TLS handshakes. When the session has not been
+    used for idle_timeout seconds, the pool is dropped before the next request
+    because servers close idle connections anyway.
+    '''
+
+    def __init__(self, config=None):
+        self.config = config or SessionConfig()
+        self._session = None
+        self._last_used = 0
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        s = requests.Session()
+        config = self.config
+        adapter = HTTPAdapter(
+            pool_connections=config.pool_connections or
+            SessionConfig.DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize=config.pool_maxsize or
+            SessionConfig.DEFAULT_POOL_MAXSIZE)
+        s.mount('https://', adapter)
+        s.mount('http://', adapter)
+
+        if not self.config.keep_alive:
+            s.headers['Connection'] = 'close'
+
+        return s
+
+    def _get(self):
+        now = time.monotonic()
+
+        with self._lock:
+            idle_timeout = self.config.idle_timeout
+            if self._session is not None and idle_timeout is not None and \
+                    now - self._last_used > idle_timeout:
+                self._session.close()
+                self._session = None
+
+            if self._session is None:
+                self._session = self._new_session()
+
+            self._last_used = now
+
+            return self._session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.config.timeout)
+
+        return self._get().request(method, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        '''
+        Closes all pooled connections.
+        '''
+
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class AsyncPooledSession:
+    '''
+    This is a keep-alive HTTP session shared by all requests of an async
+    client.
+
+    aiohttp.ClientSession is created on the first request, because it has to
+    be created in a running event loop. Unless SessionConfig sets pool sizes,
+    the number of connections is not limited, so that requests are never
+    queued behind each other.
+    '''
+
+    def __init__(self, config=None):
+        self.config = config or SessionConfig()
+        self._session = None
+
+    def _timeout(self):
+        import aiohttp
+
+        timeout = self.config.timeout
+        if timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect,
+                                     sock_read=read)
+
+    def _new_session(self):
+        # aiohttp is imported on first use, like SDKs of providers
+        import aiohttp
+
+        # 0 is no limit in aiohttp
+        maxsize = self.config.pool_maxsize or 0
+        kwargs = {'limit': (self.config.pool_connections or 0) * maxsize,
+                  'limit_per_host': maxsize}
+        if not self.config.keep_alive:
+            kwargs['force_close'] = True
+        elif self.config.idle_timeout is not None:
+            kwargs['keepalive_timeout'] = self.config.idle_timeout
+
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(**kwargs),
+            timeout=self._timeout())
+
+    def _get(self):
+        if self._session is None or self._session.closed:
+            self._session = self._new_session()
+
+        return self._session
+
+    async def request(self, method, url, **kwargs):
+        '''
+        Sends a request and returns aiohttp.ClientResponse, which has to be
+        released by the caller.
+        '''
+
+        return await self._get().request(method, url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    def ws_connect(self, url, **kwargs):
+        '''
+        Returns a context manager which opens a WebSocket connection.
+        '''
+
+        return self._get().ws_connect(url, **kwargs)
+
+    async def close(self):
+        '''
+        Closes all pooled connections.
+        '''
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
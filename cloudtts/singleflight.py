@@ -0,0 +1,116 @@
+import threading
+
+
+class SingleFlight:
+    '''
+    This coalesces concurrent calls with the same key into one.
+
+    The first caller of a key calls the function and the others wait for
+    its result or error. A key is forgotten when the call finishes, so
+    this is not a cache.
+    '''
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        '''
+        Calls func unless a call with key is in flight.
+
+        Args:
+          key: hashable / identity of the call
+          func: function / takes no arguments
+
+        Returns:
+          the return value of func
+        '''
+
+        from concurrent.futures import Future
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    '''
+    This coalesces concurrent calls with the same key into one in an event
+    loop.
+
+    If the first caller is cancelled, one of the waiting callers calls the
+    function instead.
+    '''
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        '''
+        Awaits func unless a call with key is in flight.
+
+        Args:
+          key: hashable / identity of the call
+          func: function / takes no arguments and returns an awaitable
+
+        Returns:
+          the result of func
+        '''
+
+        import asyncio
+
+        while key in self._calls:
+            future = self._calls[key]
+            try:
+                ok, value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # this caller is cancelled
+                    raise
+                continue
+
+            if ok:
+                return value
+            raise value
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            # an error is passed as a result, so that it is not reported as
+            # never retrieved when nobody waits for it
+            future.set_result((False, e))
+            raise
+        else:
+            future.set_result((True, result))
+            return result
+        finally:
+            del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
@@ -0,0 +1,114 @@
+from contextvars import ContextVar
+import time
+
+
+class _NullSpan:
+    '''
+    This is the span used when tracing is disabled. It does nothing.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def is_recording(self):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+_current_span = ContextVar('cloudtts_current_span', default=None)
+
+
+class Span:
+    '''
+    This is a timed phase of a synthesis, made by Tracer.
+
+    Attributes:
+      name: string / name of the phase, such as 'cloudtts.request'
+      attributes: dict / provider, voice, characters, bytes and so on
+      parent: Span / enclosing span, or None
+      start: float / time.perf_counter() when the phase started
+      end: float / time.perf_counter() when the phase ended
+      error: Exception / raised exception, or None
+    '''
+
+    __slots__ = ('tracer', 'name', 'attributes', 'parent', 'start', 'end',
+                 'error', '_token')
+
+    def __init__(self, tracer, name, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = None
+        self.start = None
+        self.end = None
+        self.error = None
+        self._token = None
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def is_recording(self):
+        return self.end is None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.perf_counter()
+        self.error = exc_value
+        _current_span.reset(self._token)
+        self.tracer.on_end(self)
+
+        return False
+
+
+class Tracer:
+    '''
+    This calls a function with each span which has ended.
+
+    Clients take a tracer of OpenTelemetry as well, since they only call
+    start_as_current_span() of it.
+
+    >>> from cloudtts.trace import Tracer
+    >>> def log(span):
+    ...     print(span.name, span.duration, span.attributes)
+    >>> c = PollyClient(cred, tracer=Tracer(log))
+    >>> audio = c.tts('Hello world!')
+    cloudtts.request 0.08 {'cloudtts.attempt': 1, 'cloudtts.bytes': 12345}
+    cloudtts.tts 0.08 {'cloudtts.provider': 'polly', ...}
+
+    Args:
+      on_end: function / takes a Span
+    '''
+
+    def __init__(self, on_end):
+        self.on_end = on_end
+
+    def start_as_current_span(self, name, attributes=None):
+        '''
+        Returns a span, which starts when it is entered as a context manager.
+
+        Args:
+          name: string / name of the phase
+          attributes: dict / initial attributes
+
+        Returns:
+          Span
+        '''
+
+        return Span(self, name, attributes)
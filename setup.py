@@ -23,4 +23,8 @@ setup(
     install_requires=[
         p.strip() for p in open('requirements.txt').readlines()
     ],
+    extras_require={
+        'async': ['aiobotocore', 'aiohttp'],
+        'websocket': ['websocket-client'],
+    },
 )
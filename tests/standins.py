@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+from aiohttp.test_utils import TestServer
+
+
+class ThreadedServer:
+    '''
+    This runs an aiohttp application on an event loop of another thread,
+    so that clients without asyncio can be tested against it.
+
+    >>> with ThreadedServer(app) as url:
+    ...     ...
+    '''
+
+    def __init__(self, app):
+        self.loop = asyncio.new_event_loop()
+        self.server = TestServer(app, loop=self.loop)
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start_server(),
+                                         self.loop).result()
+
+        return str(self.server.make_url('')).rstrip('/')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        asyncio.run_coroutine_threadsafe(self.server.close(),
+                                         self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,204 @@
+import io
+import struct
+import wave
+from unittest import TestCase
+
+from cloudtts import AudioFormat
+from cloudtts import CloudTTSError
+from cloudtts.audio import concat
+from cloudtts.audio import join
+from cloudtts.audio import ogg_crc
+from cloudtts.audio import OGG_HEADER
+from cloudtts.audio import write
+
+
+# MPEG1 Layer III, 128kbps, 44.1kHz, stereo: 417 bytes per frame
+MP3_HEADER = b'\xff\xfb\x90\x44'
+MP3_FRAME_LENGTH = 417
+
+
+def mp3_frame(fill):
+    return MP3_HEADER + bytes([fill]) * (MP3_FRAME_LENGTH - 4)
+
+
+def xing_frame():
+    frame = bytearray(mp3_frame(0))
+    frame[36:40] = b'Xing'
+    return bytes(frame)
+
+
+def id3v2(size=20):
+    return b'ID3\x03\x00\x00' + bytes([0, 0, 0, size]) + b'\x01' * size
+
+
+def id3v1():
+    return b'TAG' + b'\x02' * 125
+
+
+def ogg_page(flags, granule, serial, seq, packets):
+    table = b''
+    for packet in packets:
+        table += b'\xff' * (len(packet) // 255) + bytes([len(packet) % 255])
+    body = b''.join(packets)
+    header = OGG_HEADER.pack(b'OggS', 0, flags, granule, serial, seq, 0,
+                             len(table))
+    crc = ogg_crc(header + table + body)
+
+    return header[:22] + struct.pack('<I', crc) + header[26:] + table + body
+
+
+def opus_stream(serial, packets, pre_skip=312):
+    head = b'OpusHead' + bytes([1, 1]) + struct.pack('<H', pre_skip) + \
+        struct.pack('<I', 24000) + b'\x00\x00\x00'
+    pages = [
+        ogg_page(0x02, 0, serial, 0, [head]),
+        ogg_page(0, 0, serial, 1, [b'OpusTags' + b'\x00' * 8]),
+    ]
+    for i, packet in enumerate(packets):
+        flags = 0x04 if i == len(packets) - 1 else 0
+        pages.append(ogg_page(flags, 960 * (i + 1), serial, i + 2, [packet]))
+
+    return b''.join(pages)
+
+
+def parse_ogg(data):
+    pages = []
+    while data:
+        fields = OGG_HEADER.unpack(data[:OGG_HEADER.size])
+        nsegs = fields[7]
+        table = data[27:27 + nsegs]
+        size = 27 + nsegs + sum(table)
+        page = data[:size]
+        zeroed = page[:22] + b'\0\0\0\0' + page[26:]
+        pages.append({
+            'flags': fields[2],
+            'granule': fields[3],
+            'serial': fields[4],
+            'seq': fields[5],
+            'crc_ok': fields[6] == ogg_crc(zeroed),
+            'body': page[27 + nsegs:],
+        })
+        data = data[size:]
+
+    return pages
+
+
+def wav(frames, rate=16000):
+    f = io.BytesIO()
+    w = wave.open(f, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(rate)
+    w.writeframes(frames)
+    w.close()
+
+    return f.getvalue()
+
+
+class TestMP3(TestCase):
+    def test_join(self):
+        a = id3v2() + xing_frame() + mp3_frame(1) + mp3_frame(2) + id3v1()
+        b = id3v2() + xing_frame() + mp3_frame(3) + id3v1()
+
+        self.assertEqual(join([a, b]),
+                         id3v2() + mp3_frame(1) + mp3_frame(2) + mp3_frame(3))
+
+    def test_without_tags(self):
+        a = mp3_frame(1)
+        b = mp3_frame(2)
+
+        self.assertEqual(join([a, b], AudioFormat.mp3), a + b)
+
+
+class TestOgg(TestCase):
+    def test_join(self):
+        a = opus_stream(1, [b'a' * 10, b'b' * 10])
+        b = opus_stream(2, [b'c' * 10])
+        pages = parse_ogg(join([a, b]))
+
+        # header pages of the second stream are dropped
+        self.assertEqual(len(pages), 5)
+        self.assertEqual([p['body'] for p in pages[2:]],
+                         [b'a' * 10, b'b' * 10, b'c' * 10])
+
+        for i, p in enumerate(pages):
+            self.assertTrue(p['crc_ok'])
+            self.assertEqual(p['serial'], 1)
+            self.assertEqual(p['seq'], i)
+
+        self.assertEqual([p['granule'] for p in pages],
+                         [0, 0, 960, 1920, 2880])
+        self.assertEqual([p['flags'] for p in pages], [2, 0, 0, 0, 4])
+
+    def test_incompatible_streams_are_chained(self):
+        a = opus_stream(1, [b'a' * 10])
+        b = opus_stream(2, [b'b' * 10]).replace(
+            b'OpusHead\x01\x01', b'OpusHead\x01\x02')
+        pages = parse_ogg(join([a, b], AudioFormat.ogg_opus))
+
+        self.assertEqual(len(pages), 6)
+        self.assertEqual([p['serial'] for p in pages], [1, 1, 1, 2, 2, 2])
+        self.assertEqual([p['seq'] for p in pages], [0, 1, 2, 0, 1, 2])
+        self.assertEqual([p['flags'] & 0x06 for p in pages],
+                         [2, 0, 4, 2, 0, 4])
+
+    def test_invalid_page(self):
+        self.assertRaises(CloudTTSError,
+                          lambda: join([b'OggS' + b'\x00' * 10],
+                                       AudioFormat.ogg_opus))
+
+
+class TestRIFF(TestCase):
+    def test_join(self):
+        data = join([wav(b'\x01\x00' * 100), wav(b'\x02\x00' * 50)])
+
+        w = wave.open(io.BytesIO(data))
+        self.assertEqual(w.getframerate(), 16000)
+        self.assertEqual(w.getnframes(), 150)
+        self.assertEqual(w.readframes(150),
+                         b'\x01\x00' * 100 + b'\x02\x00' * 50)
+        self.assertEqual(struct.unpack('<I', data[4:8])[0], len(data) - 8)
+
+    def test_streaming_header(self):
+        data = b''.join(concat([wav(b'\x01\x00' * 100)]))
+
+        self.assertEqual(data[4:8], b'\xff\xff\xff\xff')
+
+    def test_different_formats(self):
+        pieces = [wav(b'\x01\x00', 16000), wav(b'\x01\x00', 8000)]
+
+        self.assertRaises(CloudTTSError, lambda: join(pieces))
+
+
+class TestConcat(TestCase):
+    def test_raw_pcm(self):
+        self.assertEqual(join([b'\x01\x00', b'\x02\x00'], AudioFormat.pcm),
+                         b'\x01\x00\x02\x00')
+
+    def test_raw_pcm_like_mp3(self):
+        # samples of raw PCM may look like an ID3 tag
+        pieces = [b'ID3\x04\x00\x00\x00\x00\x00\x02ab\x01\x02'] * 2
+
+        self.assertEqual(join(pieces, AudioFormat.pcm), b''.join(pieces))
+
+    def test_no_pieces(self):
+        self.assertEqual(join([]), b'')
+
+    def test_files(self):
+        a = opus_stream(1, [b'a' * 60000])
+        b = opus_stream(2, [b'b' * 60000])
+
+        self.assertEqual(join([io.BytesIO(a), io.BytesIO(b)]), join([a, b]))
+
+    def test_memoryview(self):
+        a = memoryview(mp3_frame(1))
+
+        self.assertEqual(join([a, a]), mp3_frame(1) * 2)
+
+    def test_write(self):
+        f = io.BytesIO()
+        n = write([wav(b'\x01\x00' * 10), wav(b'\x01\x00' * 10)], f)
+
+        self.assertEqual(n, len(f.getvalue()))
+        w = wave.open(io.BytesIO(f.getvalue()))
+        self.assertEqual(w.getnframes(), 20)
@@ -1,5 +1,13 @@
+import io
+from unittest import IsolatedAsyncioTestCase
 from unittest import TestCase
+from unittest import mock
 
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from botocore.response import StreamingBody
+
+from cloudtts import AsyncPollyClient
 from cloudtts import AudioFormat
 from cloudtts import CloudTTSError
 from cloudtts import Gender
@@ -7,6 +15,9 @@ from cloudtts import Language
 from cloudtts import PollyClient
 from cloudtts import PollyCredential
 from cloudtts import VoiceConfig
+from cloudtts.aws import SynthesisTask
+from cloudtts.retry import RetryPolicy
+from tests.standins import ThreadedServer
 
 
 class TestPollyClient(TestCase):
@@ -153,6 +164,40 @@ class TestPollyClient(TestCase):
             params['sample_rate'] = rate
             self.assertTrue(self.c._is_valid_output_format(params))
 
+    def test_polly_client_is_shared(self):
+        PollyClient._polly_clients.clear()
+
+        self.c.auth(PollyCredential('ap-northeast-1'))
+        polly = self.c._polly()
+
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+        self.assertIs(c._polly(), polly)
+
+        c = PollyClient(PollyCredential('us-east-1'))
+        self.assertIsNot(c._polly(), polly)
+
+    def test_polly_client_config(self):
+        PollyClient._polly_clients.clear()
+
+        cred = PollyCredential('ap-northeast-1', max_pool_connections=50,
+                               connect_timeout=1, read_timeout=2,
+                               tcp_keepalive=True, retry_mode='adaptive')
+        self.c.auth(cred)
+        config = self.c._polly().meta.config
+
+        self.assertEqual(config.max_pool_connections, 50)
+        self.assertEqual(config.connect_timeout, 1)
+        self.assertEqual(config.read_timeout, 2)
+        self.assertTrue(config.tcp_keepalive)
+        self.assertEqual(config.retries['mode'], 'adaptive')
+
+    def test_polly_client_endpoint_url(self):
+        self.c.auth(PollyCredential('ap-northeast-1',
+                                    endpoint_url='http://127.0.0.1:8080'))
+
+        self.assertEqual(self.c._polly().meta.endpoint_url,
+                         'http://127.0.0.1:8080')
+
     def test_is_valid_voice_id(self):
         self.assertFalse(self.c._is_valid_voice_id({}))
 
@@ -160,6 +205,334 @@ class TestPollyClient(TestCase):
             self.assertTrue(self.c._is_valid_voice_id({'voice_id': voice}))
 
 
+class TestPollyClientStream(TestCase):
+    def setUp(self):
+        self.c = PollyClient(PollyCredential('ap-northeast-1'))
+
+    def test_tts_stream(self):
+        audio = b'a' * (PollyClient.STREAM_CHUNK_SIZE + 1)
+        body = StreamingBody(io.BytesIO(audio), len(audio))
+
+        with mock.patch.object(self.c, '_synthesize_speech',
+                               return_value={'AudioStream': body}):
+            chunks = list(self.c.tts_stream('Hello world'))
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(b''.join(chunks), audio)
+
+    def test_tts_stream_validates_eagerly(self):
+        self.assertRaises(ValueError, lambda: self.c.tts_stream())
+
+
+class _AsyncAudioStream:
+    def __init__(self, audio):
+        self.audio = audio
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.closed = True
+
+    async def read(self):
+        return self.audio
+
+    async def iter_chunks(self, chunk_size):
+        for i in range(0, len(self.audio), chunk_size):
+            yield self.audio[i:i + chunk_size]
+
+
+class TestAsyncPollyClient(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        cred = PollyCredential('ap-northeast-1', aws_access_key_id='xxxx',
+                               aws_secret_access_key='yyyy')
+        self.c = AsyncPollyClient(cred)
+
+        self.audio = b'a' * (PollyClient.STREAM_CHUNK_SIZE + 1)
+        self.polly = mock.Mock()
+        self.polly.synthesize_speech = mock.AsyncMock(
+            side_effect=lambda **kwargs: {
+                'AudioStream': _AsyncAudioStream(self.audio)})
+
+    async def asyncTearDown(self):
+        await self.c.close()
+
+    async def test_tts(self):
+        with mock.patch.object(self.c, '_polly', return_value=self.polly):
+            audio = await self.c.tts('Hello world')
+
+        self.assertEqual(audio, self.audio)
+        self.polly.synthesize_speech.assert_awaited_with(
+            Text='Hello world', TextType='text', OutputFormat='mp3',
+            VoiceId='Joanna', SampleRate='22050')
+
+    async def test_tts_stream(self):
+        with mock.patch.object(self.c, '_polly', return_value=self.polly):
+            chunks = [c async for c in self.c.tts_stream(ssml='<speak/>')]
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(b''.join(chunks), self.audio)
+
+    async def test_tts_validates_eagerly(self):
+        self.assertRaises(ValueError, lambda: self.c.tts())
+
+    async def test_polly_is_reused(self):
+        polly = await self.c._polly()
+
+        self.assertIs(await self.c._polly(), polly)
+
+        await self.c.close()
+        self.assertIsNot(await self.c._polly(), polly)
+
+
+def _task_app(received):
+    # a stand-in of synthesis tasks of Polly and GetObject of S3, which
+    # completes a task on its second poll
+    tasks = {}
+    objects = {}
+
+    def task(task_id, status, request):
+        t = tasks[task_id]
+        response = {'TaskId': task_id, 'TaskStatus': status,
+                    'RequestCharacters': len(t['Text']),
+                    'OutputUri': '{}/{}/{}'.format(
+                        request.url.origin(), t['OutputS3BucketName'],
+                        t['key'])}
+        if status == 'failed':
+            response['TaskStatusReason'] = 'Invalid SSML'
+
+        return web.json_response({'SynthesisTask': response})
+
+    async def start(request):
+        body = await request.json()
+        received.append(body)
+
+        if body['Text'] == 'reject':
+            return web.json_response(
+                {'message': 'Text is rejected'}, status=400,
+                headers={'x-amzn-ErrorType': 'InvalidSsmlException'})
+
+        task_id = 'task{}'.format(len(tasks))
+        body['key'] = '{}{}.{}'.format(body.get('OutputS3KeyPrefix', ''),
+                                       task_id, body['OutputFormat'])
+        body['polls'] = 0
+        tasks[task_id] = body
+
+        return task(task_id, 'scheduled', request)
+
+    async def get(request):
+        task_id = request.match_info['task_id']
+        t = tasks[task_id]
+        t['polls'] += 1
+
+        if t['polls'] < 2:
+            return task(task_id, 'inProgress', request)
+
+        if t['Text'] == 'fail':
+            return task(task_id, 'failed', request)
+
+        objects[(t['OutputS3BucketName'], t['key'])] = \
+            t['Text'].encode() * 3000
+        return task(task_id, 'completed', request)
+
+    async def get_object(request):
+        key = (request.match_info['bucket'], request.match_info['key'])
+        if key not in objects:
+            return web.Response(status=404, body=(
+                b'<Error><Code>NoSuchKey</Code>'
+                b'<Message>Not found</Message></Error>'))
+
+        return web.Response(body=objects[key],
+                            content_type='application/octet-stream')
+
+    app = web.Application()
+    app.router.add_post('/v1/synthesisTasks', start)
+    app.router.add_get('/v1/synthesisTasks/{task_id}', get)
+    app.router.add_get('/{bucket}/{key:.+}', get_object)
+
+    return app
+
+
+def _task_credential(url):
+    return PollyCredential('us-east-1', aws_access_key_id='xxxx',
+                           aws_secret_access_key='yyyy', endpoint_url=url,
+                           s3_endpoint_url=url)
+
+
+class TestSynthesisTask(TestCase):
+    def test_key(self):
+        task = SynthesisTask('books', {
+            'TaskId': 'abc', 'TaskStatus': 'completed',
+            'OutputUri': 'https://s3.us-east-1.amazonaws.com/books/'
+                         'a%20b/abc.mp3'})
+        self.assertEqual(task.key, 'a b/abc.mp3')
+        self.assertTrue(task.done)
+
+        task = SynthesisTask('books', {
+            'TaskId': 'abc', 'TaskStatus': 'inProgress',
+            'OutputUri': 'https://books.s3.amazonaws.com/books/abc.mp3'})
+        self.assertEqual(task.key, 'books/abc.mp3')
+        self.assertFalse(task.done)
+
+
+class TestPollyClientTask(TestCase):
+    def setUp(self):
+        self.received = []
+
+        server = ThreadedServer(_task_app(self.received))
+        url = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+
+        self.c = PollyClient(_task_credential(url))
+
+    def test_task(self):
+        task = self.c.submit_task('Hello', bucket='books', key_prefix='a/',
+                                  detail={'voice_id': 'Mizuki',
+                                          'output_format': 'mp3',
+                                          'sample_rate': '22050'})
+
+        self.assertEqual(task.status, 'scheduled')
+        self.assertEqual(self.received[0]['VoiceId'], 'Mizuki')
+        self.assertEqual(self.received[0]['OutputS3KeyPrefix'], 'a/')
+
+        self.assertIs(self.c.wait_task(task, interval=0.01), task)
+        self.assertEqual(task.key, 'a/task0.mp3')
+
+        chunks = list(self.c.stream_task(task))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), b'Hello' * 3000)
+
+        with self.c.fetch_task(task) as f:
+            self.assertEqual(f.read(), b'Hello' * 3000)
+
+    def test_long_text(self):
+        text = 'a' * (PollyClient.MAX_TEXT_LENGTH + 1)
+        self.assertRaises(CloudTTSError, lambda: self.c.tts(text))
+
+        task = self.c.submit_task(text, bucket='books')
+        self.c.wait_task(task, interval=0.01)
+
+        buffer = bytearray()
+        self.assertEqual(self.c.fetch_task(task, buffer), len(text) * 3000)
+
+        text = 'a' * (PollyClient.MAX_TASK_TEXT_LENGTH + 1)
+        self.assertRaises(CloudTTSError,
+                          lambda: self.c.submit_task(text, bucket='books'))
+
+    def test_many_tasks(self):
+        results = self.c.submit_tasks(
+            ['text {}'.format(i) for i in range(10)] +
+            [{'ssml': '<speak>Hello</speak>', 'key_prefix': 'ssml/'}],
+            bucket='books')
+        tasks = [result.task for result in results]
+
+        self.assertEqual(len(tasks), 11)
+        # tasks are submitted concurrently, so they arrive in any order
+        self.assertEqual(sorted(r['TextType'] for r in self.received),
+                         ['ssml'] + ['text'] * 10)
+
+        self.c.wait_tasks(tasks, interval=0.01)
+
+        self.assertTrue(all(task.status == 'completed' for task in tasks))
+        self.assertTrue(tasks[-1].key.startswith('ssml/'))
+
+    def test_failure_of_submission(self):
+        results = self.c.submit_tasks(['text 0', 'reject', 'text 2', 3],
+                                      bucket='books')
+
+        self.assertEqual([result.ok for result in results],
+                         [True, False, True, False])
+        self.assertEqual(results[1].item, 'reject')
+        self.assertIsInstance(results[3].error, TypeError)
+
+        # tasks which started are still returned
+        tasks = [result.task for result in results if result.ok]
+        self.c.wait_tasks(tasks, interval=0.01)
+        self.assertEqual(self.c.fetch_task(tasks[1], bytearray()),
+                         len('text 2') * 3000)
+
+    def test_failure(self):
+        task = self.c.submit_task('fail', bucket='books')
+
+        with self.assertRaises(CloudTTSError):
+            self.c.wait_task(task, interval=0.01)
+        self.assertEqual(task.reason, 'Invalid SSML')
+        self.assertRaises(CloudTTSError, lambda: self.c.fetch_task(task))
+
+    def test_timeout(self):
+        task = self.c.submit_task('Hello', bucket='books')
+
+        with self.assertRaises(TimeoutError):
+            self.c.wait_task(task, interval=0.01, timeout=0.005)
+
+    def test_poll_at_deadline(self):
+        task = self.c.submit_task('Hello', bucket='books')
+
+        # the second poll is at the deadline rather than after it
+        self.c.wait_task(task, interval=0.01, timeout=0.015)
+        self.assertEqual(task.status, 'completed')
+
+    def test_no_bucket(self):
+        self.assertRaises(ValueError, lambda: self.c.submit_task('Hello'))
+
+    def test_retry(self):
+        c = PollyClient(self.c.credential, retry=RetryPolicy(base_delay=0))
+        task = c.submit_task('Hello', bucket='books')
+
+        self.assertEqual(c.poll_task(task).status, 'inProgress')
+
+
+class TestAsyncPollyClientTask(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.received = []
+
+        self.server = TestServer(_task_app(self.received))
+        await self.server.start_server()
+
+        url = str(self.server.make_url('')).rstrip('/')
+        self.c = AsyncPollyClient(_task_credential(url))
+
+    async def asyncTearDown(self):
+        await self.c.close()
+        await self.server.close()
+
+    async def test_task(self):
+        task = await self.c.submit_task('Hello', bucket='books')
+        await self.c.wait_task(task, interval=0.01)
+
+        chunks = [chunk async for chunk in self.c.stream_task(task)]
+        self.assertEqual(b''.join(chunks), b'Hello' * 3000)
+
+        f = io.BytesIO()
+        self.assertEqual(await self.c.fetch_task(task, f), 15000)
+
+    async def test_timeout(self):
+        task = await self.c.submit_task('Hello', bucket='books')
+
+        with self.assertRaises(TimeoutError):
+            await self.c.wait_task(task, interval=0.01, timeout=0.005)
+
+        await self.c.wait_task(task, interval=0.01, timeout=0.015)
+        self.assertEqual(task.status, 'completed')
+
+    async def test_many_tasks(self):
+        results = await self.c.submit_tasks(
+            ['text {}'.format(i) for i in range(10)] + ['fail', 'reject'],
+            bucket='books', max_concurrency=4)
+
+        self.assertIsNone(results[-1].task)
+        self.assertIsNotNone(results[-1].error)
+        tasks = [result.task for result in results[:-1]]
+
+        await self.c.wait_tasks(tasks, interval=0.01)
+
+        self.assertEqual([task.status for task in tasks],
+                         ['completed'] * 10 + ['failed'])
+        self.assertEqual(await self.c.fetch_task(tasks[3], bytearray()),
+                         len('text 3') * 3000)
+
+
 class TestPollyCredential(TestCase):
     def test_has_access_key(self):
         c = PollyCredential('ap-northeast-1')
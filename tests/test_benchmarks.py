@@ -0,0 +1,17 @@
+from unittest import TestCase
+
+from benchmarks import run
+
+
+class TestBenchmarks(TestCase):
+    def test_run(self):
+        results = run.run(latency=0, payload=1024, requests=3,
+                          concurrency=(1, 2), asynchronous=True,
+                          import_repeat=1)
+
+        self.assertEqual(len(results), 8)
+        for name, result in results.items():
+            self.assertGreater(result['throughput'][2], 0, name)
+            self.assertGreater(result['peak_kib'], 0, name)
+
+        self.assertIn('PollyClient', run.report(results, (1, 2)))
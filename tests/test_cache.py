@@ -0,0 +1,262 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.cache import cache_key
+from cloudtts.cache import DiskCache
+from cloudtts.cache import MemoryCache
+from cloudtts.cache import normalize_text
+
+
+class TestCacheKey(TestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('  Hello \n world '), 'Hello world')
+        # NFD and NFC forms of 'é'
+        self.assertEqual(normalize_text('é'), normalize_text('é'))
+
+    def test_cache_key(self):
+        params = {'voice': 'a', 'accept': 'audio/mp3'}
+
+        k = cache_key('WatsonClient', params, 'Hello world')
+        self.assertEqual(k, cache_key('WatsonClient', dict(params),
+                                      'Hello  world'))
+        self.assertNotEqual(k, cache_key('AzureClient', params,
+                                         'Hello world'))
+        self.assertNotEqual(k, cache_key('WatsonClient', {'voice': 'b'},
+                                         'Hello world'))
+        self.assertNotEqual(k, cache_key('WatsonClient', params,
+                                         ssml='Hello world'))
+
+
+class TestMemoryCache(TestCase):
+    def test_get_and_set(self):
+        c = MemoryCache()
+
+        self.assertIsNone(c.get('a'))
+        c.set('a', b'abc')
+        self.assertEqual(c.get('a'), b'abc')
+
+        stats = c.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 3)
+
+    def test_eviction(self):
+        c = MemoryCache(max_bytes=10)
+        c.set('a', b'a' * 4)
+        c.set('b', b'b' * 4)
+        c.get('a')
+        c.set('c', b'c' * 4)
+
+        # 'b' is least recently used
+        self.assertIsNone(c.get('b'))
+        self.assertEqual(c.get('a'), b'a' * 4)
+        self.assertEqual(c.get('c'), b'c' * 4)
+        self.assertEqual(c.stats()['evictions'], 1)
+        self.assertEqual(c.stats()['bytes'], 8)
+
+    def test_too_large_entry(self):
+        c = MemoryCache(max_bytes=10)
+        c.set('a', b'a' * 11)
+
+        self.assertEqual(len(c), 0)
+
+    def test_overwrite(self):
+        c = MemoryCache()
+        c.set('a', b'a' * 4)
+        c.set('a', b'a' * 2)
+
+        self.assertEqual(c.stats()['bytes'], 2)
+
+    def test_clear(self):
+        c = MemoryCache()
+        c.set('a', b'abc')
+        c.clear()
+
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(c.stats()['bytes'], 0)
+
+
+class TestClientCache(TestCase):
+    def setUp(self):
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url='https://example.com')
+        self.c = WatsonClient(cred, cache=MemoryCache())
+
+        patcher = mock.patch.object(self.c.session, 'post')
+        self.post = patcher.start()
+        self.post.return_value.status_code = 200
+        self.post.return_value.content = b'audio'
+        self.addCleanup(patcher.stop)
+
+    def test_tts_is_cached(self):
+        self.assertEqual(self.c.tts('Hello world'), b'audio')
+        self.assertEqual(self.c.tts('Hello  world '), b'audio')
+        self.assertEqual(self.post.call_count, 1)
+
+        self.c.tts('Hello world', detail={'accept': 'audio/mp3',
+                                          'voice': 'en-US_MichaelVoice'})
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_error_is_not_cached(self):
+        self.post.return_value.status_code = 500
+        self.post.return_value.raise_for_status.side_effect = ValueError
+
+        self.assertRaises(ValueError, lambda: self.c.tts('Hello world'))
+        self.assertEqual(len(self.c.cache), 0)
+
+    def test_tts_stream_is_cached(self):
+        self.post.return_value.iter_content.return_value = iter([b'a', b'b'])
+
+        self.assertEqual(list(self.c.tts_stream('Hello world')), [b'a', b'b'])
+        self.assertEqual(list(self.c.tts_stream('Hello world')), [b'ab'])
+        self.assertEqual(self.c.tts('Hello world'), b'ab')
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_without_cache(self):
+        self.c.cache = None
+        self.c.tts('Hello world')
+        self.c.tts('Hello world')
+
+        self.assertEqual(self.post.call_count, 2)
+
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.path = d.name
+        self.addCleanup(d.cleanup)
+
+    def test_get_and_set(self):
+        c = DiskCache(self.path)
+
+        self.assertIsNone(c.get('aaaa'))
+        c.set('aaaa', b'abc')
+
+        audio = c.get('aaaa')
+        self.assertIsInstance(audio, memoryview)
+        self.assertEqual(audio, b'abc')
+
+        stats = c.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 3)
+
+    def test_empty_audio(self):
+        c = DiskCache(self.path)
+        c.set('aaaa', b'')
+
+        self.assertEqual(c.get('aaaa'), b'')
+
+    def test_persistence(self):
+        DiskCache(self.path).set('aaaa', b'abc')
+
+        self.assertEqual(DiskCache(self.path).get('aaaa'), b'abc')
+
+    def test_no_temporary_files(self):
+        c = DiskCache(self.path)
+        c.set('aaaa', b'abc')
+
+        self.assertEqual(os.listdir(os.path.join(self.path, 'aa')), ['aaaa'])
+
+    def test_eviction(self):
+        c = DiskCache(self.path, max_bytes=10)
+
+        with mock.patch('cloudtts.cache.time.time', return_value=1):
+            c.set('aaaa', b'a' * 4)
+        with mock.patch('cloudtts.cache.time.time', return_value=2):
+            c.set('bbbb', b'b' * 4)
+        with mock.patch('cloudtts.cache.time.time', return_value=3):
+            c.get('aaaa')
+        with mock.patch('cloudtts.cache.time.time', return_value=4):
+            c.set('cccc', b'c' * 4)
+
+        # 'bbbb' is least recently used
+        self.assertIsNone(c.get('bbbb'))
+        self.assertFalse(os.path.exists(os.path.join(self.path, 'bb',
+                                                     'bbbb')))
+        self.assertEqual(c.get('aaaa'), b'a' * 4)
+        self.assertEqual(c.get('cccc'), b'c' * 4)
+        self.assertEqual(c.stats()['evictions'], 1)
+        self.assertEqual(c.stats()['bytes'], 8)
+
+    def test_eviction_in_batches(self):
+        c = DiskCache(self.path, max_bytes=100)
+
+        with mock.patch.object(DiskCache, 'EVICT_BATCH', 3):
+            for i in range(10):
+                with mock.patch('cloudtts.cache.time.time', return_value=i):
+                    c.set('{:04}'.format(i), b'a' * 10)
+            with mock.patch('cloudtts.cache.time.time', return_value=10):
+                c.set('big0', b'b' * 75)
+
+        self.assertEqual(c.stats()['evictions'], 8)
+        self.assertEqual(c.stats()['bytes'], 95)
+        self.assertEqual(c.get('0007'), None)
+        self.assertEqual(c.get('0008'), b'a' * 10)
+
+    def test_total(self):
+        c = DiskCache(self.path)
+        c.set('aaaa', b'abc')
+        c.set('aaaa', b'abcde')
+        c.set('bbbb', b'ab')
+
+        self.assertEqual(c.stats()['bytes'], 7)
+
+        c._db().db.execute('DELETE FROM meta')
+
+        # the total is summed up when it is missing
+        self.assertEqual(DiskCache(self.path).stats()['bytes'], 7)
+
+    def test_ttl(self):
+        c = DiskCache(self.path, ttl=60)
+
+        with mock.patch('cloudtts.cache.time.time', return_value=100):
+            c.set('aaaa', b'abc')
+        with mock.patch('cloudtts.cache.time.time', return_value=160):
+            self.assertEqual(c.get('aaaa'), b'abc')
+        with mock.patch('cloudtts.cache.time.time', return_value=161):
+            self.assertIsNone(c.get('aaaa'))
+
+        self.assertEqual(len(c), 0)
+
+    def test_missing_file(self):
+        c = DiskCache(self.path)
+        c.set('aaaa', b'abc')
+        os.remove(os.path.join(self.path, 'aa', 'aaaa'))
+
+        self.assertIsNone(c.get('aaaa'))
+        self.assertEqual(len(c), 0)
+
+    def test_clear(self):
+        c = DiskCache(self.path)
+        c.set('aaaa', b'abc')
+        c.clear()
+
+        self.assertIsNone(c.get('aaaa'))
+        self.assertEqual(c.stats()['bytes'], 0)
+
+    def test_client(self):
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url='https://example.com')
+        c = WatsonClient(cred, cache=DiskCache(self.path))
+
+        with mock.patch.object(c.session, 'post') as post:
+            post.return_value.status_code = 200
+            post.return_value.content = b'audio'
+
+            c.tts('Hello world')
+            audio = c.tts('Hello world')
+            self.assertIsInstance(audio, bytes)
+            self.assertEqual(audio, b'audio')
+            self.assertEqual(post.call_count, 1)
+
+            # streams are not copied
+            chunks = list(c.tts_stream('Hello world'))
+            self.assertIsInstance(chunks[0], memoryview)
+            self.assertEqual(b''.join(chunks), b'audio')
@@ -0,0 +1,202 @@
+import threading
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import AudioFormat
+from cloudtts import AzureClient
+from cloudtts import AzureCredential
+from cloudtts import CloudTTSError
+from cloudtts import PollyClient
+from cloudtts import PollyCredential
+from cloudtts import VoiceConfig
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.chunk import split_ssml
+from cloudtts.chunk import split_text
+
+
+def shorter_than(n):
+    return lambda chunk: len(chunk) <= n
+
+
+class TestSplitText(TestCase):
+    def test_short_text(self):
+        self.assertEqual(split_text('Hello world.', shorter_than(100)),
+                         ['Hello world.'])
+
+    def test_sentences(self):
+        text = 'Hello world. This is a test! Is it? 日本語です。次の文。'
+        chunks = split_text(text, shorter_than(30))
+
+        self.assertEqual(''.join(chunks), text)
+        self.assertEqual(chunks[0], 'Hello world. This is a test! ')
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 30)
+
+    def test_clauses_and_words(self):
+        text = 'This is a long sentence, with a clause; and many more words.'
+        chunks = split_text(text, shorter_than(20))
+
+        self.assertEqual(''.join(chunks), text)
+        self.assertEqual(chunks[0], 'This is a long ')
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 20)
+
+    def test_characters(self):
+        chunks = split_text('a' * 25, shorter_than(10))
+
+        self.assertEqual(chunks, ['a' * 10, 'a' * 10, 'a' * 5])
+
+    def test_whitespace(self):
+        self.assertRaises(CloudTTSError,
+                          lambda: split_text(' \n\t', shorter_than(10)))
+
+
+class TestSplitSSML(TestCase):
+    def test_short_ssml(self):
+        ssml = '<speak>Hello <break time="1s"/> world.</speak>'
+
+        self.assertEqual(split_ssml(ssml, shorter_than(100)), [ssml])
+
+    def test_root_is_kept(self):
+        ssml = '<speak version="1.0">First sentence. Second sentence.</speak>'
+        chunks = split_ssml(ssml, shorter_than(45))
+
+        self.assertEqual(chunks, [
+            '<speak version="1.0">First sentence. </speak>',
+            '<speak version="1.0">Second sentence.</speak>',
+        ])
+
+    def test_elements_are_balanced(self):
+        ssml = ('<speak><p><prosody rate="slow">First sentence. '
+                'Second sentence.</prosody></p> Third.</speak>')
+        chunks = split_ssml(ssml, shorter_than(80))
+
+        self.assertEqual(chunks, [
+            '<speak><p><prosody rate="slow">First sentence. '
+            '</prosody></p></speak>',
+            '<speak><p><prosody rate="slow">Second sentence.'
+            '</prosody></p> Third.</speak>',
+        ])
+
+    def test_no_empty_elements(self):
+        ssml = ('<speak><p>Hello world. This is <emphasis><prosody '
+                'rate="slow">a very important thing to say.</prosody>'
+                '</emphasis> End.</p></speak>')
+
+        for n in range(90, 125, 5):
+            chunks = split_ssml(ssml, shorter_than(n))
+
+            for chunk in chunks:
+                self.assertNotRegex(chunk, r'<([\w-]+)[^>/]*></\1>')
+            self.assertEqual(chunks[0],
+                             '<speak><p>Hello world. This is </p></speak>')
+
+    def test_atomic_elements(self):
+        ssml = ('<speak>Hello. <say-as interpret-as="characters">'
+                'ABC DEF</say-as></speak>')
+        chunks = split_ssml(ssml, shorter_than(70))
+
+        self.assertEqual(chunks[1], '<speak><say-as interpret-as='
+                                    '"characters">ABC DEF</say-as></speak>')
+
+    def test_too_long_atomic_element(self):
+        ssml = '<speak><sub alias="x">{}</sub></speak>'.format('a' * 100)
+
+        self.assertRaises(CloudTTSError,
+                          lambda: split_ssml(ssml, shorter_than(60)))
+
+
+class TestTTSChunked(TestCase):
+    def test_polly(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+        text = 'Hello world. ' * 500
+
+        with mock.patch.object(c, '_request') as request:
+            request.side_effect = lambda params, text, ssml: \
+                text.encode() if text else ssml.encode()
+
+            audio = c.tts_chunked(text=text)
+
+        self.assertGreater(request.call_count, 1)
+        self.assertEqual(audio, text.encode())
+        for args in request.call_args_list:
+            self.assertLessEqual(len(args[0][1]), PollyClient.MAX_TEXT_LENGTH)
+
+    def test_polly_pcm(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+        text = 'Hello world. ' * 500
+        vc = VoiceConfig(audio_format=AudioFormat.pcm)
+
+        with mock.patch.object(c, '_request') as request:
+            request.return_value = b'ID3\x04\x00\x00\x00\x00\x00\x02ab'
+            audio = c.tts_chunked(text=text, voice_config=vc)
+
+        self.assertEqual(len(audio), 12 * request.call_count)
+
+    def test_polly_ssml(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+        ssml = '<speak>{}</speak>'.format('Hello world. ' * 500)
+
+        with mock.patch.object(c, '_request') as request:
+            request.return_value = b'a'
+            c.tts_chunked(ssml=ssml)
+
+        for args in request.call_args_list:
+            params, text, ssml = args[0]
+            self.assertEqual(text, '')
+            self.assertTrue(ssml.startswith('<speak>'))
+            self.assertTrue(ssml.endswith('</speak>'))
+
+    def test_azure(self):
+        c = AzureClient(AzureCredential('xxxx'))
+        text = 'Hello world. ' * 100
+
+        with mock.patch.object(c, '_request') as request:
+            request.return_value = b'a'
+            c.tts_chunked(text)
+
+        self.assertGreater(request.call_count, 1)
+        for args in request.call_args_list:
+            params, text, ssml = args[0]
+            xml = c._xml(params, text)
+            self.assertLessEqual(len(xml), AzureClient.MAX_TEXT_LENGTH)
+
+    def test_watson_ssml_in_text(self):
+        c = WatsonClient(WatsonCredential('xxxx', 'yyyy', 'https://e.com'))
+        text = '<speak>{}</speak>'.format('Hello world. ' * 500)
+
+        with mock.patch.object(c, '_request') as request:
+            request.return_value = b'a'
+            c.tts_chunked(text)
+
+        self.assertGreater(request.call_count, 1)
+        for args in request.call_args_list:
+            params, text, ssml = args[0]
+            self.assertTrue(text.startswith('<speak>'))
+            self.assertLessEqual(c._text_bytes(text),
+                                 WatsonClient.MAX_TEXT_BYTES)
+
+    def test_chunks_are_synthesized_concurrently(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+        # chunks differ, or they are coalesced into one request
+        text = ''.join(ch * PollyClient.MAX_TEXT_LENGTH for ch in 'abcd')
+        barrier = threading.Barrier(4, timeout=5)
+
+        def request(params, text, ssml):
+            barrier.wait()
+            return b'a'
+
+        with mock.patch.object(c, '_request', side_effect=request):
+            self.assertEqual(c.tts_chunked(text, max_workers=4), b'aaaa')
+
+    def test_auth_before_tts(self):
+        c = PollyClient()
+
+        self.assertRaises(CloudTTSError, lambda: c.tts_chunked('Hello'))
+
+    def test_error_without_data(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+
+        self.assertRaises(ValueError, lambda: c.tts_chunked())
+        self.assertRaises(CloudTTSError, lambda: c.tts_chunked(' \n '))
@@ -0,0 +1,377 @@
+import copy
+import io
+import pickle
+import socket
+import threading
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import AzureClient
+from cloudtts import AzureCredential
+from cloudtts import PollyClient
+from cloudtts import PollyCredential
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.client import AsyncClient
+from cloudtts.client import AudioFormat
+from cloudtts.client import BatchResult
+from cloudtts.client import Client
+from cloudtts.client import Gender
+from cloudtts.client import Language
+from cloudtts.client import RequestPlan
+from cloudtts.client import VoiceConfig
+
+
+class _Client(Client):
+    def __init__(self, delay=0):
+        super().__init__('credential')
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def tts(self, text='', ssml='', voice_config=None, detail=None):
+        if text == 'error':
+            raise ValueError(text)
+
+        with self.lock:
+            self.calls.append(text or ssml)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(self.delay)
+
+        with self.lock:
+            self.in_flight -= 1
+
+        return (text or ssml).encode()
+
+
+class _AsyncClient(AsyncClient):
+    def __init__(self):
+        super().__init__('credential')
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _tts(self, text):
+        import asyncio
+
+        self.calls.append(text)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        return text.encode()
+
+    def tts(self, text='', ssml='', voice_config=None, detail=None):
+        if text == 'error':
+            raise ValueError(text)
+
+        return self._tts(text)
+
+
+class _StreamClient(Client):
+    CHUNKS = (b'aud', b'io')
+
+    def __init__(self):
+        super().__init__('credential')
+        self.calls = []
+
+    def tts_stream(self, text='', ssml='', voice_config=None, detail=None):
+        self.calls.append((text, ssml))
+
+        return iter(self.CHUNKS)
+
+
+class _AsyncStreamClient(AsyncClient):
+    def __init__(self):
+        super().__init__('credential')
+
+    async def tts_stream(self, text='', ssml='', voice_config=None,
+                         detail=None):
+        for chunk in _StreamClient.CHUNKS:
+            yield chunk
+
+
+class TestVoiceConfig(TestCase):
+    def test_immutable(self):
+        vc = VoiceConfig()
+
+        with self.assertRaises(AttributeError):
+            vc.gender = Gender.male
+        with self.assertRaises(AttributeError):
+            vc.other = 1
+        with self.assertRaises(AttributeError):
+            del vc.language
+
+    def test_hashable(self):
+        vc = VoiceConfig(language=Language.ja_JP)
+
+        self.assertEqual(vc, VoiceConfig(language=Language.ja_JP))
+        self.assertNotEqual(vc, VoiceConfig())
+        self.assertEqual(len({vc, VoiceConfig(language=Language.ja_JP)}), 1)
+
+    def test_repr(self):
+        self.assertEqual(repr(VoiceConfig()),
+                         'VoiceConfig(audio_format=AudioFormat.mp3, '
+                         'gender=Gender.female, language=Language.en_US)')
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, lambda: VoiceConfig(audio_format='mp3'))
+
+    def test_pickle_and_copy(self):
+        vc = VoiceConfig(AudioFormat.pcm, Gender.male, Language.ja_JP)
+
+        for other in (pickle.loads(pickle.dumps(vc)), copy.copy(vc),
+                      copy.deepcopy(vc)):
+            self.assertEqual(other, vc)
+            self.assertEqual(other.language, Language.ja_JP)
+
+
+class TestRequestPlan(TestCase):
+    def test_plan_is_memoized(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'))
+
+        with mock.patch.object(c, '_build_params',
+                               wraps=c._build_params) as build:
+            plan = c._make_params(VoiceConfig(), {'sample_rate': '8000'})
+            self.assertIs(c._make_params(VoiceConfig(),
+                                         {'sample_rate': '8000'}), plan)
+            self.assertIsNot(c._make_params(VoiceConfig(), None), plan)
+
+        self.assertIsInstance(plan, RequestPlan)
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(plan.speech_kwargs, {'OutputFormat': 'mp3',
+                                              'VoiceId': 'Joanna',
+                                              'SampleRate': '8000'})
+
+    def test_unhashable_detail(self):
+        c = WatsonClient()
+        detail = {'accept': 'audio/mp3', 'voice': 'en-US_AllisonVoice',
+                  'extra': ['x']}
+
+        self.assertEqual(c._make_params(None, detail), detail)
+        self.assertEqual(len(c._plans), 0)
+
+    def test_invalid_params_are_not_memoized(self):
+        c = WatsonClient()
+
+        for _ in range(2):
+            self.assertRaises(ValueError, lambda: c._make_params(
+                VoiceConfig(language=Language.ko_KR), None))
+        self.assertEqual(len(c._plans), 0)
+
+    def test_max_plans(self):
+        c = WatsonClient()
+        c.MAX_PLANS = 2
+
+        for voice in WatsonClient.AVAILABLE_VOICES[:3]:
+            c._make_params(None, {'accept': 'audio/mp3', 'voice': voice})
+
+        self.assertEqual(len(c._plans), 1)
+
+    def test_auth_clears_plans(self):
+        c = WatsonClient(WatsonCredential('xxxx', 'yyyy', 'https://a.com'))
+        c._make_params(None, None)
+        self.assertEqual(c._url(), 'https://a.com/v1/synthesize')
+
+        c.auth(WatsonCredential('xxxx', 'yyyy', 'https://b.com'))
+
+        self.assertEqual(len(c._plans), 0)
+        self.assertEqual(c._url(), 'https://b.com/v1/synthesize')
+
+    def test_azure_xml(self):
+        c = AzureClient(AzureCredential('xxxx'))
+        params = c._make_params(None, None)
+
+        self.assertEqual(c._xml(params, '<speak>Hello</speak>'),
+                         AzureClient.XML.format(lang='en-US', gender='female',
+                                                voice='ZiraRUS', text='Hello'))
+        self.assertEqual(c._xml(dict(params), 'Hello'),
+                         c._xml(params, 'Hello'))
+
+        xml = c._xml(params, '<speak>Hello 世界</speak>')
+        self.assertEqual(c._xml_length(params, '<speak>Hello 世界</speak>'),
+                         len(xml))
+        self.assertEqual(c._body(params, '<speak>Hello 世界</speak>'),
+                         xml.encode('utf-8'))
+
+
+class TestTtsMany(TestCase):
+    def test_results_are_in_order(self):
+        c = _Client()
+        items = ['text {}'.format(i) for i in range(50)]
+
+        results = c.tts_many(items)
+
+        self.assertEqual([r.audio for r in results],
+                         [item.encode() for item in items])
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([r.item for r in results], items)
+
+    def test_failures_are_reported_per_item(self):
+        c = _Client()
+
+        results = c.tts_many(['a', 'error', 1, {'ssml': '<speak/>'}])
+
+        self.assertEqual(results[0].audio, b'a')
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertIsNone(results[1].audio)
+        self.assertIsInstance(results[2].error, TypeError)
+        self.assertEqual(results[3].audio, b'<speak/>')
+        self.assertEqual([r.ok for r in results], [True, False, False, True])
+
+    def test_identical_items_are_deduplicated(self):
+        c = _Client()
+        items = ['a', 'b', 'a',
+                 {'text': 'c', 'voice_config': VoiceConfig()},
+                 {'text': 'c', 'voice_config': VoiceConfig()},
+                 {'text': 'c', 'voice_config': VoiceConfig(
+                     audio_format=AudioFormat.pcm)},
+                 {'text': 'd', 'detail': {'x': 1, 'y': 2}},
+                 {'detail': {'y': 2, 'x': 1}, 'text': 'd'}]
+
+        results = c.tts_many(items)
+
+        self.assertEqual(sorted(c.calls), ['a', 'b', 'c', 'c', 'd'])
+        self.assertEqual([r.audio for r in results],
+                         [b'a', b'b', b'a', b'c', b'c', b'c', b'd', b'd'])
+
+    def test_concurrency_is_bounded(self):
+        c = _Client(delay=0.01)
+
+        c.tts_many(('text {}'.format(i) for i in range(40)),
+                   max_concurrency=4)
+
+        self.assertLessEqual(c.max_in_flight, 4)
+        self.assertGreater(c.max_in_flight, 1)
+
+    def test_inflight_bytes_are_bounded(self):
+        c = _Client(delay=0.01)
+
+        c.tts_many(['{:04}'.format(i) for i in range(20)],
+                   max_concurrency=10, max_inflight_bytes=8)
+
+        self.assertEqual(c.max_in_flight, 2)
+
+    def test_generator_is_read_lazily(self):
+        c = _Client(delay=0.01)
+
+        def items():
+            for i in range(10):
+                # an item is read after all but max_concurrency of earlier
+                # items have been started
+                self.assertGreaterEqual(len(c.calls), i - 2)
+                yield str(i)
+
+        results = c.tts_many(items(), max_concurrency=2)
+
+        self.assertEqual(len(results), 10)
+
+    def test_batch_result(self):
+        self.assertTrue(BatchResult('a', audio=b'a').ok)
+        self.assertFalse(BatchResult('a', error=ValueError()).ok)
+
+
+class TestTtsInto(TestCase):
+    def test_file(self):
+        f = io.BytesIO()
+
+        self.assertEqual(_StreamClient().tts_into(f, 'Hello'), 5)
+        self.assertEqual(f.getvalue(), b'audio')
+
+    def test_bytearray(self):
+        buffer = bytearray(8)
+        self.assertEqual(_StreamClient().tts_into(buffer, 'Hello'), 5)
+        self.assertEqual(buffer, b'audio\0\0\0')
+
+        buffer = bytearray(2)
+        _StreamClient().tts_into(buffer, 'Hello')
+        self.assertEqual(buffer, b'audio')
+
+    def test_memoryview(self):
+        buffer = bytearray(5)
+        _StreamClient().tts_into(memoryview(buffer), 'Hello')
+        self.assertEqual(buffer, b'audio')
+
+        with self.assertRaises(ValueError):
+            _StreamClient().tts_into(memoryview(bytearray(4)), 'Hello')
+
+    def test_socket(self):
+        a, b = socket.socketpair()
+        with a, b:
+            self.assertEqual(_StreamClient().tts_into(a, 'Hello'), 5)
+            self.assertEqual(b.recv(16), b'audio')
+
+    def test_spool(self):
+        c = _StreamClient()
+
+        with c.tts_into(None, 'Hello') as f:
+            self.assertFalse(f._rolled)
+            self.assertEqual(f.read(), b'audio')
+
+        c.SPOOL_MAX_SIZE = 4
+        with c.tts_into(None, 'Hello') as f:
+            self.assertTrue(f._rolled)
+            self.assertEqual(f.read(), b'audio')
+
+    def test_invalid_sink(self):
+        self.assertRaises(TypeError,
+                          lambda: _StreamClient().tts_into('a.mp3', 'Hello'))
+
+    def test_ssml_in_text(self):
+        c = _StreamClient()
+        c.SSML_IN_TEXT = True
+
+        c.tts_into(io.BytesIO(), ssml='<speak>Hello</speak>')
+
+        self.assertEqual(c.calls, [('<speak>Hello</speak>', '')])
+
+
+class TestAsyncTtsInto(IsolatedAsyncioTestCase):
+    async def test_file(self):
+        f = io.BytesIO()
+
+        self.assertEqual(await _AsyncStreamClient().tts_into(f, 'Hello'), 5)
+        self.assertEqual(f.getvalue(), b'audio')
+
+    async def test_drain(self):
+        sink = mock.Mock()
+        sink.drain = mock.AsyncMock()
+        del sink.sendall
+
+        await _AsyncStreamClient().tts_into(sink, 'Hello')
+
+        self.assertEqual(sink.write.call_count, 2)
+        self.assertEqual(sink.drain.await_count, 2)
+
+    async def test_socket(self):
+        a, b = socket.socketpair()
+        with a, b:
+            a.setblocking(False)
+            self.assertEqual(
+                await _AsyncStreamClient().tts_into(a, 'Hello'), 5)
+            self.assertEqual(b.recv(16), b'audio')
+
+    async def test_spool(self):
+        with await _AsyncStreamClient().tts_into(None, 'Hello') as f:
+            self.assertEqual(f.read(), b'audio')
+
+
+class TestAsyncTtsMany(IsolatedAsyncioTestCase):
+    async def test_tts_many(self):
+        c = _AsyncClient()
+        items = ['text {}'.format(i) for i in range(20)] + ['text 0', 'error']
+
+        results = await c.tts_many(items, max_concurrency=4)
+
+        self.assertEqual([r.audio for r in results[:21]],
+                         [item.encode() for item in items[:21]])
+        self.assertIsInstance(results[21].error, ValueError)
+        self.assertEqual(len(c.calls), 20)
+        self.assertEqual(c.max_in_flight, 4)
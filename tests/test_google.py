@@ -1,7 +1,12 @@
+import os
+from unittest import IsolatedAsyncioTestCase
 from unittest import TestCase, skip
+from unittest import mock
 
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import texttospeech
 
+from cloudtts import AsyncGoogleClient
 from cloudtts import AudioFormat
 from cloudtts import CloudTTSError
 from cloudtts import GoogleClient
@@ -139,6 +144,86 @@ class TestGoogleClient(TestCase):
                               voice_config=True,
                           ))
 
+    def test_auth_does_not_change_environ(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.c.auth('/path/to/google/credential.json')
+            self.assertNotIn('GOOGLE_APPLICATION_CREDENTIALS', os.environ)
+
+    def test_tts_client_is_reused(self):
+        self.c.auth(AnonymousCredentials())
+        client = self.c._tts_client()
+
+        self.assertIs(self.c._tts_client(), client)
+
+        self.c.close()
+        self.assertIsNot(self.c._tts_client(), client)
+
+    def test_tts_client_per_instance(self):
+        c1 = GoogleClient(AnonymousCredentials())
+        c2 = GoogleClient(AnonymousCredentials())
+
+        self.assertIsNot(c1._tts_client(), c2._tts_client())
+
+    def test_channel_options(self):
+        c = GoogleClient(AnonymousCredentials(),
+                         channel_options={'grpc.keepalive_time_ms': 1000})
+
+        self.assertEqual(c.channel_options['grpc.keepalive_time_ms'], 1000)
+        self.assertEqual(c.channel_options['grpc.max_send_message_length'],
+                         -1)
+
+        with mock.patch('google.api_core.grpc_helpers.create_channel') as m:
+            c._tts_client()
+
+        options = dict(m.call_args[1]['options'])
+        self.assertEqual(options['grpc.keepalive_time_ms'], 1000)
+
+    def test_tts_stream(self):
+        self.c.auth(AnonymousCredentials())
+
+        with mock.patch.object(self.c, '_request', return_value=b'audio'):
+            self.assertEqual(list(self.c.tts_stream('Hello')), [b'audio'])
+
+
+class TestAsyncGoogleClient(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.c = AsyncGoogleClient(AnonymousCredentials())
+
+    async def asyncTearDown(self):
+        await self.c.close()
+
+    async def test_tts(self):
+        stub = mock.Mock()
+        stub.SynthesizeSpeech = mock.AsyncMock(
+            return_value=mock.Mock(audio_content=b'audio'))
+
+        with mock.patch.object(self.c, '_stub', return_value=stub):
+            self.assertEqual(await self.c.tts('Hello'), b'audio')
+            chunks = [chunk async for chunk in self.c.tts_stream('Hello')]
+
+        self.assertEqual(chunks, [b'audio'])
+        request = stub.SynthesizeSpeech.call_args[0][0]
+        self.assertEqual(request.input.text, 'Hello')
+        self.assertEqual(request.voice.language_code, 'en-US')
+
+    async def test_channel(self):
+        import grpc
+
+        self.c._stub()
+        channel = self.c._channel
+
+        self.assertIsInstance(channel, grpc.aio.Channel)
+        self.c._stub()
+        self.assertIs(self.c._channel, channel)
+
+        self.c.auth(AnonymousCredentials())
+        self.assertIsNone(self.c._channel)
+
+        with mock.patch.object(channel, 'close') as close:
+            await self.c.close()
+
+        close.assert_awaited_with()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,23 @@
+import json
+from unittest import IsolatedAsyncioTestCase
 from unittest import TestCase
+from unittest import mock
 
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from cloudtts import AsyncWatsonClient
 from cloudtts import AudioFormat
 from cloudtts import CloudTTSError
 from cloudtts import Gender
 from cloudtts import VoiceConfig
 from cloudtts import WatsonClient
 from cloudtts import WatsonCredential
+from cloudtts.ibm import Mark
+from cloudtts.ibm import WordTiming
+from cloudtts.ibm import _websocket_events
+from cloudtts.metrics import Metrics
+from tests.standins import ThreadedServer
 
 
 class TestWatsonClient(TestCase):
@@ -172,6 +184,217 @@ class TestWatsonClient(TestCase):
             self.assertFalse(self.c._is_valid_accept(d))
 
 
+class TestWatsonClientStream(TestCase):
+    def setUp(self):
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url='https://example.com')
+        self.c = WatsonClient(cred)
+
+        patcher = mock.patch.object(self.c.session, 'post')
+        self.post = patcher.start()
+        self.post.return_value.status_code = 200
+        self.post.return_value.iter_content.return_value = iter([b'a', b'b'])
+        self.addCleanup(patcher.stop)
+
+    def test_tts_stream(self):
+        chunks = list(self.c.tts_stream('Hello world'))
+
+        self.assertEqual(chunks, [b'a', b'b'])
+        self.assertTrue(self.post.call_args[1]['stream'])
+        self.post.return_value.close.assert_called_with()
+
+    def test_tts_stream_validates_eagerly(self):
+        self.assertRaises(ValueError, lambda: self.c.tts_stream(''))
+
+    def test_tts_stream_error(self):
+        self.post.return_value.status_code = 500
+        self.post.return_value.raise_for_status.side_effect = ValueError
+
+        self.assertRaises(ValueError,
+                          lambda: list(self.c.tts_stream('Hello world')))
+        self.post.return_value.close.assert_called_with()
+
+
+class TestAsyncWatsonClient(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.audio = b'a' * (WatsonClient.STREAM_CHUNK_SIZE * 3)
+        self.received = []
+
+        async def synthesize(request):
+            self.received.append(request)
+            return web.Response(body=self.audio)
+
+        app = web.Application()
+        app.router.add_post('/v1/synthesize', synthesize)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url=str(self.server.make_url('')).rstrip('/'))
+        self.c = AsyncWatsonClient(cred)
+
+    async def asyncTearDown(self):
+        await self.c.close()
+        await self.server.close()
+
+    async def test_tts(self):
+        audio = await self.c.tts('Hello world')
+
+        self.assertEqual(audio, self.audio)
+        request = self.received[0]
+        self.assertEqual(request.query['voice'], 'en-US_AllisonVoice')
+        self.assertEqual(request.headers['Accept'], 'audio/mp3')
+        self.assertEqual(request.headers['Authorization'],
+                         'Basic eHh4eDp5eXl5')
+
+    async def test_tts_stream(self):
+        chunks = [chunk async for chunk in self.c.tts_stream('Hello world')]
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), self.audio)
+
+    async def test_tts_validates_eagerly(self):
+        self.assertRaises(ValueError, lambda: self.c.tts(''))
+
+
+def _websocket_app(audio, received):
+    # a stand-in of the WebSocket interface of synthesize
+    async def synthesize(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        message = json.loads(await ws.receive_str())
+        received.append((request, message))
+
+        if message['text'] == 'error':
+            await ws.send_str(json.dumps({'error': 'Invalid text',
+                                          'code': 400}))
+            await ws.close()
+            return ws
+
+        await ws.send_str(json.dumps(
+            {'binary_streams': [{'content_type': message['accept']}]}))
+        for i in range(0, len(audio), 4):
+            await ws.send_bytes(audio[i:i + 4])
+        if 'words' in message.get('timings', ()):
+            await ws.send_str(json.dumps(
+                {'words': [['Hello', 0.0, 0.3], ['world', 0.3, 0.7]]}))
+        await ws.close()
+
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/v1/synthesize', synthesize)
+
+    return app
+
+
+class TestWatsonClientWebSocket(TestCase):
+    def setUp(self):
+        self.audio = b'0123456789'
+        self.received = []
+
+        server = ThreadedServer(_websocket_app(self.audio, self.received))
+        url = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+
+        cred = WatsonCredential(username='xxxx', password='yyyy', url=url)
+        self.metrics = Metrics()
+        self.c = WatsonClient(cred, websocket=True, metrics=self.metrics)
+
+    def test_tts(self):
+        self.assertEqual(self.c.tts('Hello world'), self.audio)
+
+        request, message = self.received[0]
+        self.assertEqual(request.query['voice'], 'en-US_AllisonVoice')
+        self.assertEqual(request.headers['Authorization'],
+                         'Basic eHh4eDp5eXl5')
+        self.assertEqual(message, {'text': 'Hello world',
+                                   'accept': 'audio/mp3'})
+
+    def test_tts_stream(self):
+        detail = {'voice': 'ja-JP_EmiVoice', 'accept': 'audio/ogg',
+                  'customization_id': 'custom'}
+        chunks = list(self.c.tts_stream('Hello world', detail=detail))
+
+        self.assertEqual(chunks, [b'0123', b'4567', b'89'])
+        request, message = self.received[0]
+        self.assertEqual(request.query['customization_id'], 'custom')
+        self.assertEqual(message['accept'], 'audio/ogg')
+
+    def test_tts_events(self):
+        events = list(self.c.tts_events('Hello world'))
+
+        self.assertEqual(b''.join(data for kind, data in events
+                                  if kind == 'audio'), self.audio)
+        self.assertEqual(events[-1], ('words', (
+            WordTiming('Hello', 0.0, 0.3), WordTiming('world', 0.3, 0.7))))
+        self.assertEqual(self.received[0][1]['timings'], ['words'])
+
+        s = self.metrics.snapshot()[('watson', 'en-US_AllisonVoice')]
+        self.assertEqual(s['bytes'], 10)
+        self.assertEqual(s['first_byte']['count'], 1)
+
+    def test_error(self):
+        with self.assertRaises(CloudTTSError):
+            self.c.tts('error')
+
+
+class TestAsyncWatsonClientWebSocket(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.audio = b'0123456789'
+        self.received = []
+
+        self.server = TestServer(_websocket_app(self.audio, self.received))
+        await self.server.start_server()
+
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url=str(self.server.make_url('')).rstrip('/'))
+        self.c = AsyncWatsonClient(cred, websocket=True)
+
+    async def asyncTearDown(self):
+        await self.c.close()
+        await self.server.close()
+
+    async def test_tts(self):
+        self.assertEqual(await self.c.tts('Hello world'), self.audio)
+        self.assertEqual(self.received[0][0].headers['Authorization'],
+                         'Basic eHh4eDp5eXl5')
+
+    async def test_tts_stream(self):
+        chunks = [chunk async for chunk in self.c.tts_stream('Hello world')]
+
+        self.assertEqual(chunks, [b'0123', b'4567', b'89'])
+
+    async def test_tts_events(self):
+        events = [e async for e in self.c.tts_events('Hello world',
+                                                     timings=())]
+
+        self.assertEqual([kind for kind, data in events], ['audio'] * 3)
+        self.assertNotIn('timings', self.received[0][1])
+
+    async def test_error(self):
+        with self.assertRaises(CloudTTSError):
+            await self.c.tts('error')
+
+
+class TestWebSocketEvents(TestCase):
+    def test_events(self):
+        self.assertEqual(_websocket_events('{"warnings": "Unknown"}'), [])
+        self.assertEqual(
+            _websocket_events('{"marks": [["here", 0.5]]}'),
+            [('marks', (Mark('here', 0.5),))])
+
+    def test_url(self):
+        cred = WatsonCredential('xxxx', 'yyyy', 'https://example.com/api')
+        c = WatsonClient(cred, websocket=True)
+        plan = c._make_params(None, None)
+
+        self.assertEqual(
+            c._websocket_url(plan),
+            'wss://example.com/api/v1/synthesize?voice=en-US_AllisonVoice')
+
+
 class TestWatsonCredential(TestCase):
     pass
 
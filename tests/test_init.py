@@ -0,0 +1,47 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+import cloudtts
+
+
+class TestLazyImport(TestCase):
+    def _modules_after(self, code):
+        code += '; import sys; print(" ".join(sorted(sys.modules)))'
+        out = subprocess.check_output([sys.executable, '-c', code])
+
+        return out.decode().split()
+
+    def test_import_does_not_load_sdks(self):
+        modules = self._modules_after('import cloudtts')
+
+        for name in ('boto3', 'grpc', 'google.cloud.texttospeech',
+                     'requests', 'cloudtts.aws', 'cloudtts.google',
+                     'concurrent.futures'):
+            self.assertNotIn(name, modules)
+
+    def test_google_module_does_not_load_grpc(self):
+        modules = self._modules_after('from cloudtts import GoogleClient')
+
+        self.assertIn('cloudtts.google', modules)
+        self.assertNotIn('grpc', modules)
+
+    def test_provider_modules_do_not_load_async_libraries(self):
+        modules = self._modules_after(
+            'import cloudtts.aws, cloudtts.ibm, cloudtts.microsoft')
+
+        for name in ('aiobotocore', 'aiohttp', 'grpc'):
+            self.assertNotIn(name, modules)
+
+    def test_cache_module_does_not_load_sqlite(self):
+        modules = self._modules_after('import cloudtts.cache')
+
+        for name in ('sqlite3', 'mmap'):
+            self.assertNotIn(name, modules)
+
+    def test_lazy_attributes(self):
+        from cloudtts.aws import PollyClient
+
+        self.assertIs(cloudtts.PollyClient, PollyClient)
+        self.assertIn('AzureClient', dir(cloudtts))
+        self.assertRaises(AttributeError, lambda: cloudtts.NoSuchClient)
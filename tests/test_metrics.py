@@ -0,0 +1,260 @@
+import threading
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+import requests
+
+import cloudtts
+from cloudtts import AsyncWatsonClient
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.cache import MemoryCache
+from cloudtts.metrics import NULL_MEASUREMENT
+from cloudtts.metrics import Histogram
+from cloudtts.metrics import Metrics
+from cloudtts.metrics import default_metrics
+from cloudtts.metrics import prometheus_text
+from cloudtts.retry import RetryPolicy
+
+
+VOICE = ('watson', 'en-US_AllisonVoice')
+
+
+def _response(status, content=b'audio'):
+    r = mock.Mock()
+    r.status_code = status
+    r.content = content
+    if status != 200:
+        response = requests.Response()
+        response.status_code = status
+        r.raise_for_status.side_effect = requests.HTTPError(response=response)
+
+    return r
+
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        h = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            h.observe(value)
+
+        self.assertEqual(h.counts, [2, 1, 1])
+        self.assertEqual(h.count, 4)
+        self.assertAlmostEqual(h.sum, 2.65)
+
+    def test_quantile(self):
+        h = Histogram((0.1, 1.0))
+        self.assertIsNone(h.quantile(0.5))
+
+        for _ in range(10):
+            h.observe(0.5)
+
+        self.assertAlmostEqual(h.quantile(0.5), 0.55)
+        self.assertLessEqual(h.quantile(0.99), 1.0)
+
+        h.observe(5.0)
+        self.assertEqual(h.quantile(1), 1.0)
+
+    def test_snapshot(self):
+        h = Histogram((0.1, 1.0))
+        h.observe(0.05)
+        h.observe(2.0)
+
+        s = h.snapshot()
+
+        self.assertEqual(s['count'], 2)
+        self.assertEqual(s['buckets'],
+                         ((0.1, 1), (1.0, 1), (float('inf'), 2)))
+        self.assertIn('p99', s)
+
+
+class TestMetrics(TestCase):
+    def test_measure(self):
+        m = Metrics()
+
+        with m.measure('watson', 'v', 11) as measurement:
+            measurement.size = 5
+        with self.assertRaises(ValueError):
+            with m.measure('watson', 'v', 3):
+                raise ValueError
+        m.cache_hit('watson', 'v')
+
+        s = m.snapshot()[('watson', 'v')]
+        self.assertEqual(s['requests'], 2)
+        self.assertEqual(s['characters'], 14)
+        self.assertEqual(s['bytes'], 5)
+        self.assertEqual(s['cache_hits'], 1)
+        self.assertEqual(s['errors'], {'ValueError': 1})
+        self.assertEqual(s['latency']['count'], 1)
+
+    def test_threads(self):
+        m = Metrics()
+        barrier = threading.Barrier(8)
+
+        def record():
+            barrier.wait()
+            for _ in range(1000):
+                m.measure('polly', 'Joanna', 2).finish(1)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        s = m.snapshot()[('polly', 'Joanna')]
+        self.assertEqual(s['requests'], 8000)
+        self.assertEqual(s['characters'], 16000)
+        self.assertEqual(s['latency']['count'], 8000)
+
+        # shards of finished threads are merged once
+        self.assertEqual(m._shards, [])
+        self.assertEqual(m.snapshot()[('polly', 'Joanna')]['requests'], 8000)
+
+    def test_threads_without_snapshot(self):
+        m = Metrics()
+
+        def record():
+            m.cache_hit('polly', 'Joanna')
+
+        for _ in range(100):
+            t = threading.Thread(target=record)
+            t.start()
+            t.join()
+
+        # shards of finished threads are merged as new threads record
+        self.assertEqual(len(m._shards), 1)
+        self.assertEqual(m.snapshot()[('polly', 'Joanna')]['cache_hits'], 100)
+
+    def test_reset(self):
+        m = Metrics()
+        m.cache_hit('polly', 'Joanna')
+        m.reset()
+
+        self.assertEqual(m.snapshot(), {})
+
+        m.cache_hit('polly', 'Joanna')
+        self.assertEqual(m.snapshot()[('polly', 'Joanna')]['cache_hits'], 1)
+
+    def test_prometheus_text(self):
+        m = Metrics(buckets=(0.5, 1.0))
+        m.measure('watson', 'a"b', 4).finish(10)
+        m.measure('watson', 'a"b', 4).fail(KeyError())
+
+        text = prometheus_text(m)
+
+        self.assertIn('# TYPE cloudtts_requests_total counter\n', text)
+        self.assertIn('cloudtts_requests_total{provider="watson",'
+                      'voice="a\\"b"} 2\n', text)
+        self.assertIn('cloudtts_errors_total{provider="watson",'
+                      'voice="a\\"b",type="KeyError"} 1\n', text)
+        self.assertIn('cloudtts_request_seconds_bucket{provider="watson",'
+                      'voice="a\\"b",le="+Inf"} 1\n', text)
+        self.assertIn('cloudtts_request_seconds_count{provider="watson",'
+                      'voice="a\\"b"} 1\n', text)
+        self.assertIn('# TYPE cloudtts_first_byte_seconds histogram\n', text)
+
+    def test_exported(self):
+        self.assertEqual(cloudtts.snapshot(), default_metrics().snapshot())
+        self.assertIsInstance(cloudtts.prometheus_text(), str)
+
+
+class TestClientMetrics(TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def _watson(self, responses, **kwargs):
+        cred = WatsonCredential('xxxx', 'yyyy', 'https://example.com')
+        c = WatsonClient(cred, metrics=self.metrics, **kwargs)
+
+        patcher = mock.patch.object(c.session, 'post', side_effect=responses)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return c
+
+    def test_default(self):
+        c = WatsonClient()
+
+        self.assertIs(c._metrics(), default_metrics())
+
+    def test_disabled(self):
+        c = WatsonClient(metrics=False)
+
+        self.assertIs(c._measure({}, 'Hello', ''), NULL_MEASUREMENT)
+
+    def test_tts(self):
+        c = self._watson([_response(200)])
+
+        c.tts('Hello world')
+
+        s = self.metrics.snapshot()[VOICE]
+        self.assertEqual(s['requests'], 1)
+        self.assertEqual(s['characters'], 11)
+        self.assertEqual(s['bytes'], 5)
+        self.assertEqual(s['latency']['count'], 1)
+        self.assertEqual(s['first_byte']['count'], 0)
+
+    def test_retry(self):
+        c = self._watson([_response(503), _response(200)],
+                         retry=RetryPolicy(base_delay=0))
+
+        c.tts('Hello world')
+
+        s = self.metrics.snapshot()[VOICE]
+        self.assertEqual(s['requests'], 2)
+        self.assertEqual(s['errors'], {'HTTPError': 1})
+        self.assertEqual(s['latency']['count'], 1)
+
+    def test_cache_hit(self):
+        c = self._watson([_response(200)], cache=MemoryCache())
+
+        c.tts('Hello world')
+        c.tts('Hello world')
+
+        s = self.metrics.snapshot()[VOICE]
+        self.assertEqual(s['requests'], 1)
+        self.assertEqual(s['cache_hits'], 1)
+
+    def test_stream(self):
+        c = self._watson([])
+
+        def stream(params, text, ssml):
+            yield b'aud'
+            yield b'io'
+
+        with mock.patch.object(c, '_request_stream', side_effect=stream):
+            self.assertEqual(b''.join(c.tts_stream('Hello world')), b'audio')
+
+        s = self.metrics.snapshot()[VOICE]
+        self.assertEqual(s['requests'], 1)
+        self.assertEqual(s['bytes'], 5)
+        self.assertEqual(s['first_byte']['count'], 1)
+        self.assertEqual(s['latency']['count'], 1)
+
+
+class TestAsyncClientMetrics(IsolatedAsyncioTestCase):
+    async def test_tts(self):
+        metrics = Metrics()
+        cred = WatsonCredential('xxxx', 'yyyy', 'https://example.com')
+        c = AsyncWatsonClient(cred, metrics=metrics)
+
+        async def request(params, text, ssml):
+            return b'audio'
+
+        with mock.patch.object(c, '_request', side_effect=request):
+            await c.tts('Hello world')
+
+        async def stream(params, text, ssml):
+            yield b'audio'
+
+        with mock.patch.object(c, '_request_stream', side_effect=stream):
+            async for chunk in c.tts_stream('Hello'):
+                pass
+
+        s = metrics.snapshot()[VOICE]
+        self.assertEqual(s['requests'], 2)
+        self.assertEqual(s['characters'], 16)
+        self.assertEqual(s['bytes'], 10)
+        self.assertEqual(s['first_byte']['count'], 1)
@@ -1,5 +1,17 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from unittest import IsolatedAsyncioTestCase
 from unittest import TestCase
+from unittest import mock
 
+from aiohttp import ClientResponseError
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from cloudtts import AsyncAzureClient
 from cloudtts import AudioFormat
 from cloudtts import AzureClient
 from cloudtts import AzureCredential
@@ -7,6 +19,8 @@ from cloudtts import CloudTTSError
 from cloudtts import Gender
 from cloudtts import Language
 from cloudtts import VoiceConfig
+from cloudtts.microsoft import AzureTokenManager
+from cloudtts.session import SessionConfig
 
 
 class TestAzureClient(TestCase):
@@ -44,6 +58,13 @@ class TestAzureClient(TestCase):
         for k in detail:
             self.assertEqual(detail[k], params[k])
 
+    def test_make_params_with_detail_without_language(self):
+        detail = {'format': 'ssml-16khz-16bit-mono-tts',
+                  'voice': 'Ichiro, Apollo'}
+
+        self.assertRaises(ValueError,
+                          lambda: self.c._make_params(None, detail))
+
     def test_make_params_with_voice_config_and_detail(self):
         vc = VoiceConfig(audio_format=AudioFormat.mp3,
                          gender=Gender.female,
@@ -99,9 +120,258 @@ class TestAzureClient(TestCase):
             self.assertTrue(self.c._is_valid_voice({'voice': voice}))
 
 
+class TestAzureClientStream(TestCase):
+    def setUp(self):
+        self.c = AzureClient(AzureCredential('xxxx'))
+
+        patcher = mock.patch.object(self.c, '_token', return_value='token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(self.c.session, 'post')
+        self.post = patcher.start()
+        self.post.return_value.status_code = 200
+        self.post.return_value.iter_content.return_value = iter([b'a', b'b'])
+        self.addCleanup(patcher.stop)
+
+    def test_tts_stream(self):
+        chunks = list(self.c.tts_stream('Hello world'))
+
+        self.assertEqual(chunks, [b'a', b'b'])
+        self.assertTrue(self.post.call_args[1]['stream'])
+        self.post.return_value.iter_content.assert_called_with(
+            AzureClient.STREAM_CHUNK_SIZE)
+        self.post.return_value.close.assert_called_with()
+
+    def test_tts_stream_validates_eagerly(self):
+        self.assertRaises(ValueError, lambda: self.c.tts_stream(''))
+
+    def test_tts_stream_error(self):
+        self.post.return_value.status_code = 500
+        self.post.return_value.raise_for_status.side_effect = ValueError
+
+        self.assertRaises(ValueError,
+                          lambda: list(self.c.tts_stream('Hello world')))
+        self.post.return_value.close.assert_called_with()
+
+
+class TestAsyncAzureClient(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.audio = b'a' * (AzureClient.STREAM_CHUNK_SIZE * 3)
+        self.status = 200
+        self.received = []
+
+        async def synthesize(request):
+            self.received.append((request.headers, await request.text()))
+            return web.Response(status=self.status, body=self.audio)
+
+        app = web.Application()
+        app.router.add_post('/synthesize', synthesize)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        patcher = mock.patch.object(AzureClient, 'TTSEndpoint',
+                                    str(self.server.make_url('/synthesize')))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.manager = mock.Mock()
+        self.manager.has_token.return_value = True
+        self.manager.token.return_value = 'token'
+        patcher = mock.patch.object(AzureTokenManager, 'for_credential',
+                                    return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.c = AsyncAzureClient(AzureCredential('xxxx'))
+
+    async def asyncTearDown(self):
+        await self.c.close()
+        await self.server.close()
+
+    async def test_tts(self):
+        audio = await self.c.tts('Hello world')
+
+        self.assertEqual(audio, self.audio)
+        headers, body = self.received[0]
+        self.assertEqual(headers['Authorization'], 'Bearer: token')
+        self.assertIn('Hello world', body)
+
+    async def test_tts_stream(self):
+        chunks = [chunk async for chunk in self.c.tts_stream('Hello world')]
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), self.audio)
+
+    async def test_tts_concurrently(self):
+        tasks = [self.c.tts('Hello world {}'.format(i)) for i in range(200)]
+        audios = await asyncio.gather(*tasks)
+
+        self.assertEqual(audios, [self.audio] * 200)
+
+    async def test_tts_fetches_token_in_thread(self):
+        self.manager.has_token.return_value = False
+
+        await self.c.tts('Hello world')
+
+        self.manager.token.assert_called_with()
+
+    async def test_tts_unauthorized(self):
+        self.status = 401
+
+        with self.assertRaises(ClientResponseError):
+            await self.c.tts('Hello world')
+
+        self.manager.invalidate.assert_called_with()
+
+    async def test_tts_validates_eagerly(self):
+        self.assertRaises(ValueError, lambda: self.c.tts(''))
+
+    async def test_tts_chunked(self):
+        self.audio = b''
+        text = 'Hello world. ' * 200
+
+        await self.c.tts_chunked(text, max_workers=2)
+
+        self.assertGreater(len(self.received), 1)
+        for _, body in self.received:
+            self.assertLessEqual(len(body), AzureClient.MAX_TEXT_LENGTH)
+
+    async def test_context_manager(self):
+        async with AsyncAzureClient(AzureCredential('xxxx')) as c:
+            self.assertEqual(await c.tts('Hello world'), self.audio)
+
+        with self.assertRaises(TypeError):
+            with AsyncAzureClient(AzureCredential('xxxx')):
+                pass
+
+
 class TestAzureCredential(TestCase):
     pass
 
 
+class TestAzureTokenManager(TestCase):
+    def setUp(self):
+        AzureTokenManager._managers.clear()
+
+        patcher = mock.patch('cloudtts.session.PooledSession.post')
+        self.post = patcher.start()
+        self.post.return_value.status_code = 200
+        self.post.return_value.text = 'token-1'
+        self.addCleanup(patcher.stop)
+
+    def test_for_credential(self):
+        m1 = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        m2 = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        m3 = AzureTokenManager.for_credential(AzureCredential('yyyy'))
+
+        self.assertIs(m1, m2)
+        self.assertIsNot(m1, m3)
+
+    def test_token_is_cached(self):
+        m = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+
+        self.assertEqual(m.token(), 'token-1')
+        self.assertEqual(m.token(), 'token-1')
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_token_is_refreshed_before_expiry(self):
+        m = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        m.token()
+
+        # the token is still valid, but within REFRESH_MARGIN
+        m._expires_at = time.time() + AzureTokenManager.REFRESH_MARGIN / 2
+        self.post.return_value.text = 'token-2'
+
+        self.assertEqual(m.token(), 'token-1')
+        for _ in range(100):
+            if m.token() == 'token-2':
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(m.token(), 'token-2')
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_expired_token(self):
+        m = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        m.token()
+
+        m._expires_at = time.time() - 1
+        self.post.return_value.text = 'token-2'
+
+        self.assertEqual(m.token(), 'token-2')
+
+    def test_invalidate(self):
+        m = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        m.token()
+        m.invalidate()
+        m.token()
+
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_timeout(self):
+        m = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        m.token()
+
+        self.assertEqual(self.post.call_args[1]['timeout'],
+                         AzureTokenManager.TOKEN_TIMEOUT)
+
+    def test_timeout_of_session_config(self):
+        c = AzureClient(AzureCredential('xxxx'),
+                        session_config=SessionConfig(timeout=(3, 5)))
+        c._token()
+
+        self.assertEqual(self.post.call_args[1]['timeout'], (3, 5))
+
+    def test_error_response_is_not_cached(self):
+        self.post.return_value.status_code = 401
+        self.post.return_value.raise_for_status.side_effect = ValueError
+
+        m = AzureTokenManager.for_credential(AzureCredential('xxxx'))
+        self.assertRaises(ValueError, m.token)
+        self.assertIsNone(m._token)
+
+    def test_token_cache_path(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'token.json')
+
+            m = AzureTokenManager(AzureCredential('xxxx', path))
+            self.assertEqual(m.token(), 'token-1')
+            self.assertTrue(os.path.exists(path))
+
+            # another process reads the token from the file
+            m = AzureTokenManager(AzureCredential('xxxx', path))
+            self.assertEqual(m.token(), 'token-1')
+            self.assertEqual(self.post.call_count, 1)
+
+            # the file is not shared with other keys
+            m = AzureTokenManager(AzureCredential('yyyy', path))
+            m.token()
+            self.assertEqual(self.post.call_count, 2)
+
+    def test_token_cache_path_is_locked(self):
+        def post(*args, **kwargs):
+            time.sleep(0.05)
+            return self.post.return_value
+
+        self.post.side_effect = post
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'token.json')
+
+            # managers of processes which start at once
+            managers = [AzureTokenManager(AzureCredential('xxxx', path))
+                        for _ in range(4)]
+            threads = [threading.Thread(target=m.token) for m in managers]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            self.assertEqual([m._token for m in managers], ['token-1'] * 4)
+            self.assertEqual(self.post.call_count, 1)
+            self.assertTrue(os.path.exists(path + '.lock'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,164 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import AzureClient
+from cloudtts import AzureCredential
+from cloudtts import PollyClient
+from cloudtts import PollyCredential
+from cloudtts.cache import MemoryCache
+from cloudtts.ratelimit import RateLimit
+from cloudtts.ratelimit import RateLimiter
+from cloudtts.ratelimit import TokenBucket
+
+
+class TestTokenBucket(TestCase):
+    def setUp(self):
+        patcher = mock.patch('cloudtts.ratelimit.time.monotonic',
+                             return_value=100.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bucket = TokenBucket(rate=2, capacity=4)
+
+    def test_burst(self):
+        for _ in range(4):
+            self.assertEqual(self.bucket.reserve(), 0)
+
+        self.assertEqual(self.bucket.reserve(), 0.5)
+        self.assertEqual(self.bucket.reserve(), 1.0)
+
+    def test_refill(self):
+        self.assertEqual(self.bucket.reserve(4), 0)
+
+        self.monotonic.return_value = 101.0
+        self.assertEqual(self.bucket.reserve(2), 0)
+        self.assertEqual(self.bucket.reserve(1), 0.5)
+
+    def test_refill_up_to_capacity(self):
+        self.monotonic.return_value = 1000.0
+
+        self.assertEqual(self.bucket.reserve(4), 0)
+        self.assertEqual(self.bucket.reserve(1), 0.5)
+
+    def test_large_request_is_capped(self):
+        self.assertEqual(self.bucket.reserve(100), 0)
+        self.assertEqual(self.bucket.reserve(1), 0.5)
+
+
+class TestRateLimiter(TestCase):
+    def test_shared(self):
+        limit = RateLimit(requests=10)
+
+        a = RateLimiter.shared(('test', 'a'), limit)
+
+        self.assertIs(RateLimiter.shared(('test', 'a'), RateLimit(10)), a)
+        self.assertIsNot(RateLimiter.shared(('test', 'b'), limit), a)
+        self.assertIsNot(RateLimiter.shared(('test', 'a'), RateLimit(20)), a)
+
+    def test_acquire(self):
+        limiter = RateLimiter(RateLimit(requests=1, characters=10))
+
+        with mock.patch('cloudtts.ratelimit.time.sleep') as sleep:
+            limiter.acquire(characters=5)
+            sleep.assert_not_called()
+
+            limiter.acquire(characters=5)
+            self.assertAlmostEqual(sleep.call_args[0][0], 1, places=2)
+
+    def test_characters(self):
+        limiter = RateLimiter(RateLimit(characters=10, period=10))
+
+        with mock.patch('cloudtts.ratelimit.time.sleep') as sleep:
+            limiter.acquire(characters=10)
+            sleep.assert_not_called()
+
+            limiter.acquire(characters=3)
+            self.assertAlmostEqual(sleep.call_args[0][0], 3, places=2)
+
+    def test_without_limits(self):
+        limiter = RateLimiter(RateLimit())
+
+        with mock.patch('cloudtts.ratelimit.time.sleep') as sleep:
+            for _ in range(100):
+                limiter.acquire(characters=100)
+
+        sleep.assert_not_called()
+
+
+class TestAsyncRateLimiter(IsolatedAsyncioTestCase):
+    async def test_acquire_async(self):
+        limiter = RateLimiter(RateLimit(requests=1))
+
+        with mock.patch('asyncio.sleep') as sleep:
+            await limiter.acquire_async()
+            sleep.assert_not_called()
+
+            await limiter.acquire_async()
+            self.assertAlmostEqual(sleep.call_args[0][0], 1, places=2)
+
+
+class TestClientRateLimit(TestCase):
+    def setUp(self):
+        patcher = mock.patch('cloudtts.ratelimit.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self, **kwargs):
+        # limiters are shared by credentials, so every test has its own key
+        c = AzureClient(AzureCredential(self.id()), **kwargs)
+
+        patcher = mock.patch.object(c, '_token', return_value='token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(c.session, 'post')
+        post = patcher.start()
+        post.return_value.status_code = 200
+        post.return_value.content = b'audio'
+        self.addCleanup(patcher.stop)
+
+        return c
+
+    def test_without_rate_limit(self):
+        c = self._client()
+
+        for _ in range(10):
+            c.tts('Hello world')
+
+        self.sleep.assert_not_called()
+
+    def test_rate_limit(self):
+        c = self._client(rate_limit=RateLimit(requests=2))
+
+        for _ in range(3):
+            c.tts('Hello world')
+
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_rate_limit_is_shared_by_credential(self):
+        limit = RateLimit(requests=1, period=60)
+        a = self._client(rate_limit=limit)
+        b = self._client(rate_limit=limit)
+
+        a.tts('Hello world')
+        b.tts('Hello world')
+
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_cache_hits_are_not_limited(self):
+        c = self._client(rate_limit=RateLimit(requests=1, period=60),
+                         cache=MemoryCache())
+
+        for _ in range(3):
+            c.tts('Hello world')
+
+        self.sleep.assert_not_called()
+
+    def test_default_rate_limit(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'), rate_limit=True)
+
+        limiter = c._rate_limiter()
+
+        self.assertIs(limiter.rate_limit, PollyClient.RATE_LIMIT)
+        self.assertIsNone(self._client(rate_limit=True)._rate_limiter())
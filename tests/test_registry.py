@@ -0,0 +1,95 @@
+from itertools import product
+import subprocess
+import sys
+from unittest import TestCase
+
+from cloudtts import AudioFormat
+from cloudtts import Gender
+from cloudtts import GoogleClient
+from cloudtts import Language
+from cloudtts import VoiceConfig
+from cloudtts.registry import Capability
+from cloudtts.registry import PROVIDERS
+from cloudtts.registry import Registry
+from cloudtts.registry import client_class
+from cloudtts.registry import default_registry
+
+
+class TestRegistry(TestCase):
+    def setUp(self):
+        self.r = Registry([
+            Capability('a', Language.en_US, Gender.female, AudioFormat.mp3,
+                       16000, 'Alice'),
+            Capability('a', Language.en_US, Gender.male, AudioFormat.mp3,
+                       16000, 'Bob'),
+            Capability('b', Language.en_US, Gender.female, AudioFormat.mp3,
+                       None, None),
+            Capability('b', Language.ja_JP, Gender.female, AudioFormat.pcm,
+                       None, None),
+        ])
+
+    def test_find(self):
+        self.assertEqual(len(self.r.find()), 4)
+        self.assertEqual(len(self.r.find(language=Language.en_US)), 3)
+        self.assertEqual(
+            self.r.find(gender=Gender.male, audio_format=AudioFormat.mp3),
+            (self.r.capabilities[1],))
+        self.assertEqual(self.r.find(language=Language.ko_KR), ())
+
+    def test_providers(self):
+        self.assertEqual(self.r.providers(language=Language.en_US),
+                         ('a', 'b'))
+        self.assertEqual(self.r.providers(audio_format=AudioFormat.pcm),
+                         ('b',))
+
+        # None matches any sample rate, but no rate matches None
+        self.assertEqual(self.r.providers(sample_rate=16000), ('a',))
+
+    def test_voices(self):
+        self.assertEqual(self.r.voices('a'), ('Alice', 'Bob'))
+        self.assertEqual(self.r.voices('b'), ())
+
+    def test_supports(self):
+        self.assertTrue(self.r.supports('b', VoiceConfig(
+            audio_format=AudioFormat.pcm, language=Language.ja_JP)))
+        self.assertFalse(self.r.supports('a', VoiceConfig(
+            audio_format=AudioFormat.pcm, language=Language.ja_JP)))
+
+
+class TestDefaultRegistry(TestCase):
+    def test_query(self):
+        r = default_registry()
+
+        self.assertIs(default_registry(), r)
+        self.assertEqual(r.providers(language=Language.ja_JP,
+                                     gender=Gender.male,
+                                     audio_format=AudioFormat.ogg_opus),
+                         ('google',))
+        self.assertEqual(r.providers(sample_rate=8000), ('polly',))
+        self.assertEqual(r.voices('polly', Language.ja_JP),
+                         ('Mizuki', 'Takumi'))
+
+    def test_agrees_with_clients(self):
+        r = default_registry()
+
+        for provider in PROVIDERS:
+            c = client_class(provider)()
+            for af, gender, language in product(AudioFormat, Gender,
+                                                Language):
+                vc = VoiceConfig(audio_format=af, gender=gender,
+                                 language=language)
+                self.assertEqual(r.supports(provider, vc), c.supports(vc),
+                                 (provider, vc))
+
+    def test_google_audio_formats(self):
+        self.assertEqual(set(GoogleClient.AUDIO_FORMATS),
+                         set(GoogleClient.AUDIO_FORMAT_DICT))
+
+    def test_does_not_load_sdks(self):
+        code = ('from cloudtts.registry import default_registry; '
+                'default_registry(); '
+                'import sys; print(" ".join(sorted(sys.modules)))')
+        modules = subprocess.check_output([sys.executable, '-c', code])
+
+        for name in ('boto3', 'grpc', 'google.cloud.texttospeech'):
+            self.assertNotIn(name, modules.decode().split())
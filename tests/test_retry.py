@@ -0,0 +1,256 @@
+from email.utils import formatdate
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from botocore.exceptions import ClientError
+from google.api_core import exceptions as google_exceptions
+import requests
+
+from cloudtts import AsyncWatsonClient
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.cache import MemoryCache
+from cloudtts.cache import cache_key
+from cloudtts.retry import RetryPolicy
+from cloudtts.retry import error_status
+from cloudtts.retry import parse_retry_after
+
+
+def _http_error(status, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+
+    return requests.HTTPError(response=r)
+
+
+def _response(status, content=b'audio', headers=None):
+    r = mock.Mock()
+    r.status_code = status
+    r.content = content
+    r.iter_content.return_value = iter([content])
+    r.raise_for_status.side_effect = _http_error(status, headers)
+
+    return r
+
+
+class TestParseRetryAfter(TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('3'), 3)
+        self.assertEqual(parse_retry_after('-1'), 0)
+
+    def test_date(self):
+        delay = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+
+        self.assertAlmostEqual(delay, 30, delta=2)
+
+    def test_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestErrorStatus(TestCase):
+    def test_requests(self):
+        e = _http_error(503, {'Retry-After': '2'})
+
+        self.assertEqual(error_status(e), (503, 2))
+
+    def test_botocore(self):
+        e = ClientError({'Error': {'Code': 'ThrottlingException'},
+                         'ResponseMetadata': {'HTTPStatusCode': 400}},
+                        'SynthesizeSpeech')
+        self.assertEqual(error_status(e), (429, None))
+
+        e = ClientError({'Error': {'Code': 'ServiceFailureException'},
+                         'ResponseMetadata': {
+                             'HTTPStatusCode': 500,
+                             'HTTPHeaders': {'retry-after': '1'}}},
+                        'SynthesizeSpeech')
+        self.assertEqual(error_status(e), (500, 1))
+
+    def test_aiohttp(self):
+        e = aiohttp.ClientResponseError(mock.Mock(), (), status=429,
+                                        headers={'Retry-After': '5'})
+
+        self.assertEqual(error_status(e), (429, 5))
+
+    def test_google(self):
+        e = google_exceptions.ServiceUnavailable('unavailable')
+
+        self.assertEqual(error_status(e), (503, None))
+
+    def test_grpc(self):
+        import grpc
+
+        e = mock.Mock(spec=['code'])
+        e.code.return_value = grpc.StatusCode.RESOURCE_EXHAUSTED
+        self.assertEqual(error_status(e), (429, None))
+
+        e.code.return_value = grpc.StatusCode.INVALID_ARGUMENT
+        self.assertEqual(error_status(e), (None, None))
+
+    def test_other(self):
+        self.assertEqual(error_status(ValueError()), (None, None))
+
+
+class TestRetryPolicy(TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, base_delay=1, max_delay=4,
+                                  budget=10)
+        self.started = time.monotonic()
+
+    def test_backoff_has_full_jitter(self):
+        with mock.patch('cloudtts.retry.random.uniform',
+                        side_effect=lambda a, b: b) as uniform:
+            self.assertEqual(self.policy.backoff(1), 1)
+            self.assertEqual(self.policy.backoff(2), 2)
+            self.assertEqual(self.policy.backoff(5), 4)
+
+        uniform.assert_called_with(0, 4)
+
+    def test_retryable_status(self):
+        self.assertIsNotNone(
+            self.policy.delay(_http_error(503), 1, self.started))
+        self.assertIsNone(
+            self.policy.delay(_http_error(400), 1, self.started))
+
+    def test_retryable_errors(self):
+        self.assertIsNone(self.policy.delay(OSError(), 1, self.started))
+        self.assertIsNotNone(
+            self.policy.delay(OSError(), 1, self.started, (OSError,)))
+        self.assertIsNotNone(RetryPolicy(errors=(OSError,)).delay(
+            OSError(), 1, self.started))
+
+    def test_max_attempts(self):
+        self.assertIsNotNone(
+            self.policy.delay(_http_error(503), 2, self.started))
+        self.assertIsNone(
+            self.policy.delay(_http_error(503), 3, self.started))
+
+    def test_retry_after(self):
+        e = _http_error(429, {'Retry-After': '7'})
+
+        self.assertEqual(self.policy.delay(e, 1, self.started), 7)
+
+    def test_budget(self):
+        e = _http_error(429, {'Retry-After': '11'})
+        self.assertIsNone(self.policy.delay(e, 1, self.started))
+
+        self.assertIsNone(
+            self.policy.delay(_http_error(503), 1, self.started - 10))
+
+    def test_call(self):
+        func = mock.Mock(side_effect=[_http_error(503), 'ok'])
+
+        with mock.patch('cloudtts.retry.time.sleep') as sleep:
+            self.assertEqual(self.policy.call(func), 'ok')
+
+        self.assertEqual(func.call_count, 2)
+        sleep.assert_called_once()
+
+
+class TestClientRetry(TestCase):
+    def setUp(self):
+        patcher = mock.patch('cloudtts.retry.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self, responses, **kwargs):
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url='https://example.com')
+        c = WatsonClient(cred, **kwargs)
+
+        patcher = mock.patch.object(c.session, 'post', side_effect=responses)
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return c
+
+    def test_without_retry(self):
+        c = self._client([_response(503), _response(200)])
+
+        self.assertRaises(requests.HTTPError, lambda: c.tts('Hello world'))
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_retry(self):
+        c = self._client([_response(503), _response(429), _response(200)],
+                         retry=True)
+
+        self.assertEqual(c.tts('Hello world'), b'audio')
+        self.assertEqual(self.post.call_count, 3)
+
+    def test_give_up(self):
+        c = self._client([_response(503)] * 3,
+                         retry=RetryPolicy(max_attempts=2))
+
+        self.assertRaises(requests.HTTPError, lambda: c.tts('Hello world'))
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_not_retryable(self):
+        c = self._client([_response(400), _response(200)], retry=True)
+
+        self.assertRaises(requests.HTTPError, lambda: c.tts('Hello world'))
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_connection_error(self):
+        c = self._client([requests.ConnectionError(), _response(200)],
+                         retry=True)
+
+        self.assertEqual(c.tts('Hello world'), b'audio')
+
+    def test_retry_uses_audio_cached_meanwhile(self):
+        cache = MemoryCache()
+        c = self._client([_response(503), _response(200)],
+                         retry=True, cache=cache)
+        key = cache_key('WatsonClient', c._make_params(None, None),
+                        'Hello world')
+
+        # another caller stores audio while this one is waiting to retry
+        self.sleep.side_effect = lambda delay: cache.set(key, b'cached')
+
+        self.assertEqual(c.tts('Hello world'), b'cached')
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_tts_stream_is_retried_before_audio(self):
+        c = self._client([_response(503), _response(200)], retry=True)
+
+        self.assertEqual(list(c.tts_stream('Hello world')), [b'audio'])
+        self.assertEqual(self.post.call_count, 2)
+
+
+class TestAsyncClientRetry(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.statuses = [503, 200]
+
+        async def synthesize(request):
+            status = self.statuses.pop(0)
+            return web.Response(status=status, body=b'audio',
+                                headers={'Retry-After': '0'})
+
+        app = web.Application()
+        app.router.add_post('/v1/synthesize', synthesize)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        cred = WatsonCredential(username='xxxx', password='yyyy',
+                                url=str(self.server.make_url('')).rstrip('/'))
+        self.c = AsyncWatsonClient(cred, retry=RetryPolicy(base_delay=0))
+
+    async def asyncTearDown(self):
+        await self.c.close()
+        await self.server.close()
+
+    async def test_retry(self):
+        self.assertEqual(await self.c.tts('Hello world'), b'audio')
+        self.assertEqual(self.statuses, [])
+
+    async def test_tts_stream(self):
+        chunks = [chunk async for chunk in self.c.tts_stream('Hello world')]
+
+        self.assertEqual(chunks, [b'audio'])
+        self.assertEqual(self.statuses, [])
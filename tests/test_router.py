@@ -0,0 +1,351 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import AudioFormat
+from cloudtts import AzureClient
+from cloudtts import CloudTTSError
+from cloudtts import Gender
+from cloudtts import Language
+from cloudtts import PollyClient
+from cloudtts import VoiceConfig
+from cloudtts.client import AsyncClient
+from cloudtts.client import Client
+from cloudtts.client import SHARED_EXECUTOR_WORKERS
+from cloudtts.router import AsyncRouterClient
+from cloudtts.router import RouterClient
+
+
+class _Client(Client):
+    def __init__(self, name, languages=(Language.en_US,), error=None,
+                 delay=0, ssml_in_text=False):
+        super().__init__('credential')
+        self.name = name
+        self.languages = languages
+        self.error = error
+        self.delay = delay
+        self.SSML_IN_TEXT = ssml_in_text
+        self.calls = []
+        self.cancelled = False
+
+    def supports(self, voice_config=None):
+        return (voice_config or VoiceConfig()).language in self.languages
+
+    def tts(self, text='', ssml='', voice_config=None):
+        self.calls.append((text, ssml))
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+
+        return self.name.encode()
+
+    def tts_stream(self, text='', ssml='', voice_config=None):
+        audio = self.tts(text, ssml, voice_config)
+        yield audio[:1]
+        yield audio[1:]
+
+
+class _AsyncClient(AsyncClient, _Client):
+    async def _tts(self, text, ssml):
+        self.calls.append((text, ssml))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+
+        return self.name.encode()
+
+    def tts(self, text='', ssml='', voice_config=None):
+        return self._tts(text, ssml)
+
+    async def tts_stream(self, text='', ssml='', voice_config=None):
+        audio = await self._tts(text, ssml)
+        yield audio[:1]
+        yield audio[1:]
+
+
+class TestSupports(TestCase):
+    def test_supports(self):
+        vc = VoiceConfig(language=Language.da_DK, gender=Gender.male)
+
+        self.assertTrue(PollyClient().supports(vc))
+        self.assertFalse(AzureClient().supports(vc))
+        self.assertFalse(AzureClient().supports(
+            VoiceConfig(audio_format=AudioFormat.ogg_opus)))
+
+
+class TestRouterClient(TestCase):
+    def test_first_client(self):
+        a, b = _Client('a'), _Client('b')
+        c = RouterClient([a, b])
+
+        self.assertEqual(c.tts('Hello'), b'a')
+        self.assertEqual(b.calls, [])
+
+    def test_supported_client(self):
+        a = _Client('a', languages=(Language.ja_JP,))
+        b = _Client('b')
+        c = RouterClient([a, b])
+
+        self.assertEqual(c.tts('Hello'), b'b')
+        self.assertEqual(c.tts('Hello', voice_config=VoiceConfig(
+            language=Language.ja_JP)), b'a')
+        self.assertRaises(ValueError, lambda: c.tts(
+            'Hello', voice_config=VoiceConfig(language=Language.ko_KR)))
+
+    def test_failover(self):
+        a = _Client('a', error=ConnectionError())
+        b = _Client('b')
+        c = RouterClient([a, b], cooldown=60)
+
+        self.assertEqual(c.tts('Hello'), b'b')
+        self.assertEqual(c.tts('Hello'), b'b')
+
+        # unhealthy a is skipped during cooldown
+        self.assertEqual(len(a.calls), 1)
+
+    def test_recovery(self):
+        a = _Client('a', error=ConnectionError())
+        b = _Client('b')
+        c = RouterClient([a, b], cooldown=60)
+
+        c.tts('Hello')
+        a.error = None
+
+        with mock.patch('cloudtts.router.time.monotonic',
+                        return_value=time.monotonic() + 61):
+            self.assertEqual(c.tts('Hello'), b'a')
+
+    def test_failure_threshold(self):
+        a = _Client('a', error=ConnectionError())
+        b = _Client('b')
+        c = RouterClient([a, b], failure_threshold=2)
+
+        c.tts('Hello')
+        c.tts('Hello')
+        c.tts('Hello')
+
+        self.assertEqual(len(a.calls), 2)
+
+    def test_input_errors_do_not_make_clients_unhealthy(self):
+        a = _Client('a', error=CloudTTSError('too long'))
+        b = _Client('b')
+        c = RouterClient([a, b])
+
+        self.assertEqual(c.tts('Hello'), b'b')
+        self.assertEqual(c.tts('Hello'), b'b')
+        self.assertEqual(len(a.calls), 2)
+
+    def test_all_failed(self):
+        c = RouterClient([_Client('a', error=ConnectionError()),
+                          _Client('b', error=ConnectionError())])
+
+        with self.assertRaises(CloudTTSError) as cm:
+            c.tts('Hello')
+
+        self.assertIsInstance(cm.exception.__cause__, ConnectionError)
+
+        # unhealthy clients are still tried if all are unhealthy
+        c.routes[1].client.error = None
+        self.assertEqual(c.tts('Hello'), b'b')
+
+    def test_timeout(self):
+        a = _Client('a', delay=1)
+        b = _Client('b')
+        c = RouterClient([a, b], timeout=0.05)
+
+        started = time.monotonic()
+        self.assertEqual(c.tts('Hello'), b'b')
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_ssml(self):
+        a = _Client('a', ssml_in_text=True)
+        b = _Client('b')
+
+        RouterClient([a]).tts(ssml='<speak>Hello</speak>')
+        RouterClient([b]).tts(ssml='<speak>Hello</speak>')
+
+        self.assertEqual(a.calls, [('<speak>Hello</speak>', '')])
+        self.assertEqual(b.calls, [('', '<speak>Hello</speak>')])
+
+    def test_tts_stream(self):
+        a = _Client('a', error=ConnectionError())
+        b = _Client('bb')
+        c = RouterClient([a, b])
+
+        self.assertEqual(list(c.tts_stream('Hello')), [b'b', b'b'])
+
+    def test_tts_many(self):
+        c = RouterClient([_Client('a')])
+
+        results = c.tts_many(['Hello', 'world'])
+
+        self.assertEqual([r.audio for r in results], [b'a', b'a'])
+
+    def test_tts_many_with_timeout(self):
+        # every thread of the shared executor waits for a call of the router
+        a = _Client('a', delay=0.01)
+        c = RouterClient([a], timeout=5)
+
+        results = c.tts_many(['Hello {}'.format(i)
+                              for i in range(SHARED_EXECUTOR_WORKERS)],
+                             max_concurrency=SHARED_EXECUTOR_WORKERS)
+
+        self.assertEqual({r.audio for r in results}, {b'a'})
+        self.assertEqual(c._pool._max_workers, 8)
+
+        c.close()
+        self.assertIsNone(c._pool)
+
+
+class TestHedging(TestCase):
+    def test_hedge(self):
+        a = _Client('a', delay=1)
+        b = _Client('b')
+        c = RouterClient([a, b], hedge_delay=0.02, max_hedge_ratio=1)
+
+        started = time.monotonic()
+        self.assertEqual(c.tts('Hello'), b'b')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(c.hedge_stats()['hedges'], 1)
+
+    def test_no_hedge_for_fast_response(self):
+        a = _Client('a')
+        b = _Client('b')
+        c = RouterClient([a, b], hedge_delay=1, max_hedge_ratio=1)
+
+        self.assertEqual(c.tts('Hello'), b'a')
+        self.assertEqual(b.calls, [])
+        self.assertEqual(c.hedge_stats()['hedges'], 0)
+
+    def test_hedge_ratio(self):
+        a = _Client('a', delay=0.05)
+        b = _Client('b')
+        c = RouterClient([a, b], hedge_delay=0.01, max_hedge_ratio=0.5)
+
+        for _ in range(4):
+            c.tts('Hello')
+        time.sleep(0.1)
+
+        self.assertEqual(c.hedge_stats(), {'requests': 4, 'hedges': 2,
+                                           'losers': 0, 'delay': 0.01})
+        self.assertEqual(len(b.calls), 2)
+
+    def test_hedge_ratio_with_losers(self):
+        a = _Client('a', delay=0.3)
+        b = _Client('b')
+        c = RouterClient([a, b], hedge_delay=0.01, max_hedge_ratio=1)
+
+        # losers still running do not use up the budget of hedges
+        for _ in range(4):
+            self.assertEqual(c.tts('Hello'), b'b')
+
+        stats = c.hedge_stats()
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['hedges'], 4)
+        self.assertEqual(stats['losers'], 4)
+        self.assertEqual(len(b.calls), 4)
+
+    def test_exact_hedge_ratio(self):
+        a = _Client('a', delay=0.05)
+        b = _Client('b')
+        c = RouterClient([a, b], hedge_delay=0.01, max_hedge_ratio=0.25)
+
+        hedged = []
+        for _ in range(8):
+            hedged.append(c.tts('Hello') == b'b')
+
+        self.assertEqual(hedged, [False, False, False, True,
+                                  False, False, False, True])
+        self.assertEqual(c.hedge_stats()['hedges'], 2)
+
+    def test_failed_hedge(self):
+        a = _Client('a', delay=0.05)
+        b = _Client('b', error=ConnectionError())
+        c = RouterClient([a, b], hedge_delay=0.01, max_hedge_ratio=1)
+
+        self.assertEqual(c.tts('Hello'), b'a')
+
+    def test_failover(self):
+        a = _Client('a', error=ConnectionError())
+        b = _Client('b')
+        c = RouterClient([a, b], hedge_delay=1, max_hedge_ratio=0)
+
+        self.assertEqual(c.tts('Hello'), b'b')
+
+    def test_timeout(self):
+        a = _Client('a', delay=1)
+        b = _Client('b')
+        c = RouterClient([a, b], timeout=0.05, hedge_delay=1,
+                         max_hedge_ratio=0)
+
+        self.assertEqual(c.tts('Hello'), b'b')
+
+    def test_hedge_percentile(self):
+        c = RouterClient([_Client('a')], hedge_delay=0.5,
+                         hedge_percentile=95)
+
+        self.assertEqual(c._hedge_delay(), 0.5)
+
+        for i in range(100):
+            c._succeeded(c.routes[0], i / 100)
+
+        self.assertEqual(c._hedge_delay(), 0.95)
+
+
+class TestAsyncRouterClient(IsolatedAsyncioTestCase):
+    async def test_hedge(self):
+        a = _AsyncClient('a', delay=10)
+        b = _AsyncClient('b')
+        c = AsyncRouterClient([a, b], hedge_delay=0.01, max_hedge_ratio=1)
+
+        self.assertEqual(await c.tts('Hello'), b'b')
+        await asyncio.sleep(0)
+
+        # the loser is cancelled
+        self.assertTrue(a.cancelled)
+
+    async def test_hedge_ratio(self):
+        a = _AsyncClient('a', delay=0.02)
+        b = _AsyncClient('b', delay=0.02)
+        c = AsyncRouterClient([a, b], hedge_delay=0.001, max_hedge_ratio=0)
+
+        self.assertEqual(await c.tts('Hello'), b'a')
+        self.assertEqual(b.calls, [])
+
+    async def test_failover(self):
+        a = _AsyncClient('a', error=ConnectionError())
+        b = _AsyncClient('b')
+        c = AsyncRouterClient([a, b])
+
+        self.assertEqual(await c.tts('Hello'), b'b')
+        self.assertEqual(await c.tts('Hello'), b'b')
+        self.assertEqual(len(a.calls), 1)
+
+    async def test_timeout(self):
+        a = _AsyncClient('a', delay=10)
+        b = _AsyncClient('b')
+        c = AsyncRouterClient([a, b], timeout=0.05)
+
+        self.assertEqual(await c.tts('Hello'), b'b')
+
+    async def test_tts_stream(self):
+        a = _AsyncClient('a', error=ConnectionError())
+        b = _AsyncClient('bb')
+        c = AsyncRouterClient([a, b])
+
+        chunks = [chunk async for chunk in c.tts_stream('Hello')]
+
+        self.assertEqual(chunks, [b'b', b'b'])
+
+    async def test_tts_many(self):
+        c = AsyncRouterClient([_AsyncClient('a')])
+
+        results = await c.tts_many(['Hello', 'world'])
+
+        self.assertEqual([r.audio for r in results], [b'a', b'a'])
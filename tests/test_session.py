@@ -0,0 +1,87 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import AzureClient
+from cloudtts import WatsonClient
+from cloudtts.session import AsyncPooledSession
+from cloudtts.session import PooledSession
+from cloudtts.session import SessionConfig
+
+
+class TestPooledSession(TestCase):
+    def test_session_is_reused(self):
+        s = PooledSession()
+
+        self.assertIs(s._get(), s._get())
+
+    def test_idle_session_is_dropped(self):
+        s = PooledSession(SessionConfig(idle_timeout=10))
+        session = s._get()
+
+        with mock.patch('cloudtts.session.time.monotonic',
+                        return_value=s._last_used + 11):
+            self.assertIsNot(s._get(), session)
+
+    def test_keep_alive(self):
+        s = PooledSession(SessionConfig(keep_alive=False))
+
+        self.assertEqual(s._get().headers['Connection'], 'close')
+
+    def test_pool_size(self):
+        s = PooledSession(SessionConfig(pool_maxsize=32))
+        adapter = s._get().get_adapter('https://example.com')
+
+        self.assertEqual(adapter._pool_maxsize, 32)
+
+    def test_default_pool_size(self):
+        s = PooledSession()
+        adapter = s._get().get_adapter('https://example.com')
+
+        self.assertEqual(adapter._pool_connections, 10)
+        self.assertEqual(adapter._pool_maxsize, 10)
+
+    def test_timeout(self):
+        s = PooledSession(SessionConfig(timeout=3))
+
+        with mock.patch('requests.Session.request') as request:
+            s.post('https://example.com', data=b'')
+
+        self.assertEqual(request.call_args[1]['timeout'], 3)
+
+    def test_close(self):
+        s = PooledSession()
+        session = s._get()
+        s.close()
+
+        self.assertIsNone(s._session)
+        self.assertIsNot(s._get(), session)
+
+
+class TestAsyncPooledSession(IsolatedAsyncioTestCase):
+    async def test_no_limit(self):
+        s = AsyncPooledSession()
+        self.addAsyncCleanup(s.close)
+        connector = s._get().connector
+
+        self.assertEqual(connector.limit, 0)
+        self.assertEqual(connector.limit_per_host, 0)
+
+    async def test_pool_size(self):
+        s = AsyncPooledSession(SessionConfig(pool_connections=2,
+                                             pool_maxsize=32))
+        self.addAsyncCleanup(s.close)
+        connector = s._get().connector
+
+        self.assertEqual(connector.limit, 64)
+        self.assertEqual(connector.limit_per_host, 32)
+
+
+class TestClientLifecycle(TestCase):
+    def test_context_manager(self):
+        for cls in (AzureClient, WatsonClient):
+            with cls(session_config=SessionConfig(pool_maxsize=4)) as c:
+                c.session._get()
+                self.assertIsNotNone(c.session._session)
+
+            self.assertIsNone(c.session._session)
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+from cloudtts import AsyncWatsonClient
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.singleflight import AsyncSingleFlight
+from cloudtts.singleflight import SingleFlight
+
+
+def _credential():
+    return WatsonCredential(username='xxxx', password='yyyy',
+                            url='https://example.com')
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def _run(self, n, func):
+        results = [None] * n
+
+        def call(i):
+            try:
+                results[i] = self.flights.do('key', func)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(0,))]
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+
+        for i in range(1, n):
+            threads.append(threading.Thread(target=call, args=(i,)))
+            threads[-1].start()
+
+        # followers wait for the leader
+        time.sleep(0.05)
+        self.release.set()
+        for t in threads:
+            t.join(5)
+
+        return results
+
+    def test_concurrent_calls_are_coalesced(self):
+        func = mock.Mock()
+
+        def slow():
+            func()
+            self.started.set()
+            self.release.wait(5)
+            return 'result'
+
+        self.assertEqual(self._run(4, slow), ['result'] * 4)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(len(self.flights), 0)
+
+    def test_error_is_shared(self):
+        def fail():
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError('failed')
+
+        for result in self._run(3, fail):
+            self.assertIsInstance(result, ValueError)
+        self.assertEqual(len(self.flights), 0)
+
+    def test_sequential_calls_are_not_coalesced(self):
+        func = mock.Mock(side_effect=['a', 'b'])
+
+        self.assertEqual(self.flights.do('key', func), 'a')
+        self.assertEqual(self.flights.do('key', func), 'b')
+
+
+class TestAsyncSingleFlight(IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_are_coalesced(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        results = await asyncio.gather(*[flights.do('key', func)
+                                         for _ in range(4)])
+
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(flights), 0)
+
+    async def test_error_is_shared(self):
+        flights = AsyncSingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        results = await asyncio.gather(
+            *[flights.do('key', func) for _ in range(3)],
+            return_exceptions=True)
+
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+
+    async def test_cancelled_leader(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        leader = asyncio.ensure_future(flights.do('key', func))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do('key', func))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        # the follower calls func instead
+        self.assertEqual(await follower, 'result')
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(len(calls), 2)
+
+
+class TestClientCoalescing(TestCase):
+    def _tts_concurrently(self, c, n):
+        barrier = threading.Barrier(n, timeout=5)
+        results = []
+
+        def call():
+            barrier.wait()
+            results.append(c.tts('Hello world'))
+
+        def request(params, text, ssml):
+            time.sleep(0.05)
+            return b'audio'
+
+        with mock.patch.object(c, '_request', side_effect=request) as m:
+            threads = [threading.Thread(target=call) for _ in range(n)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+
+        return m, results
+
+    def test_coalesce(self):
+        request, results = self._tts_concurrently(
+            WatsonClient(_credential()), 4)
+
+        self.assertEqual(results, [b'audio'] * 4)
+        self.assertEqual(request.call_count, 1)
+
+    def test_without_coalesce(self):
+        request, results = self._tts_concurrently(
+            WatsonClient(_credential(), coalesce=False), 4)
+
+        self.assertEqual(results, [b'audio'] * 4)
+        self.assertEqual(request.call_count, 4)
+
+
+class TestAsyncClientCoalescing(IsolatedAsyncioTestCase):
+    async def test_coalesce(self):
+        c = AsyncWatsonClient(_credential())
+
+        async def request(params, text, ssml):
+            await asyncio.sleep(0.01)
+            return text.encode()
+
+        with mock.patch.object(c, '_request', side_effect=request) as m:
+            results = await asyncio.gather(c.tts('Hello'), c.tts('Hello'),
+                                           c.tts('world'))
+
+        self.assertEqual(results, [b'Hello', b'Hello', b'world'])
+        self.assertEqual(m.call_count, 2)
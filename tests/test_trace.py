@@ -0,0 +1,152 @@
+import io
+from unittest import IsolatedAsyncioTestCase
+from unittest import TestCase
+from unittest import mock
+
+import requests
+
+from cloudtts import AsyncWatsonClient
+from cloudtts import AzureClient
+from cloudtts import AzureCredential
+from cloudtts import PollyClient
+from cloudtts import PollyCredential
+from cloudtts import WatsonClient
+from cloudtts import WatsonCredential
+from cloudtts.cache import MemoryCache
+from cloudtts.retry import RetryPolicy
+from cloudtts.trace import NULL_SPAN
+from cloudtts.trace import Tracer
+
+
+def _response(status, content=b'audio'):
+    r = mock.Mock()
+    r.status_code = status
+    r.content = content
+    if status != 200:
+        response = requests.Response()
+        response.status_code = status
+        r.raise_for_status.side_effect = requests.HTTPError(response=response)
+
+    return r
+
+
+class TestTracer(TestCase):
+    def setUp(self):
+        self.spans = []
+        self.tracer = Tracer(self.spans.append)
+
+    def _watson(self, responses, **kwargs):
+        cred = WatsonCredential('xxxx', 'yyyy', 'https://example.com')
+        c = WatsonClient(cred, tracer=self.tracer, **kwargs)
+
+        patcher = mock.patch.object(c.session, 'post', side_effect=responses)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return c
+
+    def _names(self):
+        return [span.name for span in self.spans]
+
+    def test_disabled(self):
+        c = WatsonClient()
+
+        self.assertIs(c._span('tts'), NULL_SPAN)
+
+    def test_tts(self):
+        c = self._watson([_response(200)])
+
+        self.assertEqual(c.tts('Hello world'), b'audio')
+
+        self.assertEqual(self._names(), ['cloudtts.plan', 'cloudtts.request',
+                                         'cloudtts.tts'])
+        plan, request, tts = self.spans
+        self.assertIsNone(plan.parent)
+        self.assertIs(request.parent, tts)
+        self.assertEqual(tts.attributes, {
+            'cloudtts.provider': 'watson',
+            'cloudtts.voice': 'en-US_AllisonVoice',
+            'cloudtts.characters': 11,
+            'cloudtts.bytes': 5,
+        })
+        self.assertEqual(request.attributes, {'cloudtts.attempt': 1,
+                                              'cloudtts.bytes': 5})
+        self.assertGreaterEqual(tts.duration, request.duration)
+
+    def test_plan_is_traced_once(self):
+        c = self._watson([_response(200), _response(200)])
+
+        c.tts('Hello')
+        c.tts('world')
+
+        self.assertEqual(self._names().count('cloudtts.plan'), 1)
+
+    def test_cache(self):
+        c = self._watson([_response(200)], cache=MemoryCache())
+
+        c.tts('Hello world')
+        del self.spans[:]
+        c.tts('Hello world')
+
+        self.assertEqual(self._names(), ['cloudtts.cache', 'cloudtts.tts'])
+        self.assertTrue(self.spans[0].attributes['cloudtts.hit'])
+
+    def test_retry(self):
+        c = self._watson([_response(503), _response(200)],
+                         retry=RetryPolicy(base_delay=0))
+
+        c.tts('Hello world')
+
+        requests_ = [s for s in self.spans if s.name == 'cloudtts.request']
+        self.assertEqual([s.attributes['cloudtts.attempt'] for s in requests_],
+                         [1, 2])
+        self.assertIsInstance(requests_[0].error, requests.HTTPError)
+        self.assertIsNone(requests_[1].error)
+
+    def test_error(self):
+        c = self._watson([_response(400)])
+
+        self.assertRaises(requests.HTTPError, lambda: c.tts('Hello world'))
+        self.assertIsInstance(self.spans[-1].error, requests.HTTPError)
+
+    def test_azure_token(self):
+        c = AzureClient(AzureCredential('xxxx'), tracer=self.tracer)
+
+        with mock.patch('cloudtts.microsoft.AzureTokenManager.token',
+                        return_value='token'), \
+                mock.patch.object(c.session, 'post',
+                                  return_value=_response(200)):
+            c.tts('Hello world')
+
+        self.assertEqual(self._names(), ['cloudtts.plan', 'cloudtts.token',
+                                         'cloudtts.request', 'cloudtts.tts'])
+        self.assertEqual(self.spans[1].parent.name, 'cloudtts.request')
+
+    def test_polly_read(self):
+        c = PollyClient(PollyCredential('ap-northeast-1'), tracer=self.tracer)
+        response = {'AudioStream': io.BytesIO(b'audio')}
+
+        with mock.patch.object(c, '_synthesize_speech',
+                               return_value=response):
+            c.tts('Hello world')
+
+        self.assertIn('cloudtts.read', self._names())
+        self.assertEqual(self.spans[-1].attributes['cloudtts.voice'],
+                         'Joanna')
+
+
+class TestAsyncTracer(IsolatedAsyncioTestCase):
+    async def test_tts(self):
+        spans = []
+        cred = WatsonCredential('xxxx', 'yyyy', 'https://example.com')
+        c = AsyncWatsonClient(cred, tracer=Tracer(spans.append))
+
+        async def request(params, text, ssml):
+            return b'audio'
+
+        with mock.patch.object(c, '_request', side_effect=request):
+            self.assertEqual(await c.tts('Hello world'), b'audio')
+
+        request_span, tts = spans[-2:]
+        self.assertIs(request_span.parent, tts)
+        self.assertEqual(tts.attributes['cloudtts.bytes'], 5)